@@ -0,0 +1,85 @@
+# benchmarks/bench_columnar.py
+"""
+Бенчмарк колонкового сховища: аналітика над N рядками (за замовчуванням 10 млн).
+
+    python benchmarks/bench_columnar.py --rows 10000000 --path /tmp/columns_bench
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from columnar_store import ColumnarStore, summarize_columns, daily_trends  # noqa: E402
+from scoring import LABELS  # noqa: E402
+
+
+def fill_store(store, rows, chats=50, chunk=1_000_000, seed=0):
+    """
+    Синтетичні рядки: кілька каналів, рік дат, оцінки зі зсувом до нуля (більшість повідомлень безпечні).
+    """
+    rng = np.random.default_rng(seed)
+    start = int(time.time()) - 365 * 86400
+    for first in range(0, rows, chunk):
+        n = min(chunk, rows - first)
+        text_len = rng.integers(5, 400, size=n, dtype=np.int32)
+        data = {
+            "id": np.arange(first, first + n, dtype=np.int64),
+            "chat": rng.integers(1, chats + 1, size=n, dtype=np.int64),
+            "date": np.sort(rng.integers(start, start + 365 * 86400, size=n, dtype=np.int64)),
+            "sender_id": rng.integers(1, 10 ** 6, size=n, dtype=np.int64),
+            "text_len": text_len,
+            # Тексти в бенчмарку не зберігаються: перевіряємо, що аналітика їх не читає
+            "text_offset": np.zeros(n, dtype=np.int64),
+            "text_nbytes": np.zeros(n, dtype=np.int32),
+        }
+        for i in range(len(LABELS)):
+            data[f"score_{i}"] = (rng.random(n, dtype=np.float32) ** 4)
+        store.append_columns(data, b"")
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк колонкової аналітики")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--path", default=os.path.join("benchmarks", "_columns"))
+    parser.add_argument("--keep", action="store_true", help="Не видаляти сховище після запуску")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.path, ignore_errors=True)
+    store = ColumnarStore(args.path)
+    _, fill_time = timed(fill_store, store, args.rows)
+
+    store = ColumnarStore(args.path)  # як у новому процесі: лише meta.json, колонки — через memmap
+    rows, dedup_time = timed(store.latest_rows)
+    column, column_time = timed(lambda: float(np.asarray(store.column("text_len")).mean()))
+    summary, summary_time = timed(summarize_columns, store, rows=rows)
+    trends, trends_time = timed(daily_trends, store, rows=rows)
+
+    report = {
+        "rows": args.rows,
+        "fill_s": round(fill_time, 2),
+        "dedup_s": round(dedup_time, 2),
+        "single_column_mean_s": round(column_time, 3),
+        "summary_s": round(summary_time, 2),
+        "daily_trends_s": round(trends_time, 2),
+        "days": len(trends[0]),
+        "label_counts": dict(summary[0]),
+        "multi_label_histogram": summary[1],
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not args.keep:
+        shutil.rmtree(args.path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
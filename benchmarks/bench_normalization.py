@@ -0,0 +1,175 @@
+# benchmarks/bench_normalization.py
+"""
+Мікробенчмарк нормалізації: повідомлень/с до (чотири re.sub, print на кожен пропуск,
+повторна перевірка в класифікаторі) та після (normalization.iter_prepared).
+
+    python benchmarks/bench_normalization.py --messages 1000000
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalization import DropStats, iter_prepared  # noqa: E402
+
+WORDS = ["привіт", "новини", "сьогодні", "війна", "допомога", "hello", "world", "news", "today",
+         "привет", "сегодня", "ціни", "фронт", "україна", "канал", "підписуйтесь", "update", "breaking"]
+EMOJI = ["🔥", "😡", "👍", "🇺🇦", "❗", "✅"]
+
+
+def make_corpus(n, seed=0):
+    """
+    Синтетичний корпус: звичайні тексти з HTML, посиланнями та емодзі, а також «сміття»
+    (короткі, лише цифри, повторювані символи, лише медіа) — приблизно як у реальних дампах каналів.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(n):
+        kind = rng.random()
+        media_type = "photo" if rng.random() < 0.3 else None
+        if kind < 0.08:
+            text = rng.choice(["", "ok", "+", "👍"])
+        elif kind < 0.12:
+            text = str(rng.randint(100, 10 ** 6))
+        elif kind < 0.15:
+            text = rng.choice("!?.") * rng.randint(3, 8)
+        elif kind < 0.17:
+            text = "!!! ??? ..."
+        else:
+            words = [rng.choice(WORDS) for _ in range(rng.randint(3, 60))]
+            if rng.random() < 0.3:
+                words.insert(rng.randrange(len(words)), f"https://t.me/c/{rng.randint(1, 10 ** 6)}")
+            if rng.random() < 0.2:
+                words[0] = f"<b>{words[0]}</b>"
+            if rng.random() < 0.5:
+                words.append(rng.choice(EMOJI))
+            text = "  ".join(words) if rng.random() < 0.1 else " ".join(words)
+        corpus.append({'id': i, 'text': text, 'media_type': media_type})
+    return corpus
+
+
+# --- Попередня реалізація (для порівняння) ---
+
+def legacy_clean_text(text):
+    text = re.sub(r'<.*?>', '', text)
+    text = re.sub(r'http\S+|www\.\S+', ' ', text)
+    text = re.sub(r'[^\w\s.,!?\"\'@#%&:;()\[\]{}-]', '', text, flags=re.UNICODE)
+    text = re.sub(r'\s+', ' ', text).strip().lower()
+    return text
+
+
+def legacy_generate_text_for_analysis(msg):
+    text = msg.get('text', '').strip()
+    media_type = msg.get('media_type')
+    media_tag = f"[MEDIA: {media_type}]" if media_type else ""
+    if text and media_tag:
+        return legacy_clean_text(text + " " + media_tag)
+    elif media_tag:
+        return media_tag.lower()
+    elif text:
+        return legacy_clean_text(text)
+    return ""
+
+
+def legacy_filter_invalid_messages(messages):
+    valid_messages = []
+    for msg in messages:
+        text = msg['text'].strip()
+        if len(text) < 3:
+            print(f"⚠️ Пропущено повідомлення: '{text}' (занадто коротке)")
+            continue
+        if text.isdigit():
+            print(f"⚠️ Пропущено повідомлення: '{text}' (складається лише з цифр)")
+            continue
+        if not any(char.isalpha() for char in text):
+            print(f"⚠️ Пропущено повідомлення: '{text}' (не містить букв)")
+            continue
+        if len(set(text)) == 1 and len(text) >= 3:
+            print(f"⚠️ Пропущено повідомлення: '{text}' (складається з одного повторюваного символу)")
+            continue
+        valid_messages.append(msg)
+    return valid_messages
+
+
+def legacy_filter_text(t):
+    if not t or not t.strip():
+        return None
+    clean_t = t.strip()
+    if clean_t.lower() in ["[media]", "[photo]", "[video]"]:
+        return None
+    if len(clean_t) < 3 or clean_t.isdigit():
+        return None
+    if re.fullmatch(r'(.)\1{2,}', clean_t):
+        return None
+    return clean_t
+
+
+def legacy_prepare(messages):
+    processed = []
+    for msg in legacy_filter_invalid_messages(messages):
+        prepared_text = legacy_generate_text_for_analysis(msg)
+        if prepared_text:
+            processed.append({'id': msg['id'], 'text': prepared_text})
+    # Класифікатор повторно перевіряв кожен текст
+    return [m for m in processed if legacy_filter_text(m['text']) is not None]
+
+
+def new_prepare(messages):
+    stats = DropStats()
+    processed = list(iter_prepared(messages, stats))
+    return processed, stats
+
+
+def bench(fn, corpus, quiet_stdout):
+    if quiet_stdout:
+        # print у попередній версії все одно форматує й пише рядок — вимірюємо це, але не засмічуємо консоль
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            result = fn(corpus)
+            elapsed = time.perf_counter() - start
+    else:
+        start = time.perf_counter()
+        result = fn(corpus)
+        elapsed = time.perf_counter() - start
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк нормалізації повідомлень")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Вивести результат у форматі JSON")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.messages, args.seed)
+    legacy, legacy_time = bench(legacy_prepare, corpus, quiet_stdout=True)
+    (fresh, stats), new_time = bench(new_prepare, corpus, quiet_stdout=False)
+
+    mismatches = sum(a != b for a, b in zip(legacy, fresh)) + abs(len(legacy) - len(fresh))
+    report = {
+        "messages": args.messages,
+        "kept": len(fresh),
+        "mismatches": mismatches,
+        "before_msgs_per_s": round(args.messages / legacy_time),
+        "after_msgs_per_s": round(args.messages / new_time),
+        "speedup": round(legacy_time / new_time, 2),
+        "drops": dict(stats.reasons),
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+    print(f"📦 Повідомлень: {args.messages}, відібрано: {len(fresh)} (розбіжностей з попередньою версією: {mismatches})")
+    print(f"🐢 До:    {report['before_msgs_per_s']:,} повідомлень/с ({legacy_time:.2f} с)")
+    print(f"🚀 Після: {report['after_msgs_per_s']:,} повідомлень/с ({new_time:.2f} с)")
+    print(f"⚡ Прискорення: ×{report['speedup']}")
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# budget.py
+import math
+import time
+from utils import to_timestamp
+
+# Внесок складових у пріоритет поста (сума — 1)
+PRIORITY_WEIGHTS = {"recency": 0.4, "reactions": 0.3, "reach": 0.3}
+RECENCY_HALF_LIFE = 24 * 3600  # пост добової давності має вдвічі меншу «свіжість»
+REACTIONS_SCALE = 1000  # стільки реакцій і більше — максимальна оцінка залученості
+REACH_SCALE = 10 ** 6  # стільки переглядів і більше — максимальна оцінка охоплення
+FORWARD_WEIGHT = 10  # одне пересилання важить як 10 переглядів
+# Частка ліміту часу, що лишається після класифікації на вивантаження історії та звіти
+REPORT_SHARE = 0.2
+# Частка решти часу, відведена на завантаження (після нього — класифікація)
+FETCH_SHARE = 0.5
+CHUNK_POSTS = 256
+# Пробний шматок, за яким оцінюється швидкість класифікації перед плануванням решти часу
+PROBE_POSTS = 16
+
+
+def priority(post, now=None, weights=PRIORITY_WEIGHTS):
+    """
+    Пріоритет класифікації поста (0..1): свіжість, кількість реакцій і охоплення (перегляди та пересилання).
+    Реакції й охоплення беруться в логарифмічній шкалі, тож вірусний пост не витісняє всі інші.
+    """
+    now = now if now is not None else time.time()
+    age = max(0.0, now - to_timestamp(post.get('date')))
+    recency = 0.5 ** (age / RECENCY_HALF_LIFE)
+    reactions = sum(r.get('count', 0) for r in post.get('reactions') or [])
+    engagement = min(1.0, math.log1p(reactions) / math.log1p(REACTIONS_SCALE))
+    reach = (post.get('views') or 0) + FORWARD_WEIGHT * (post.get('forwards') or 0)
+    reach = min(1.0, math.log1p(reach) / math.log1p(REACH_SCALE))
+    return weights["recency"] * recency + weights["reactions"] * engagement + weights["reach"] * reach
+
+
+class Budget:
+    """
+    Обмеження аналізу: час від початку (deadline, секунди) та/або кількість постів, переданих на класифікацію
+    (max_inference; влучання в кеш теж рахуються — наперед їх не відрізнити). Частка REPORT_SHARE ліміту часу
+    резервується на вивантаження й звіти, а шматки класифікації плануються так, щоб за виміряної швидкості
+    наступний встиг до початку цього резерву.
+    """
+
+    def __init__(self, deadline=None, max_inference=None):
+        self.deadline = deadline
+        self.max_inference = max_inference
+        self.started = time.monotonic()
+        self.used = 0
+        self.reason = None  # чому зупинились (None — черга оброблена повністю)
+
+    def remaining_time(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - (time.monotonic() - self.started)
+
+    def work_time(self):
+        """
+        Час, що лишився на завантаження й класифікацію (без резерву на звіти); None — без ліміту часу.
+        """
+        remaining = self.remaining_time()
+        return None if remaining is None else remaining - self.deadline * REPORT_SHARE
+
+    def fetch_timeout(self):
+        remaining = self.work_time()
+        return None if remaining is None else max(0.0, remaining * FETCH_SHARE)
+
+    def allowance(self, rate=None):
+        """
+        Скільки постів класифікувати наступним шматком (rate — виміряна швидкість, постів/с); 0 — ліміт вичерпано.
+        """
+        n = CHUNK_POSTS
+        if self.max_inference is not None:
+            n = min(n, self.max_inference - self.used)
+            if n <= 0:
+                self.reason = "ліміт інференсу"
+                return 0
+        remaining = self.work_time()
+        if remaining is not None:
+            n = min(n, int(rate * remaining) if rate else PROBE_POSTS)
+            if remaining <= 0 or n <= 0:
+                self.reason = "ліміт часу"
+                return 0
+        return n
+
+    def charge(self, posts):
+        self.used += posts
+
+    def describe(self):
+        parts = []
+        if self.deadline is not None:
+            parts.append(f"{self.deadline:g} с")
+        if self.max_inference is not None:
+            parts.append(f"{self.max_inference} постів")
+        return " / ".join(parts) or "без обмежень"
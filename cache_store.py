@@ -0,0 +1,231 @@
+# cache_store.py
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key BLOB PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    text TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_namespace ON entries(namespace);
+"""
+
+
+def make_namespace(model_name, labels, hypothesis_template, value_format=""):
+    """
+    Формує простір імен кешу з назви моделі, міток, шаблону гіпотези та формату значень.
+    Зміна будь-якого з них дає новий простір імен, тож старі результати не використовуються.
+    """
+    payload = json.dumps([model_name, list(labels), hypothesis_template, value_format], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def make_key(namespace, text):
+    """
+    Ключ запису — хеш від простору імен і тексту (фіксованої довжини, швидкий пошук за індексом).
+    """
+    return hashlib.blake2b(f"{namespace}\x00{text}".encode('utf-8'), digest_size=16).digest()
+
+
+class ClassificationCache:
+    """
+    Дисковий кеш результатів класифікації на SQLite з обмеженим LRU-кешем у пам'яті.
+    Значення — повні вектори оцінок float32 для всіх міток (без порогу).
+    Записи накопичуються в буфері та записуються пакетами в одній транзакції.
+    """
+
+    def __init__(self, path, namespace, memory_size=10000, flush_every=256):
+        self.path = path
+        self.namespace = namespace
+        self.memory_size = memory_size
+        self.flush_every = flush_every
+        self._memory = OrderedDict()
+        self._pending = {}
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # --- серіалізація значень ---
+
+    def _encode(self, value):
+        return np.asarray(value, dtype=np.float32).tobytes()
+
+    def _decode(self, blob):
+        return np.frombuffer(blob, dtype=np.float32)
+
+    # --- LRU у пам'яті ---
+
+    def _remember(self, key, value):
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    # --- публічний API ---
+
+    def get(self, text):
+        return self.get_many([text]).get(text)
+
+    def get_many(self, texts):
+        """
+        Повертає словник {текст: значення} для текстів, що є в кеші.
+        """
+        found = {}
+        missing = {}
+        for text in texts:
+            key = make_key(self.namespace, text)
+            if key in self._pending:
+                found[text] = self._pending[key][1]
+            elif key in self._memory:
+                self._memory.move_to_end(key)
+                found[text] = self._memory[key]
+            else:
+                missing[key] = text
+
+        keys = list(missing)
+        # SQLite обмежує кількість параметрів у запиті, тому шукаємо частинами
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM entries WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                value = self._decode(blob)
+                found[missing[key]] = value
+                self._remember(key, value)
+        return found
+
+    def key_for(self, text):
+        return make_key(self.namespace, text)
+
+    def get_by_keys(self, keys):
+        """
+        Повертає {ключ: значення} за готовими ключами (наприклад, знайденими індексом майже-дублікатів).
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            if key in self._pending:
+                found[key] = self._pending[key][1]
+            elif key in self._memory:
+                found[key] = self._memory[key]
+            else:
+                missing.append(key)
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, blob in self.conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders})", chunk):
+                found[key] = self._decode(blob)
+        return found
+
+    def put(self, text, value):
+        self.put_many({text: value})
+
+    def put_many(self, items):
+        for text, value in items.items():
+            key = make_key(self.namespace, text)
+            self._pending[key] = (text, value)
+            self._remember(key, value)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """
+        Записує накопичені записи однією транзакцією.
+        """
+        if not self._pending:
+            return
+        now = time.time()
+        rows = [(key, self.namespace, text, self._encode(value), now)
+                for key, (text, value) in self._pending.items()]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, namespace, text, value, created) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        self._pending.clear()
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def compact(self, keep_namespaces=None):
+        """
+        Видаляє записи застарілих просторів імен (інша модель, мітки чи шаблон) та стискає файл.
+        """
+        self.flush()
+        keep = set(keep_namespaces or []) | {self.namespace}
+        placeholders = ",".join("?" * len(keep))
+        with self.conn:
+            removed = self.conn.execute(
+                f"DELETE FROM entries WHERE namespace NOT IN ({placeholders})", list(keep)
+            ).rowcount
+        self.conn.execute("VACUUM")
+        return removed
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Обслуговування кешу класифікації")
+    parser.add_argument("command", choices=["compact", "stats"])
+    parser.add_argument("--path", default="classification_cache.sqlite")
+    parser.add_argument("--model", default=None, help="Модель, записи якої зберігаються (за замовчуванням — поточна)")
+    parser.add_argument("--hypothesis", default=None, help="Шаблон гіпотези (за замовчуванням — поточний)")
+    parser.add_argument("--keep", action="append", default=[], metavar="NAMESPACE",
+                        help="Додатковий простір імен, який не видаляти (можна повторювати)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print("❌ Файл кешу не знайдено!")
+        return
+
+    # Простори імен конфігурації класифікатора (без завантаження моделі): усі бекенди та скринінг
+    from scoring import DEFAULT_MODEL, HYPOTHESIS_TEMPLATE, current_cache_namespace, known_cache_namespaces
+    model = args.model or DEFAULT_MODEL
+    hypothesis = args.hypothesis or HYPOTHESIS_TEMPLATE
+    keep = known_cache_namespaces(model, hypothesis) | set(args.keep)
+    cache = ClassificationCache(args.path, current_cache_namespace(model, hypothesis))
+
+    if args.command == "stats":
+        total = cache.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        placeholders = ",".join("?" * len(keep))
+        kept = cache.conn.execute(f"SELECT COUNT(*) FROM entries WHERE namespace IN ({placeholders})",
+                                  list(keep)).fetchone()[0]
+        print(f"📦 Записів у кеші: {total} (поточна конфігурація: {len(cache)}, "
+              f"усі бекенди та скринінг: {kept})")
+    else:
+        size_before = os.path.getsize(args.path)
+        removed = cache.compact(keep_namespaces=keep)
+        size_after = os.path.getsize(args.path)
+        print(f"🧹 Видалено застарілих записів: {removed}")
+        print(f"💾 Розмір файлу: {size_before / 1e6:.1f} MB → {size_after / 1e6:.1f} MB")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+# cascade.py
+import argparse
+import os
+import sqlite3
+import zlib
+import numpy as np
+from scoring import LABELS, DEFAULT_MODEL, DEFAULT_THRESHOLD, HYPOTHESIS_TEMPLATE, cache_model_name, current_cache_namespace
+
+CASCADE_PATH = os.path.join("model", "cascade.npz")
+
+
+def hashed_features(text, dim, ngram_range=(2, 4)):
+    """
+    Індекси ознак тексту: хешовані символьні n-грами (дублікати прибрано, ваги однакові).
+    """
+    text = f" {' '.join(text.lower().split())} "
+    features = {zlib.crc32(text[i:i + n].encode('utf-8')) % dim
+                for n in range(ngram_range[0], ngram_range[1] + 1)
+                for i in range(len(text) - n + 1)}
+    return np.fromiter(features, dtype=np.int64, count=len(features))
+
+
+class CascadeModel:
+    """
+    Швидка лінійна модель першого ступеня: хешовані символьні n-грами + логістична регресія
+    (окремо для кожної мітки, в NumPy). Впевнено безпечні та впевнено токсичні тексти вирішуються
+    без трансформера, а до mDeBERTa потрапляє лише невизначена смуга.
+    """
+
+    def __init__(self, dim=2 ** 18, weights=None, bias=None, safe_below=0.05, toxic_above=0.95):
+        self.dim = dim
+        self.weights = weights if weights is not None else np.zeros((dim, len(LABELS)), dtype=np.float32)
+        self.bias = bias if bias is not None else np.zeros(len(LABELS), dtype=np.float32)
+        self.safe_below = safe_below  # усі ймовірності нижче — впевнено безпечний
+        self.toxic_above = toxic_above  # будь-яка ймовірність вище — впевнено токсичний
+
+    def _logits(self, feature_lists):
+        logits = np.empty((len(feature_lists), len(LABELS)), dtype=np.float32)
+        for i, idx in enumerate(feature_lists):
+            # Нормування на корінь з кількості ознак робить логіти співставними для коротких і довгих текстів
+            logits[i] = self.weights[idx].sum(axis=0) / np.sqrt(max(len(idx), 1)) + self.bias
+        return logits
+
+    def predict_proba(self, texts):
+        features = [hashed_features(t, self.dim) for t in texts]
+        return 1.0 / (1.0 + np.exp(-self._logits(features)))
+
+    def route(self, texts, threshold=DEFAULT_THRESHOLD):
+        """
+        Повертає (ймовірності, маска рішень). Для текстів з маскою True ймовірності каскаду можна
+        використати як оцінки; решту треба передати повній моделі.
+        """
+        proba = self.predict_proba(texts)
+        confident_safe = proba.max(axis=1) < self.safe_below
+        # Впевнено токсичний: хоча б одна мітка вище toxic_above, а решта далеко від порогу
+        far_from_threshold = (proba < self.safe_below) | (proba > self.toxic_above)
+        confident_toxic = (proba.max(axis=1) > self.toxic_above) & far_from_threshold.all(axis=1)
+        return proba.astype(np.float32), confident_safe | confident_toxic
+
+    def fit(self, texts, targets, epochs=5, lr=5.0, l2=1e-6, batch_size=256, seed=0):
+        """
+        Навчання міні-батчевим градієнтним спуском на розріджених ознаках.
+        targets — матриця (тексти × LABELS) з оцінками повної моделі (м'які мітки 0..1).
+        """
+        features = [hashed_features(t, self.dim) for t in texts]
+        targets = np.asarray(targets, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                batch_features = [features[i] for i in batch]
+                proba = 1.0 / (1.0 + np.exp(-self._logits(batch_features)))
+                grad = (proba - targets[batch]) / len(batch)
+                for idx, g in zip(batch_features, grad):
+                    self.weights[idx] -= lr * (g / np.sqrt(max(len(idx), 1)) + l2 * self.weights[idx])
+                self.bias -= lr * grad.sum(axis=0)
+        return self
+
+    def save(self, path=CASCADE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, dim=self.dim,
+                            safe_below=self.safe_below, toxic_above=self.toxic_above,
+                            labels=np.array(LABELS))
+
+    @classmethod
+    def load(cls, path=CASCADE_PATH):
+        data = np.load(path)
+        if list(data["labels"]) != LABELS:
+            raise ValueError("Каскад навчено на іншому наборі міток — перенавчіть його")
+        return cls(dim=int(data["dim"]), weights=data["weights"], bias=data["bias"],
+                   safe_below=float(data["safe_below"]), toxic_above=float(data["toxic_above"]))
+
+
+def load_training_set(cache_path, namespace=None, model_name=DEFAULT_MODEL, hypothesis_template=HYPOTHESIS_TEMPLATE,
+                      backend="torch"):
+    """
+    Читає тексти та повні вектори оцінок з кешу класифікації (лише простір імен заданої моделі, шаблону
+    й бекенду — int8 має окремий простір імен).
+    """
+    namespace = namespace or current_cache_namespace(cache_model_name(model_name, backend), hypothesis_template)
+    conn = sqlite3.connect(cache_path)
+    texts, scores = [], []
+    for text, blob in conn.execute("SELECT text, value FROM entries WHERE namespace = ?", (namespace,)):
+        texts.append(text)
+        scores.append(np.frombuffer(blob, dtype=np.float32))
+    conn.close()
+    return texts, np.array(scores, dtype=np.float32).reshape(-1, len(LABELS))
+
+
+def calibration_report(proba, targets, threshold=DEFAULT_THRESHOLD, bins=10):
+    """
+    Для кожної мітки: середня передбачена ймовірність проти частки позитивних (за повною моделлю) по кошиках.
+    """
+    report = {}
+    positives = targets >= threshold
+    edges = np.linspace(0, 1, bins + 1)
+    for j, label in enumerate(LABELS):
+        rows = []
+        which = np.clip(np.digitize(proba[:, j], edges) - 1, 0, bins - 1)
+        for b in range(bins):
+            mask = which == b
+            if mask.any():
+                rows.append((edges[b], edges[b + 1], int(mask.sum()),
+                             float(proba[mask, j].mean()), float(positives[mask, j].mean())))
+        report[label] = rows
+    return report
+
+
+def routing_stats(model, texts, targets, threshold=DEFAULT_THRESHOLD):
+    """
+    Частка текстів, вирішених каскадом, та збіг його рішень з повною моделлю на відкладеній вибірці.
+    """
+    from scoring import apply_threshold
+
+    proba, decided = model.route(texts, threshold)
+    agree = [apply_threshold(p, threshold)[0] == apply_threshold(t, threshold)[0]
+             for p, t, d in zip(proba, targets, decided) if d]
+    return {
+        "total": len(texts),
+        "short_circuited": float(decided.mean()) if len(texts) else 0.0,
+        "agreement": float(np.mean(agree)) if agree else 1.0,
+        "decided": int(decided.sum()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Каскад першого ступеня: навчання та звіт")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train", help="Навчити каскад на оцінках з кешу класифікації")
+    train_cmd.add_argument("--cache", default="classification_cache.sqlite")
+    train_cmd.add_argument("--holdout", type=float, default=0.2)
+    train_cmd.add_argument("--epochs", type=int, default=5)
+    train_cmd.add_argument("--safe-below", type=float, default=0.05)
+    train_cmd.add_argument("--toxic-above", type=float, default=0.95)
+    train_cmd.add_argument("--output", default=CASCADE_PATH)
+    train_cmd.add_argument("--model", default=DEFAULT_MODEL, help="Модель, чиї оцінки з кешу є еталоном")
+    train_cmd.add_argument("--hypothesis", default=HYPOTHESIS_TEMPLATE, help="Шаблон гіпотези")
+    train_cmd.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"],
+                           help="Бекенд, з яким класифікуватимуть (оцінки int8 зберігаються окремо)")
+    args = parser.parse_args()
+
+    texts, targets = load_training_set(args.cache, model_name=args.model, hypothesis_template=args.hypothesis,
+                                       backend=args.backend)
+    if len(texts) < 100:
+        print(f"❌ Замало даних для навчання: {len(texts)} записів у кеші")
+        return
+    order = np.random.default_rng(0).permutation(len(texts))
+    split = int(len(texts) * (1 - args.holdout))
+    train_idx, test_idx = order[:split], order[split:]
+
+    print(f"🧠 Навчання каскаду на {len(train_idx)} текстах (відкладено {len(test_idx)})...")
+    model = CascadeModel(safe_below=args.safe_below, toxic_above=args.toxic_above)
+    model.fit([texts[i] for i in train_idx], targets[train_idx], epochs=args.epochs)
+    model.save(args.output)
+
+    test_texts = [texts[i] for i in test_idx]
+    print("\n📌 Калібрування на відкладеній вибірці (кошик: n | передбачено | фактично):")
+    for label, rows in calibration_report(model.predict_proba(test_texts), targets[test_idx]).items():
+        print(f"- {label}")
+        for low, high, n, predicted, actual in rows:
+            print(f"   {low:.1f}–{high:.1f}: {n} | {predicted:.2f} | {actual:.2f}")
+
+    stats = routing_stats(model, test_texts, targets[test_idx])
+    print(f"\n🔀 Вирішено каскадом: {stats['short_circuited']:.1%} ({stats['decided']} з {stats['total']})")
+    print(f"✅ Збіг з повною моделлю серед вирішених: {stats['agreement']:.1%}")
+    print(f"💾 Модель збережено: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
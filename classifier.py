@@ -1,117 +1,366 @@
-import json
-import os
-import re
 from typing import List
-import torch
-from transformers import pipeline
-
-# Нові мітки (тільки токсичні категорії, без Safe)
-LABELS = [
-    "Hate speech or harassment",
-    "Propaganda or ideological harm",
-    "Exploitation or abuse",
-    "Self-harm or suicide"
+import numpy as np
+from cache_store import ClassificationCache
+from metrics import metrics
+from normalization import DropStats, classifiable_reason, normalize_texts
+from preprocessing import record_drops
+from scoring import (LABELS, SAFE_LABEL, DEFAULT_MODEL, DEFAULT_THRESHOLD, HYPOTHESIS_TEMPLATE, SCREENING_LABEL,
+                     DEFAULT_SCREENING_THRESHOLD, cache_model_name, current_cache_namespace, screening_cache_namespace,
+                     to_score_vector, compact_scores, apply_threshold)
+
+CACHE_PATH = "classification_cache.sqlite"
+NEAR_DUPLICATES_PATH = "near_duplicates.sqlite"
+WARMUP_TEXTS = [
+    "Доброго ранку, сьогодні в місті тепло.",
+    "This is a short warm-up message for the model.",
+    "Это короткое сообщение для прогрева модели, чтобы первый батч не был медленным.",
 ]
 
+
 class TextClassifier:
     def __init__(self,
-                 model_name="MoritzLaurer/mDeBERTa-v3-base-mnli-xnli",  # Краща модель для NLI
-                 device = 0 if torch.cuda.is_available() else -1,  # 0 для GPU
-                 threshold=0.5,  # Зменшений поріг для чутливості
-                 batch_size=8):
-        
-        self.pipeline = pipeline(
-            "zero-shot-classification",
-            model=model_name,
-            device=device,
-            hypothesis_template="This message contains {}."  # Явний шаблон
-        )
+                 model_name=DEFAULT_MODEL,  # Краща модель для NLI
+                 device=None,  # 0 для GPU, -1 для CPU; None — GPU, якщо доступний
+                 threshold=DEFAULT_THRESHOLD,  # Зменшений поріг для чутливості
+                 batch_size=8,
+                 hypothesis_template=HYPOTHESIS_TEMPLATE,  # Явний шаблон
+                 cache_path=CACHE_PATH,
+                 memory_cache_size=10000,  # Розмір LRU-кешу в пам'яті (0 — вимкнено)
+                 engine="nli",  # "nli" — власний рушій з бюджетом токенів, "pipeline" — HF-пайплайн
+                 max_tokens=512,  # Максимальна довжина пари premise/hypothesis у токенах
+                 token_budget=8192,  # Кількість токенів (з паддингом) в одному батчі рушія "nli"
+                 backend="torch",  # Бекенд рушія "nli": "torch", "onnx" або "onnx-int8"
+                 workers=0,  # Кількість процесів-воркерів для інференсу на CPU (0 — в поточному процесі)
+                 threads_per_worker=None,  # Потоків на воркер (за замовчуванням ядра / воркери)
+                 near_duplicates=False,  # Повторно використовувати оцінки майже однакових текстів (репостів)
+                 similarity_threshold=0.8,  # Мінімальна схожість (Жаккар за MinHash) для повторного використання
+                 near_duplicates_path=NEAR_DUPLICATES_PATH,
+                 cascade_path=None,  # Шлях до моделі каскаду (model/cascade.npz); None — без каскаду
+                 screening=False,  # Спершу одна широка гіпотеза, повний набір LABELS — лише для текстів вище порогу
+                 screening_label=SCREENING_LABEL,  # Мітка скринінгової гіпотези (підставляється в шаблон)
+                 screening_threshold=DEFAULT_SCREENING_THRESHOLD):  # Поріг скринінгу (див. screening_eval.py)
+
+        # torch і transformers імпортуються лише тут, а не під час імпорту модуля
+        if device is None:
+            import torch
+            device = 0 if torch.cuda.is_available() else -1
+
+        self.engine_name = engine
+        self.pipeline = None
+        self.engine = None
+        if engine == "pipeline":
+            from transformers import pipeline
+            from model_export import resolve_model_source
+
+            self.pipeline = pipeline(
+                "zero-shot-classification",
+                model=resolve_model_source(model_name),
+                device=device,
+                hypothesis_template=hypothesis_template
+            )
+        elif engine == "nli" and workers > 1:
+            from parallel_inference import ParallelScorer
+            self.engine = ParallelScorer(model_name, backend, hypothesis_template, max_tokens, token_budget,
+                                         workers=workers, threads_per_worker=threads_per_worker)
+        elif engine == "nli":
+            self.engine = self._build_engine(model_name, device, hypothesis_template, max_tokens, token_budget, backend)
+        else:
+            raise ValueError(f"Невідомий рушій класифікації: {engine}")
+
+        self.model_name = model_name
+        self.backend = backend
+        self.hypothesis_template = hypothesis_template
         self.threshold = threshold
         self.batch_size = batch_size
-        self.cache = {}
-        self.cache_path = "classification_cache.json"
+        self.cache_path = cache_path
 
-        if os.path.exists(self.cache_path):
-            try:
-                with open(self.cache_path, 'r', encoding='utf-8') as f:
-                    self.cache = json.load(f)
-            except Exception as e:
-                print(f"⚠️ Не вдалося завантажити кеш: {e}")
+        # Ключі кешу включають модель, мітки та шаблон — зміна будь-чого не поверне застарілих результатів.
+        # У кеші зберігаються повні вектори оцінок, поріг застосовується під час читання
+        self.cache = ClassificationCache(
+            cache_path,
+            current_cache_namespace(cache_model_name(model_name, backend), hypothesis_template),
+            memory_size=memory_cache_size
+        )
+        self.cascade = None
+        self.routing_stats = {"cascade": 0, "screening": 0, "model": 0}
+        if cascade_path:
+            from cascade import CascadeModel
+            self.cascade = CascadeModel.load(cascade_path)
+
+        # Скринінг: одна пара premise/hypothesis на текст замість len(LABELS). Оцінки скринінгу кешуються
+        # в окремому просторі імен, а відсіяні тексти не записуються в кеш повних оцінок
+        self.screening = screening
+        self.screening_label = screening_label
+        self.screening_threshold = screening_threshold
+        self.screen_engine = None
+        self.screen_cache = None
+        if screening:
+            if self.engine is not None:
+                self.screen_engine = self.engine.with_labels([screening_label])
+            self.screen_cache = ClassificationCache(
+                cache_path,
+                screening_cache_namespace(cache_model_name(model_name, backend), hypothesis_template, screening_label),
+                memory_size=memory_cache_size
+            )
+
+        self.near_dups = None
+        if near_duplicates:
+            from near_duplicates import NearDuplicateIndex
+            self.near_dups = NearDuplicateIndex(near_duplicates_path, threshold=similarity_threshold)
+
+    @staticmethod
+    def _build_engine(model_name, device, hypothesis_template, max_tokens, token_budget, backend):
+        from nli_engine import NLIEngine
+        from model_export import build_runner
+
+        torch_device = f"cuda:{device}" if device >= 0 else "cpu"
+        tokenizer, runner, config = build_runner(model_name, backend, torch_device)
+        return NLIEngine(tokenizer, runner, config, LABELS, hypothesis_template,
+                         max_tokens=max_tokens, token_budget=token_budget)
+
+    def warm_up(self):
+        """
+        Прогін кількох коротких текстів повз кеш: ініціалізує ядра, алокатор і токенізатор,
+        щоб перший справжній батч не платив за це.
+        """
+        self._score_batch(WARMUP_TEXTS)
+
+    @property
+    def chunk_size(self):
+        # Рушію "nli" потрібен більший шматок, щоб було з чого формувати батчі за довжиною
+        if self.engine is None:
+            return self.batch_size
+        return max(self.batch_size, getattr(self.engine, "preferred_chunk", 256))
+
+    def _score_batch(self, batch_texts):
+        """
+        Повертає масив оцінок float32 (тексти × LABELS) для пакета текстів.
+        """
+        if self.engine is not None:
+            return self.engine.score(batch_texts)
+
+        metrics.inc("inference_batches_total")
+        batch_results = self.pipeline(
+            batch_texts,
+            candidate_labels=LABELS,
+            multi_label=True
+        )
+        if not isinstance(batch_results, list):
+            batch_results = [batch_results]
+        return np.stack([to_score_vector(r["labels"], r["scores"]) for r in batch_results])
+
+    def _screen_batch(self, batch_texts):
+        """
+        Повертає масив оцінок float32 скринінгової гіпотези (по одній на текст).
+        """
+        if self.screen_engine is not None:
+            return self.screen_engine.score(batch_texts)[:, 0]
+
+        metrics.inc("inference_batches_total")
+        batch_results = self.pipeline(
+            batch_texts,
+            candidate_labels=[self.screening_label],
+            multi_label=True
+        )
+        if not isinstance(batch_results, list):
+            batch_results = [batch_results]
+        return np.array([r["scores"][0] for r in batch_results], dtype=np.float32)
+
+    def screening_scores(self, texts):
+        """
+        Оцінки скринінгової гіпотези {текст: оцінка} — з кешу або з моделі (нові записуються в кеш).
+        """
+        unique = list(dict.fromkeys(texts))
+        found = {text: float(value[0]) for text, value in self.screen_cache.get_many(unique).items()}
+        missing = [text for text in unique if text not in found]
+        chunk_size = self.chunk_size
+        for i in range(0, len(missing), chunk_size):
+            batch_texts = missing[i:i + chunk_size]
+            with metrics.span("inference", args={"texts": len(batch_texts)}, stage="screening"):
+                batch_scores = self._screen_batch(batch_texts)
+            metrics.inc("inference_texts_total", len(batch_texts), stage="screening")
+            self.screen_cache.put_many({txt: np.array([score], dtype=np.float32)
+                                        for txt, score in zip(batch_texts, batch_scores)})
+            found.update(zip(batch_texts, map(float, batch_scores)))
+        return found
+
+    def _route_screening(self, texts, indices, results):
+        """
+        Тексти з оцінкою скринінгу нижче порогу вважаються безпечними без повного набору міток
+        (raw_scores = None: оцінок за LABELS немає); повертає тексти, що пройшли скринінг, для повної моделі.
+        """
+        scores = self.screening_scores(texts)
+        remaining = []
+        for text in texts:
+            if scores[text] >= self.screening_threshold:
+                remaining.append(text)
+                continue
+            for idx in indices[text]:
+                results[idx] = {"text": text, "labels": [SAFE_LABEL], "scores": [1.0], "raw_scores": None,
+                                "source": "screening", "screening_score": round(scores[text], 6)}
+        self.routing_stats["screening"] += len(texts) - len(remaining)
+        return remaining
+
+    def _make_result(self, text, raw_scores, repost_of=None, similarity=None, source=None):
+        labels, scores = apply_threshold(raw_scores, self.threshold)
+        result = {"text": text, "labels": labels, "scores": scores, "raw_scores": compact_scores(raw_scores)}
+        if source is not None:
+            result["source"] = source
+        if repost_of is not None:
+            # Оцінки взято з майже однакового тексту, класифікованого раніше
+            result["repost_of"] = repost_of.hex()
+            result["similarity"] = round(similarity, 3)
+        return result
+
+    def _route_cascade(self, texts, indices, results):
+        """
+        Впевнені рішення каскаду записуються одразу (без кешу, щоб не змішувати їх з оцінками моделі);
+        повертає тексти з невизначеної смуги для повної моделі.
+        """
+        proba, decided = self.cascade.route(texts, self.threshold)
+        remaining = []
+        for text, scores, is_decided in zip(texts, proba, decided):
+            if is_decided:
+                for idx in indices[text]:
+                    results[idx] = self._make_result(text, scores, source="cascade")
+            else:
+                remaining.append(text)
+        self.routing_stats["cascade"] += len(texts) - len(remaining)
+        return remaining
+
+    def _resolve_near_duplicates(self, texts, indices, results):
+        """
+        Шукає для нових текстів майже однакові вже класифіковані тексти й повторно використовує їхні оцінки.
+        Повертає (тексти для моделі, {текст: (текст-представник, ключ, схожість)}) — другий словник
+        містить майже-дублікати інших нових текстів цього ж виклику, які отримають оцінки представника.
+        """
+        index = self.near_dups
+        remaining = []
+        aliases = {}
+        representatives = {}  # ключ -> текст, що піде в модель у цьому виклику
+        for text in texts:
+            key = self.cache.key_for(text)
+            sig = index.signature(text)
+            match = index.query(text, sig=sig, exclude=key) if sig is not None else None
+            if match is not None:
+                match_key, sim = match
+                if match_key in representatives:
+                    aliases[text] = (representatives[match_key], match_key, sim)
+                    index.record_match(key, match_key, sim)
+                    continue
+                stored = self.cache.get_by_keys([match_key]).get(match_key)
+                if stored is not None:
+                    for idx in indices[text]:
+                        results[idx] = self._make_result(text, stored, repost_of=match_key, similarity=sim)
+                    index.record_match(key, match_key, sim)
+                    continue
+            remaining.append(text)
+            if sig is not None and index.add(key, text, sig=sig):
+                representatives[key] = text
+        return remaining, aliases
+
+    @staticmethod
+    def _filter_text(t):
+        """
+        Повертає очищений текст, придатний для класифікації, або None.
+        """
+        clean_t = t.strip() if t else ""
+        return clean_t if classifiable_reason(clean_t) is None else None
 
     def classify(self, texts: List[str]) -> List[dict]:
         # Фільтрація текстів
-        original_texts = []
-        for t in texts:
-            if not t or not t.strip():
-                continue
-            clean_t = t.strip()
-            low_t = clean_t.lower()
-            if low_t in ["[media]", "[photo]", "[video]"]:
-                continue
-            if len(clean_t) < 3 or clean_t.isdigit():
-                continue
-            if re.fullmatch(r'(.)\1{2,}', clean_t):
-                continue
-            original_texts.append(clean_t)
+        stats = DropStats()
+        original_texts = [t for _, t in normalize_texts(texts, stats)]
+        record_drops(stats)
 
         if not original_texts:
             print("❌ Немає текстів для класифікації після фільтрації.")
             return []
+        if stats.reasons:
+            print(stats.summary())
+
+        with metrics.span("classify"):
+            return self._classify_texts(original_texts)
+
+    def classify_messages(self, prepared: List[dict], show_progress=True) -> List[dict]:
+        """
+        Класифікує підготовлені повідомлення ({'id', 'text'}) і додає 'id' до кожного результату.
+        Очікується результат preprocessing.prepare_messages: тексти там уже перевірені
+        тими самими правилами normalization, тож повторна фільтрація не потрібна.
+        """
+        if not prepared:
+            return []
 
+        with metrics.span("classify"):
+            results = self._classify_texts([msg['text'] for msg in prepared], show_progress=show_progress)
+        for result, msg in zip(results, prepared):
+            result['id'] = msg['id']
+        return results
+
+    def _classify_texts(self, original_texts, show_progress=True):
         results = [None] * len(original_texts)
         to_classify_texts = []
         to_classify_indices = {}
-        cached_count = 0
 
+        cached_results = self.cache.get_many(set(original_texts))
         for idx, text in enumerate(original_texts):
-            if text in self.cache:
-                cached = self.cache[text]
-                results[idx] = {"text": text, "labels": cached["labels"], "scores": cached["scores"]}
-                cached_count += 1
+            if text in cached_results:
+                results[idx] = self._make_result(text, cached_results[text])
             else:
                 if text not in to_classify_indices:
                     to_classify_indices[text] = []
                     to_classify_texts.append(text)
                 to_classify_indices[text].append(idx)
+        metrics.inc("classifier_texts_total", len(original_texts))
+        metrics.inc("classifier_cache_hits_total", len(original_texts) - sum(map(len, to_classify_indices.values())))
+
+        aliases = {}
+        if to_classify_texts and self.near_dups is not None:
+            before = sum(r is not None for r in results)
+            to_classify_texts, aliases = self._resolve_near_duplicates(to_classify_texts, to_classify_indices, results)
+            reused = sum(r is not None for r in results) - before
+            metrics.inc("classifier_near_duplicates_total",
+                        reused + sum(len(to_classify_indices[t]) for t in aliases))
 
+        if to_classify_texts and self.cascade is not None:
+            decided = len(to_classify_texts)
+            to_classify_texts = self._route_cascade(to_classify_texts, to_classify_indices, results)
+            metrics.inc("classifier_cascade_total", decided - len(to_classify_texts))
+
+        if to_classify_texts and self.screening:
+            screened = len(to_classify_texts)
+            to_classify_texts = self._route_screening(to_classify_texts, to_classify_indices, results)
+            metrics.inc("classifier_screened_out_total", screened - len(to_classify_texts))
+
+        # Уже готові результати (кеш, майже-дублікати, каскад, скринінг)
+        cached_count = sum(r is not None for r in results)
+        self.routing_stats["model"] += len(to_classify_texts)
         if to_classify_texts:
             try:
                 from tqdm import tqdm
             except ImportError:
                 tqdm = None
+            if not show_progress:
+                tqdm = None
 
             if tqdm:
                 pbar = tqdm(total=len(original_texts), desc="🧠 Класифікація", unit="msg")
                 pbar.update(cached_count)
 
-            for i in range(0, len(to_classify_texts), self.batch_size):
-                batch_texts = to_classify_texts[i:i + self.batch_size]
-                batch_results = self.pipeline(
-                    batch_texts,
-                    candidate_labels=LABELS,
-                    multi_label=True
-                )
-
-                if not isinstance(batch_results, list):
-                    batch_results = [batch_results]
-
-                for txt, result in zip(batch_texts, batch_results):
-                    filtered_labels = []
-                    filtered_scores = []
-
-                    for label, score in zip(result["labels"], result["scores"]):
-                        if score >= self.threshold:
-                            filtered_labels.append(label)
-                            filtered_scores.append(score)
-
-                    # Якщо жодна токсична категорія не знайдена — вважаємо повідомлення безпечним
-                    if not filtered_labels:
-                        filtered_labels = ["Safe"]
-                        filtered_scores = [1.0]
+            chunk_size = self.chunk_size
+            for i in range(0, len(to_classify_texts), chunk_size):
+                batch_texts = to_classify_texts[i:i + chunk_size]
+                with metrics.span("inference", args={"texts": len(batch_texts)}):
+                    batch_scores = self._score_batch(batch_texts)
+                metrics.inc("inference_texts_total", len(batch_texts))
 
+                new_entries = {}
+                for txt, raw_scores in zip(batch_texts, batch_scores):
+                    # Зберігаємо всі оцінки; поріг і мітку "Safe" обчислюємо під час читання
                     for idx in to_classify_indices.get(txt, []):
-                        results[idx] = {"text": txt, "labels": filtered_labels, "scores": filtered_scores}
-                    self.cache[txt] = {"labels": filtered_labels, "scores": filtered_scores}
+                        results[idx] = self._make_result(txt, raw_scores)
+                    new_entries[txt] = raw_scores
+                self.cache.put_many(new_entries)
 
                 if tqdm:
                     pbar.update(len(batch_texts))
@@ -119,10 +368,22 @@ class TextClassifier:
             if tqdm:
                 pbar.close()
 
-        # Зберігаємо кеш
+        # Майже-дублікати нових текстів отримують оцінки свого представника (від моделі, каскаду або скринінгу)
+        for txt, (rep_text, rep_key, sim) in aliases.items():
+            rep_result = results[to_classify_indices[rep_text][0]]
+            for idx in to_classify_indices[txt]:
+                if rep_result["raw_scores"] is None:
+                    results[idx] = dict(rep_result, text=txt, repost_of=rep_key.hex(), similarity=round(sim, 3))
+                else:
+                    results[idx] = self._make_result(txt, rep_result["raw_scores"], repost_of=rep_key, similarity=sim)
+
+        # Дописуємо залишок буфера кешу однією транзакцією
         try:
-            with open(self.cache_path, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            self.cache.flush()
+            if self.screen_cache is not None:
+                self.screen_cache.flush()
+            if self.near_dups is not None:
+                self.near_dups.flush()
         except Exception as e:
             print(f"⚠️ Помилка збереження кешу: {e}")
 
@@ -0,0 +1,323 @@
+# columnar_store.py
+import argparse
+import json
+import os
+import threading
+from collections import Counter
+import numpy as np
+from scoring import LABELS, SAFE_LABEL, DEFAULT_THRESHOLD
+from utils import to_timestamp
+
+COLUMNS_DIR = "columns"
+
+# Фіксовані колонки: назва -> dtype. Оцінки — окрема колонка float32 на кожну мітку (score_0..score_N).
+BASE_COLUMNS = {
+    "id": np.int64,
+    "chat": np.int64,
+    "date": np.int64,  # Unix-час у секундах (UTC)
+    "sender_id": np.int64,
+    "text_len": np.int32,  # довжина тексту в символах
+    "text_offset": np.int64,  # зсув тексту у texts.bin (байти UTF-8)
+    "text_nbytes": np.int32,
+}
+
+
+def columns_path(phone, base_data_dir="data"):
+    return os.path.join(base_data_dir, phone, COLUMNS_DIR)
+
+
+def _score_column(i):
+    return f"score_{i}"
+
+
+# Оцінки тексту, відсіяного скринінгом (raw_scores = None): NaN — «не оцінювався» і не проходить жоден поріг
+UNSCORED = [np.nan] * len(LABELS)
+
+
+class ColumnarStore:
+    """
+    Колонкове сховище результатів класифікації: кожна колонка — окремий бінарний файл фіксованого типу,
+    що дописується в кінець і читається через np.memmap. Тексти лежать окремо (texts.bin),
+    тож читання однієї колонки не зачіпає ні тексти, ні інші колонки.
+    Кількість рядків фіксується в meta.json лише після успішного дописування всіх колонок,
+    тому незавершений запис (збій посеред батчу) просто ігнорується при читанні.
+    read_only=True — для читання з іншого процесу, поки пише основний: бачимо зафіксовані рядки
+    і не обрізаємо хвости, які той саме дописує.
+    Писати в каталог має один екземпляр на процес (див. main.py): кожен тримає власну копію meta.json,
+    і коміт другого затер би рядки першого. Дописування з різних потоків серіалізуються блокуванням.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.lock = threading.Lock()
+        if not read_only:
+            os.makedirs(path, exist_ok=True)
+        self.meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            if self.meta["labels"] != LABELS:
+                raise ValueError(f"Сховище {path} створено для іншого набору міток")
+        else:
+            self.meta = {"labels": LABELS, "rows": 0, "text_bytes": 0}
+        self.columns = dict(BASE_COLUMNS)
+        self.columns.update({_score_column(i): np.float32 for i in range(len(LABELS))})
+        if not read_only:
+            self._truncate_uncommitted()
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _truncate_uncommitted(self):
+        # Обрізаємо хвости, дописані після останнього коміту meta.json
+        rows = self.meta["rows"]
+        for name, dtype in self.columns.items():
+            path = self._file(name)
+            size = rows * np.dtype(dtype).itemsize
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+        texts = self._file("texts")
+        if os.path.exists(texts) and os.path.getsize(texts) > self.meta["text_bytes"]:
+            os.truncate(texts, self.meta["text_bytes"])
+
+    def _commit(self, rows, text_bytes):
+        self.meta["rows"] = rows
+        self.meta["text_bytes"] = text_bytes
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def append(self, chat_id, results, posts_by_id=None):
+        """
+        Дописує результати класифікації каналу. posts_by_id — {id поста: пост} для дати та відправника.
+        """
+        if not results:
+            return 0
+        posts_by_id = posts_by_id or {}
+        n = len(results)
+        encoded = [r['text'].encode('utf-8') for r in results]
+        nbytes = np.fromiter((len(b) for b in encoded), dtype=np.int32, count=n)
+        offsets = np.concatenate(([0], np.cumsum(nbytes[:-1], dtype=np.int64)))
+
+        data = {
+            "id": np.fromiter((r['id'] for r in results), dtype=np.int64, count=n),
+            "chat": np.full(n, chat_id, dtype=np.int64),
+            "date": np.fromiter((to_timestamp(posts_by_id.get(r['id'], {}).get('date')) for r in results),
+                                dtype=np.int64, count=n),
+            "sender_id": np.fromiter((posts_by_id.get(r['id'], {}).get('sender_id') or 0 for r in results),
+                                     dtype=np.int64, count=n),
+            "text_len": np.fromiter((len(r['text']) for r in results), dtype=np.int32, count=n),
+            "text_offset": offsets,
+            "text_nbytes": nbytes,
+        }
+        scores = np.array([r['raw_scores'] if r['raw_scores'] is not None else UNSCORED for r in results],
+                          dtype=np.float32).reshape(n, len(LABELS))
+        for i in range(len(LABELS)):
+            data[_score_column(i)] = scores[:, i]
+        return self.append_columns(data, b"".join(encoded))
+
+    def append_columns(self, data, text_blob):
+        """
+        Дописує готові колонки (назва -> масив однакової довжини) та тексти (байти UTF-8 підряд).
+        text_offset рахується від початку text_blob і зсувається на поточний розмір texts.bin.
+        """
+        if self.read_only:
+            raise ValueError(f"Сховище {self.path} відкрито лише для читання")
+        n = len(data["id"])
+        with self.lock:
+            data = dict(data, text_offset=np.asarray(data["text_offset"], dtype=np.int64) + self.meta["text_bytes"])
+            with open(self._file("texts"), 'ab') as f:
+                f.write(text_blob)
+            for name, dtype in self.columns.items():
+                with open(self._file(name), 'ab') as f:
+                    np.ascontiguousarray(data[name], dtype=dtype).tofile(f)
+            self._commit(self.meta["rows"] + n, self.meta["text_bytes"] + len(text_blob))
+        return n
+
+    def column(self, name):
+        """
+        Колонка як np.memmap (лише читання) — дані підвантажуються з диска на вимогу.
+        """
+        rows = self.meta["rows"]
+        dtype = self.columns[name]
+        if not rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode='r', shape=(rows,))
+
+    def scores(self, rows=None):
+        """
+        Матриця оцінок (рядки × LABELS) float32.
+        """
+        columns = [self.column(_score_column(i)) for i in range(len(LABELS))]
+        if rows is not None:
+            columns = [c[rows] for c in columns]
+        return np.column_stack(columns) if columns and len(columns[0]) else np.empty((0, len(LABELS)), np.float32)
+
+    def text(self, row):
+        offset = int(self.column("text_offset")[row])
+        nbytes = int(self.column("text_nbytes")[row])
+        with open(self._file("texts"), 'rb') as f:
+            f.seek(offset)
+            return f.read(nbytes).decode('utf-8')
+
+    def latest_rows(self, chat_id=None):
+        """
+        Індекси рядків без повторів (chat, id): якщо пост дописано кілька разів, береться останній запис.
+        """
+        ids = np.asarray(self.column("id"))
+        chats = np.asarray(self.column("chat"))
+        positions = np.arange(len(ids))
+        if chat_id is not None:
+            positions = positions[chats == chat_id]
+            ids, chats = ids[positions], chats[positions]
+        if not len(positions):
+            return positions
+        # lexsort стабільний: у групі однакових (chat, id) останній елемент — найпізніший запис
+        order = np.lexsort((ids, chats))
+        sorted_ids, sorted_chats = ids[order], chats[order]
+        is_last = np.ones(len(order), dtype=bool)
+        is_last[:-1] = (sorted_ids[1:] != sorted_ids[:-1]) | (sorted_chats[1:] != sorted_chats[:-1])
+        return np.sort(positions[order[is_last]])
+
+
+# --- Векторизована аналітика ---
+
+def label_matrix(scores, threshold=DEFAULT_THRESHOLD):
+    """
+    Булева матриця міток (рядки × LABELS) за порогом; рядок без жодної мітки — Safe
+    (зокрема відсіяні скринінгом: їхні NaN-оцінки не проходять жоден поріг).
+    """
+    return scores >= threshold
+
+
+def screened_mask(scores):
+    """
+    Рядки, відсіяні скринінгом без оцінок за LABELS (перерахувати їх за іншим порогом неможливо).
+    """
+    return np.isnan(scores).all(axis=1)
+
+
+def summarize_columns(store, threshold=DEFAULT_THRESHOLD, rows=None):
+    """
+    Ті самі агрегати, що й ReportEngine (для print_summary), але обчислені над колонками:
+    (label_counter, multi_label_counts, score_sums, length_sums).
+    """
+    rows = store.latest_rows() if rows is None else rows
+    scores = store.scores(rows)
+    lengths = np.asarray(store.column("text_len"))[rows].astype(np.int64)
+    picked = label_matrix(scores, threshold)
+    per_row = picked.sum(axis=1)
+    safe = per_row == 0
+
+    label_counter = Counter()
+    score_sums, length_sums = {}, {}
+    if safe.any():
+        label_counter[SAFE_LABEL] = int(safe.sum())
+        score_sums[SAFE_LABEL] = float(safe.sum())
+        length_sums[SAFE_LABEL] = int(lengths[safe].sum())
+    counts = picked.sum(axis=0)
+    masked_scores = np.where(picked, scores, 0).sum(axis=0, dtype=np.float64)
+    masked_lengths = picked.T.astype(np.int64) @ lengths
+    for j, label in enumerate(LABELS):
+        if counts[j]:
+            label_counter[label] = int(counts[j])
+            score_sums[label] = float(masked_scores[j])
+            length_sums[label] = int(masked_lengths[j])
+
+    histogram = np.bincount(per_row[~safe], minlength=len(LABELS) + 1)
+    multi_label_counts = {k: int(v) for k, v in enumerate(histogram) if k and v}
+    return label_counter, multi_label_counts, score_sums, length_sums
+
+
+def daily_trends(store, threshold=DEFAULT_THRESHOLD, rows=None):
+    """
+    Кількість повідомлень за днями (UTC): повертає (дні як datetime64[D], всього, матриця днів × LABELS).
+    """
+    rows = store.latest_rows() if rows is None else rows
+    days = (np.asarray(store.column("date"))[rows] // 86400)
+    picked = label_matrix(store.scores(rows), threshold)
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    totals = np.bincount(inverse, minlength=len(unique_days))
+    per_label = np.zeros((len(unique_days), len(LABELS)), dtype=np.int64)
+    for j in range(len(LABELS)):
+        per_label[:, j] = np.bincount(inverse, weights=picked[:, j], minlength=len(unique_days))
+    return unique_days.astype('datetime64[D]'), totals, per_label
+
+
+def import_classified(store, classified_file, chat_id=0, messages_file=None):
+    """
+    Переносить наявний classified_*.json (та дати з messages_*.json, якщо є) у колонкове сховище.
+    """
+    from report_generator import iter_classification_results
+
+    posts_by_id = {}
+    if messages_file and os.path.exists(messages_file):
+        posts_by_id = {post['id']: post for post in iter_classification_results(messages_file)}
+    entries = iter_classification_results(classified_file)
+    first = next(entries, None)
+    if first is not None and 'raw_scores' not in first:
+        return None
+    imported, batch = 0, [first] if first is not None else []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= 10000:
+            imported += store.append(chat_id, batch, posts_by_id)
+            batch = []
+    imported += store.append(chat_id, batch, posts_by_id)
+    return imported
+
+
+def main():
+    from report_generator import print_summary
+
+    parser = argparse.ArgumentParser(description="Колонкове сховище результатів класифікації")
+    sub = parser.add_subparsers(dest="command", required=True)
+    stats_cmd = sub.add_parser("stats", help="Статистика та тренди за днями")
+    stats_cmd.add_argument("phone")
+    stats_cmd.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    stats_cmd.add_argument("--chat", type=int, default=None, help="Лише один канал (id)")
+    stats_cmd.add_argument("--days", type=int, default=14, help="Скільки останніх днів показати")
+    import_cmd = sub.add_parser("import", help="Перенести наявні classified_*.json у сховище")
+    import_cmd.add_argument("phone")
+    args = parser.parse_args()
+
+    store = ColumnarStore(columns_path(args.phone))
+    if args.command == "import":
+        from utils import load_sync_state, messages_path
+        titles = {v['title']: int(k) for k, v in load_sync_state(args.phone).items()}
+        for title, chat_id in titles.items():
+            classified = messages_path(args.phone, title, prefix="classified")
+            if not os.path.exists(classified):
+                continue
+            count = import_classified(store, classified, chat_id, messages_path(args.phone, title))
+            if count is None:
+                print(f"⚠️ {classified}: немає збережених raw_scores — пропущено")
+            else:
+                print(f"✅ «{title}»: перенесено {count} записів")
+        return
+
+    rows = store.latest_rows(args.chat)
+    if not len(rows):
+        print("❌ У сховищі немає записів")
+        return
+    label_counter, multi_label_counts, score_sums, length_sums = summarize_columns(store, args.threshold, rows)
+    output_path = store.path
+    print_summary(label_counter, multi_label_counts, score_sums, length_sums, output_path)
+
+    screened = int(screened_mask(store.scores(rows)).sum())
+    if screened:
+        print(f"ℹ️ {screened} записів відсіяно скринінгом без оцінок за мітками — враховано як {SAFE_LABEL}")
+
+    days, totals, per_label = daily_trends(store, args.threshold, rows)
+    print(f"\n📈 Останні {args.days} днів (всього | {' | '.join(LABELS)}):")
+    for day, total, counts in list(zip(days, totals, per_label))[-args.days:]:
+        print(f"- {day}: {total} | {' | '.join(str(c) for c in counts)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# distributed.py
+import argparse
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import List
+from cache_store import ClassificationCache
+from job_queue import JobQueue, QUEUE_PATH
+from metrics import metrics
+from normalization import DropStats, normalize_texts
+from preprocessing import record_drops
+from scoring import (DEFAULT_MODEL, DEFAULT_THRESHOLD, DEFAULT_SCREENING_THRESHOLD, HYPOTHESIS_TEMPLATE,
+                     apply_threshold, cache_model_name, compact_scores, current_cache_namespace, rethreshold_entry)
+
+CACHE_PATH = "classification_cache.sqlite"
+# Текстів в одному завданні: достатньо для батчів рушія, але не надто багато, щоб повтор після збою був дешевим
+JOB_TEXTS = 256
+LEASE_SECONDS = 120
+POLL_INTERVAL = 0.5
+# Як часто координатор повідомляє про очікування воркерів
+WAIT_REPORT_INTERVAL = 30
+# Виконані завдання, які ніхто не забрав (координатор упав), видаляються з черги через стільки секунд
+DONE_JOB_TTL = 24 * 3600
+
+
+class RemoteClassifier:
+    """
+    Класифікатор координатора: той самий інтерфейс classify / classify_messages, що й у TextClassifier,
+    але без моделі.
+    Унікальні тексти, яких ще немає в спільному кеші (ключ — хеш простору імен і тексту), ставляться в чергу
+    завданнями по job_texts текстів; воркери (python distributed.py worker) класифікують їх і пишуть оцінки
+    в той самий кеш. Результати збираються в порядку вхідних повідомлень, поріг застосовується тут.
+    На старті з черги видаляються виконані завдання, старші за done_job_ttl секунд (залишки координатора, що впав).
+    """
+
+    def __init__(self, queue_path=QUEUE_PATH, cache_path=CACHE_PATH, model_name=DEFAULT_MODEL,
+                 hypothesis_template=HYPOTHESIS_TEMPLATE, backend="torch", threshold=DEFAULT_THRESHOLD,
+                 job_texts=JOB_TEXTS, poll_interval=POLL_INTERVAL, done_job_ttl=DONE_JOB_TTL):
+        self.queue = JobQueue(queue_path)
+        purged = self.queue.purge(done_job_ttl)
+        if purged:
+            print(f"🧹 Видалено з черги {purged} давно виконаних завдань без координатора")
+        self.namespace = current_cache_namespace(cache_model_name(model_name, backend), hypothesis_template)
+        self.cache = ClassificationCache(cache_path, self.namespace)
+        self.threshold = threshold
+        self.job_texts = job_texts
+        self.poll_interval = poll_interval
+
+    def warm_up(self):
+        pass
+
+    def _make_result(self, text, raw_scores):
+        labels, scores = apply_threshold(raw_scores, self.threshold)
+        return {"text": text, "labels": labels, "scores": scores, "raw_scores": compact_scores(raw_scores)}
+
+    def classify(self, texts: List[str]) -> List[dict]:
+        stats = DropStats()
+        original_texts = [t for _, t in normalize_texts(texts, stats)]
+        record_drops(stats)
+
+        if not original_texts:
+            print("❌ Немає текстів для класифікації після фільтрації.")
+            return []
+        if stats.reasons:
+            print(stats.summary())
+
+        with metrics.span("classify"):
+            return self._classify_texts(original_texts)
+
+    def classify_messages(self, prepared: List[dict], show_progress=True) -> List[dict]:
+        if not prepared:
+            return []
+
+        with metrics.span("classify"):
+            results = self._classify_texts([msg['text'] for msg in prepared])
+        for result, msg in zip(results, prepared):
+            result['id'] = msg['id']
+        return results
+
+    def _classify_texts(self, texts):
+        unique = list(dict.fromkeys(texts))
+        by_text = {text: self._make_result(text, scores) for text, scores in self.cache.get_many(unique).items()}
+        metrics.inc("classifier_texts_total", len(texts))
+        metrics.inc("classifier_cache_hits_total", sum(text in by_text for text in texts))
+
+        missing = [text for text in unique if text not in by_text]
+        if missing:
+            batches = [missing[i:i + self.job_texts] for i in range(0, len(missing), self.job_texts)]
+            job_ids = self.queue.put(self.namespace, batches)
+            metrics.inc("distributed_jobs_total", len(job_ids))
+            for batch, job_results in zip(batches, self._wait(job_ids)):
+                for text, entry in zip(batch, job_results):
+                    # Воркер міг працювати з іншим порогом: мітки перераховуються з raw_scores
+                    rethreshold_entry(entry, self.threshold)
+                    entry.pop('id', None)
+                    by_text[text] = entry
+        return [dict(by_text[text]) for text in texts]
+
+    def _wait(self, job_ids):
+        """
+        Чекає на завершення завдань і повертає їхні результати в порядку job_ids. Завдання, що вичерпали спроби,
+        зупиняють обробку з помилкою (повернути їх у чергу: python distributed.py requeue).
+        """
+        pending = set(job_ids)
+        done = {}
+        started = last_report = time.monotonic()
+        while pending:
+            for job_id, (status, result, error) in self.queue.results(pending).items():
+                if status == "done":
+                    done[job_id] = result
+                    pending.discard(job_id)
+                elif status == "failed":
+                    raise RuntimeError(f"Завдання {job_id} не виконано воркерами: {error}")
+            if not pending:
+                break
+            if time.monotonic() - last_report >= WAIT_REPORT_INTERVAL:
+                last_report = time.monotonic()
+                counts = self.queue.counts()
+                print(f"⏳ Очікування воркерів: готово {len(done)}/{len(job_ids)} завдань "
+                      f"({time.monotonic() - started:.0f} с), у черзі {counts.get('pending', 0)}, "
+                      f"в оренді {counts.get('leased', 0)}, прострочено {counts.get('expired', 0)}")
+            time.sleep(self.poll_interval)
+        self.queue.delete(job_ids)
+        return [done[job_id] for job_id in job_ids]
+
+
+class Worker:
+    """
+    Воркер: бере завдання з черги, класифікує тексти TextClassifier і записує результати в чергу,
+    а оцінки — у спільний кеш класифікатора. Поки завдання обробляється, окремий потік продовжує оренду;
+    якщо процес зникне, оренда мине й завдання отримає інший воркер.
+    """
+
+    def __init__(self, queue_path, classifier, worker_id=None, lease_seconds=LEASE_SECONDS):
+        self.queue_path = queue_path
+        self.queue = JobQueue(queue_path)
+        self.classifier = classifier
+        self.namespace = classifier.cache.namespace
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.processed = 0
+
+    def _heartbeat(self, job_id, stop):
+        queue = JobQueue(self.queue_path)
+        try:
+            while not stop.wait(self.lease_seconds / 3):
+                if not queue.extend(job_id, self.worker_id, self.lease_seconds):
+                    print(f"⚠️ Оренду завдання {job_id} втрачено — його може виконати інший воркер")
+                    return
+        finally:
+            queue.close()
+
+    def process(self, job_id, texts):
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, stop), daemon=True)
+        heartbeat.start()
+        try:
+            results = self.classifier.classify_messages([{'id': i, 'text': t} for i, t in enumerate(texts)],
+                                                        show_progress=False)
+        except KeyboardInterrupt:
+            self.queue.release(job_id, self.worker_id)
+            raise
+        except Exception as e:
+            print(f"⚠️ Завдання {job_id}: помилка класифікації ({e}) — повертаємо в чергу")
+            self.queue.fail(job_id, self.worker_id, e)
+            return
+        finally:
+            stop.set()
+            heartbeat.join()
+        self.queue.complete(job_id, self.worker_id, results)
+        self.processed += len(texts)
+
+    def run(self, exit_when_idle=None):
+        """
+        Обробляє завдання, доки не перервуть (або доки черга порожня exit_when_idle секунд).
+        """
+        print(f"👷 Воркер {self.worker_id} очікує завдання...")
+        idle_since = time.monotonic()
+        while True:
+            job = self.queue.lease(self.namespace, self.worker_id, self.lease_seconds)
+            if job is None:
+                if exit_when_idle is not None and time.monotonic() - idle_since >= exit_when_idle:
+                    break
+                time.sleep(POLL_INTERVAL)
+                continue
+            job_id, texts = job
+            start = time.perf_counter()
+            self.process(job_id, texts)
+            print(f"✅ Завдання {job_id}: {len(texts)} текстів за {time.perf_counter() - start:.1f} с")
+            idle_since = time.monotonic()
+        print(f"🏁 Воркер завершив роботу: оброблено {self.processed} текстів")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Розподілена класифікація: воркери спільної черги завдань")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker_cmd = sub.add_parser("worker", help="Запустити воркер класифікації")
+    worker_cmd.add_argument("--queue", default=QUEUE_PATH, help="Файл черги завдань (SQLite)")
+    worker_cmd.add_argument("--cache", default=CACHE_PATH, help="Спільний кеш класифікації")
+    worker_cmd.add_argument("--lease", type=float, default=LEASE_SECONDS, help="Тривалість оренди завдання, с")
+    worker_cmd.add_argument("--exit-when-idle", type=float, default=None,
+                            help="Завершитись, якщо завдань немає вказану кількість секунд")
+    worker_cmd.add_argument("--model", default=DEFAULT_MODEL)
+    worker_cmd.add_argument("--hypothesis", default=HYPOTHESIS_TEMPLATE, help="Шаблон гіпотези")
+    worker_cmd.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"])
+    worker_cmd.add_argument("--workers", type=int, default=0, help="Процесів для інференсу на CPU")
+    worker_cmd.add_argument("--cascade", default=None, help="Шлях до моделі каскаду (model/cascade.npz)")
+    worker_cmd.add_argument("--near-duplicates", action="store_true",
+                            help="Повторно використовувати оцінки майже однакових текстів (репостів)")
+    worker_cmd.add_argument("--screening", action="store_true", help="Двоступеневий режим зі скринінгом")
+    worker_cmd.add_argument("--screening-threshold", type=float, default=DEFAULT_SCREENING_THRESHOLD)
+    status_cmd = sub.add_parser("status", help="Стан черги завдань")
+    status_cmd.add_argument("--queue", default=QUEUE_PATH)
+    requeue_cmd = sub.add_parser("requeue", help="Повернути в чергу завдання, що вичерпали спроби")
+    requeue_cmd.add_argument("--queue", default=QUEUE_PATH)
+    purge_cmd = sub.add_parser("purge", help="Видалити з черги давно виконані завдання")
+    purge_cmd.add_argument("--queue", default=QUEUE_PATH)
+    purge_cmd.add_argument("--older-than", type=float, default=DONE_JOB_TTL, help="Вік завдання, с")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        counts = JobQueue(args.queue).counts()
+        print("📋 Завдання: " + (", ".join(f"{status}: {n}" for status, n in sorted(counts.items())) or "немає"))
+        return
+    if args.command == "requeue":
+        print(f"🔁 Повернуто в чергу: {JobQueue(args.queue).requeue_failed()}")
+        return
+    if args.command == "purge":
+        print(f"🧹 Видалено виконаних завдань: {JobQueue(args.queue).purge(args.older_than)}")
+        return
+
+    from classifier import TextClassifier
+
+    classifier = TextClassifier(model_name=args.model, hypothesis_template=args.hypothesis, cache_path=args.cache,
+                                backend=args.backend, workers=args.workers, cascade_path=args.cascade,
+                                near_duplicates=args.near_duplicates, screening=args.screening,
+                                screening_threshold=args.screening_threshold)
+    classifier.warm_up()
+    try:
+        Worker(args.queue, classifier, lease_seconds=args.lease).run(exit_when_idle=args.exit_when_idle)
+    except KeyboardInterrupt:
+        print("\n⏸️ Воркер зупинено; незавершене завдання повернуто в чергу.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# fake_client.py
+import asyncio
+import contextlib
+from datetime import datetime, timedelta, timezone
+from telethon import errors
+from telethon.tl.types import Channel, ChatPhotoEmpty
+
+
+class FakePhoto:
+    def __init__(self, photo_id):
+        self.id = photo_id
+
+
+class FakeMessage:
+    """
+    Мінімальна заміна telethon Message з полями, які читає TelegramAuth.
+    """
+
+    def __init__(self, id, message="", date=None, grouped_id=None, photo=None,
+                 sender_id=None, reply_to_msg_id=None, reactions=None, views=None, forwards=None):
+        self.id = id
+        self.message = message
+        self.date = date or datetime.now(timezone.utc)
+        self.grouped_id = grouped_id
+        self.photo = photo
+        self.sender_id = sender_id
+        self.reply_to_msg_id = reply_to_msg_id
+        self.reactions = reactions
+        self.views = views
+        self.forwards = forwards
+
+
+class FakeNewMessageEvent:
+    def __init__(self, chat_id, message):
+        self.chat_id = chat_id
+        self.message = message
+
+
+class FakeDialog:
+    def __init__(self, entity, date=None, pinned=False):
+        self.entity = entity
+        self.id = entity.id
+        self.name = entity.title
+        self.date = date
+        self.pinned = pinned
+
+
+class FakeTelegramClient:
+    """
+    Локальна заміна TelegramClient без мережі: iter_messages / get_dialogs / download_media / takeout,
+    а також події нових повідомлень (add_event_handler + emit).
+    latency — затримка на кожну сторінку історії; flood_every — кожен n-й запит сторінки кидає
+    FloodWaitError на flood_seconds секунд (перевірка поведінки планувальника під обмеженнями).
+    """
+
+    def __init__(self, chats, latency=0.0, flood_every=0, flood_seconds=1, page_size=100):
+        self.chats = chats  # {chat_id: {'title': ..., 'messages': [FakeMessage, ...]}}
+        self.latency = latency
+        self.flood_every = flood_every
+        self.flood_seconds = flood_seconds
+        self.page_size = page_size
+        self.requests = 0
+        self.flood_waits = 0
+        self.handlers = []  # [(callback, event builder)] — див. emit()
+
+    async def connect(self):
+        return True
+
+    async def is_user_authorized(self):
+        return True
+
+    async def disconnect(self):
+        return None
+
+    def _maybe_flood(self):
+        self.requests += 1
+        if self.flood_every and self.requests % self.flood_every == 0:
+            self.flood_waits += 1
+            raise errors.FloodWaitError(request=None, capture=self.flood_seconds)
+
+    async def iter_messages(self, chat_id, limit=None, offset_id=0, min_id=0, **kwargs):
+        # Як у Telegram: від новіших до старіших, offset_id — виключна верхня межа
+        messages = sorted(self.chats[chat_id]['messages'], key=lambda m: m.id, reverse=True)
+        if offset_id:
+            messages = [m for m in messages if m.id < offset_id]
+        if min_id:
+            messages = [m for m in messages if m.id > min_id]
+        if limit is not None:
+            messages = messages[:limit]
+        for start in range(0, len(messages), self.page_size):
+            self._maybe_flood()
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for message in messages[start:start + self.page_size]:
+                yield message
+
+    # --- події ---
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append((callback, event))
+
+    def remove_event_handler(self, callback, event=None):
+        self.handlers = [(cb, ev) for cb, ev in self.handlers if cb is not callback]
+
+    async def emit(self, chat_id, message):
+        """
+        Імітує нове повідомлення в каналі: додає його до історії та викликає обробники events.NewMessage,
+        чий фільтр chats містить цей канал.
+        """
+        self.chats[chat_id]['messages'].append(message)
+        for callback, event in list(self.handlers):
+            chats = getattr(event, 'chats', None)
+            if chats is None or chat_id in chats:
+                await callback(FakeNewMessageEvent(chat_id, message))
+
+    async def get_dialogs(self, limit=None, **kwargs):
+        return [dialog async for dialog in self.iter_dialogs(limit=limit)]
+
+    @staticmethod
+    def _last_date(chat):
+        return max((m.date for m in chat['messages']), default=datetime(2000, 1, 1, tzinfo=timezone.utc))
+
+    async def iter_dialogs(self, limit=None, offset_date=None, **kwargs):
+        # Як у Telegram: від діалогу з найновішим повідомленням, сторінками по page_size
+        dialogs = sorted(self.chats.items(), key=lambda item: self._last_date(item[1]), reverse=True)
+        if offset_date:
+            dialogs = [item for item in dialogs if self._last_date(item[1]) <= offset_date]
+        dialogs = dialogs[:limit]
+        for start in range(0, len(dialogs), self.page_size):
+            self._maybe_flood()
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for chat_id, chat in dialogs[start:start + self.page_size]:
+                entity = Channel(id=chat_id, title=chat['title'], photo=ChatPhotoEmpty(), date=None,
+                                 broadcast=True, access_hash=chat.get('access_hash', chat_id * 7))
+                yield FakeDialog(entity, date=self._last_date(chat), pinned=chat.get('pinned', False))
+
+    async def download_media(self, message, file=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        with open(file, "wb") as f:
+            f.write(f"photo {message.photo.id}".encode("utf-8"))
+        return file
+
+    @contextlib.asynccontextmanager
+    async def takeout(self, **kwargs):
+        yield self
+
+
+def make_chats(chats=3, messages_per_chat=500, album_every=10, start=None):
+    """
+    Простий набір каналів для перевірок: текстові пости та альбоми з кількох фото.
+    """
+    start = start or datetime(2025, 1, 1, tzinfo=timezone.utc)
+    result = {}
+    for c in range(chats):
+        chat_id = 1000 + c
+        messages = []
+        for i in range(1, messages_per_chat + 1):
+            grouped_id = chat_id * 100000 + i // 3 if album_every and (i // 3) % album_every == 0 else None
+            photo = FakePhoto(chat_id * 100000 + i) if grouped_id else None
+            messages.append(FakeMessage(i, f"повідомлення {i} з каналу {chat_id}",
+                                        start + timedelta(minutes=i), grouped_id, photo, sender_id=chat_id))
+        result[chat_id] = {'title': f"Канал {c + 1}", 'messages': messages}
+    return result
+
+
+async def _demo():
+    from fetch_scheduler import FetchScheduler
+    from telegram_module import TelegramAuth
+
+    client = FakeTelegramClient(make_chats(), latency=0.01, flood_every=4, flood_seconds=1)
+    tg = TelegramAuth("fake", client=client)
+    counts = {}
+
+    async def on_batch(sel, batch):
+        counts[sel['id']] = counts.get(sel['id'], 0) + len(batch)
+
+    async def on_done(sel, completed):
+        pass
+
+    selected = [{'id': chat_id, 'title': chat['title'], 'limit': 300} for chat_id, chat in client.chats.items()]
+    await FetchScheduler(tg, concurrency=2).run(selected, on_batch, on_done)
+    print(f"✅ Постів за каналами: {counts}")
+    print(f"⏳ Симульованих FloodWait: {client.flood_waits}, облік: {tg.flood.summary()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_demo())
@@ -0,0 +1,134 @@
+# fetch_scheduler.py
+import asyncio
+import contextlib
+import os
+import time
+from telethon import errors
+from media_downloader import MediaDownloader
+
+# Скільки каналів завантажувати одночасно за замовчуванням
+DEFAULT_CONCURRENCY = 3
+
+
+class ChatProgress:
+    def __init__(self, sel):
+        self.title = sel['title']
+        # При інкрементальній синхронізації завантажуються всі нові пости, без обмеження кількості
+        self.limit = sel['limit'] if not sel.get('min_id') else "нові"
+        self.fetched = 0
+        self.status = "очікує"
+        self.started = None
+        self.finished = None
+
+    def rate(self):
+        if not self.started:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.fetched / elapsed if elapsed > 0 else 0.0
+
+
+class FetchScheduler:
+    """
+    Паралельне завантаження кількох каналів під семафором.
+    FloodWait обробляється в TelegramAuth.iter_posts окремо для кожного класу запитів,
+    тож обмеження одного каналу пригальмовує лише запити того ж класу, а не весь запуск.
+    За бажанням використовується takeout-сесія Telegram з м'якшими лімітами для масового експорту.
+    download_media=True — фото завантажуються паралельно з ітерацією (MediaDownloader), а мікробатч
+    передається далі, коли шляхи до медіа його постів уже заповнені.
+    """
+
+    def __init__(self, tg, concurrency=DEFAULT_CONCURRENCY, use_takeout=False, micro_batch=64,
+                 download_media=False, base_data_dir="data"):
+        self.tg = tg
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.use_takeout = use_takeout
+        self.micro_batch = micro_batch
+        self.download_media = download_media
+        self.base_data_dir = base_data_dir
+        self.progress = {}
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        """
+        Повертає takeout-клієнт, якщо його ввімкнено і Telegram дозволив, інакше — звичайний клієнт.
+        """
+        if not self.use_takeout:
+            yield self.tg.client
+            return
+        try:
+            async with self.tg.client.takeout(channels=True, megagroups=True, finalize=True) as takeout:
+                yield takeout
+                return
+        except errors.TakeoutInitDelayError as e:
+            print(f"⚠️ Takeout-сесія буде доступна через {e.seconds} с — використовуємо звичайний клієнт")
+        yield self.tg.client
+
+    def print_progress(self):
+        parts = [f"{p.title[:20]}: {p.fetched}/{p.limit} ({p.status}, {p.rate():.0f} пост/с)"
+                 for p in self.progress.values()]
+        print("🔄 " + " | ".join(parts))
+
+    def _media_downloader(self, tg, client):
+        if not self.download_media:
+            return None
+        return MediaDownloader(client, os.path.join(self.base_data_dir, tg.phone, "media"), flood=tg.flood)
+
+    @staticmethod
+    async def _emit(sel, batch, on_batch, downloader):
+        if downloader is not None:
+            # Пости альбому, що ще збирається, теж чекають — їхні фото вже в черзі завантаження
+            await downloader.join()
+        await on_batch(sel, batch)
+
+    @staticmethod
+    def _report_media(sel, stats):
+        if stats is not None:
+            print(f"🖼️ «{sel['title']}»: медіа завантажено {stats['downloaded']}, вже були {stats['skipped']}, "
+                  f"дублікати {stats['deduplicated']}, помилки {stats['failed']}")
+
+    async def _fetch_chat(self, client, sel, on_batch):
+        progress = self.progress[sel['id']]
+        async with self.semaphore:
+            progress.status = "завантаження"
+            progress.started = time.monotonic()
+            batch = []
+            min_id = sel.get('min_id', 0)
+            limit = None if min_id else sel['limit']
+            downloader = self._media_downloader(self.tg, client or self.tg.client)
+            async for post in self.tg.iter_posts(sel['id'], limit=limit, download_media=self.download_media,
+                                                 client=client, min_id=min_id, media_downloader=downloader,
+                                                 base_data_dir=self.base_data_dir):
+                batch.append(post)
+                progress.fetched += 1
+                if len(batch) >= self.micro_batch:
+                    await self._emit(sel, batch, on_batch, downloader)
+                    batch = []
+                    self.print_progress()
+            if batch:
+                await self._emit(sel, batch, on_batch, downloader)
+            self._report_media(sel, downloader.stats if downloader is not None else None)
+            progress.status = "готово"
+            progress.finished = time.monotonic()
+            self.print_progress()
+
+    async def run(self, selected_chats, on_batch, on_done):
+        """
+        Завантажує всі вибрані канали. on_batch(sel, posts) викликається для кожного мікробатчу,
+        on_done(sel, completed) — після завершення каналу (completed=False, якщо завантаження перервалось).
+        """
+        for sel in selected_chats:
+            self.progress[sel['id']] = ChatProgress(sel)
+
+        async def fetch_one(client, sel):
+            completed = True
+            try:
+                await self._fetch_chat(client, sel, on_batch)
+            except Exception as e:
+                completed = False
+                self.progress[sel['id']].status = "помилка"
+                print(f"❌ Помилка завантаження каналу «{sel['title']}»: {e}")
+            await on_done(sel, completed)
+
+        async with self._session() as client:
+            await asyncio.gather(*(fetch_one(client, sel) for sel in selected_chats))
+        return self.progress
@@ -0,0 +1,64 @@
+# flood_control.py
+import asyncio
+import time
+from collections import defaultdict
+from metrics import metrics
+
+
+class FloodHandoff(Exception):
+    """
+    Завантаження перервано через FloodWait, щоб продовжити його іншим акаунтом.
+    offset_id — звідки продовжувати (iter_messages(offset_id=...)), emitted — скільки постів уже віддано.
+    """
+
+    def __init__(self, seconds, offset_id, emitted):
+        super().__init__(f"FloodWait {seconds} с")
+        self.seconds = seconds
+        self.offset_id = offset_id
+        self.emitted = emitted
+
+
+class FloodControl:
+    """
+    Облік обмежень Telegram (FloodWaitError) окремо для кожного класу запитів:
+    'history' (iter_messages), 'media' (download_media), 'dialogs' (get_dialogs).
+    Після FloodWait усі запити цього класу чекають, доки не мине вказаний Telegram час.
+    """
+
+    def __init__(self, margin=1.0):
+        self.margin = margin  # запас у секундах понад FloodWaitError.seconds
+        self.blocked_until = defaultdict(float)
+        self.waited = defaultdict(float)  # сумарний час очікування за класом
+        self.hits = defaultdict(int)
+
+    def remaining(self, request_class):
+        return max(0.0, self.blocked_until[request_class] - time.monotonic())
+
+    async def wait(self, request_class):
+        delay = self.remaining(request_class)
+        if delay > 0:
+            self.waited[request_class] += delay
+            metrics.inc("flood_wait_seconds_total", delay, request_class=request_class)
+            with metrics.span("flood_wait", track=f"flood:{request_class}", request_class=request_class):
+                await asyncio.sleep(delay)
+
+    def block(self, request_class, seconds):
+        """
+        Фіксує FloodWait для класу запитів без очікування (наприклад, коли роботу забирає інший акаунт).
+        """
+        self.hits[request_class] += 1
+        metrics.inc("flood_waits_total", request_class=request_class)
+        until = time.monotonic() + seconds + self.margin
+        self.blocked_until[request_class] = max(self.blocked_until[request_class], until)
+
+    async def penalize(self, request_class, seconds):
+        """
+        Фіксує FloodWait для класу запитів і чекає, поки обмеження мине.
+        """
+        self.block(request_class, seconds)
+        print(f"⏳ FloodWait ({request_class}): очікування {seconds} с")
+        await self.wait(request_class)
+
+    def summary(self):
+        return {cls: {"hits": self.hits[cls], "waited_s": round(self.waited[cls], 2)}
+                for cls in set(self.hits) | set(self.waited)}
@@ -0,0 +1,206 @@
+# job_queue.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+QUEUE_PATH = "job_queue.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(namespace, status, id);
+"""
+
+
+class JobQueue:
+    """
+    Стійка черга завдань у SQLite (WAL), спільна для координатора й воркерів на одному хості
+    або на спільній файловій системі з коректними блокуваннями. Без зовнішніх сервісів.
+
+    Статуси: pending → leased → done або failed. Воркер бере завдання в оренду (lease) на lease_seconds
+    і продовжує її, поки працює; завдання з простроченою орендою (воркер впав або завис) знову видається
+    іншому воркеру. Після max_attempts невдалих спроб завдання позначається failed.
+    namespace — простір імен кешу класифікатора: воркер бере лише завдання для своєї моделі й шаблону.
+    """
+
+    def __init__(self, path=QUEUE_PATH, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        # Транзакції відкриваються явно (BEGIN IMMEDIATE), щоб оренда була атомарною між процесами
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self.conn)
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    # --- координатор ---
+
+    def put(self, namespace, batches):
+        """
+        Додає завдання (кожне — список текстів) однією транзакцією. Повертає їхні id у тому ж порядку.
+        """
+        now = time.time()
+
+        def insert(conn):
+            return [conn.execute("INSERT INTO jobs (namespace, payload, created, updated) VALUES (?, ?, ?, ?)",
+                                 (namespace, json.dumps(texts, ensure_ascii=False), now, now)).lastrowid
+                    for texts in batches]
+        return self._transaction(insert)
+
+    def results(self, job_ids):
+        """
+        {id: (статус, результати або None, помилка)} для переданих завдань.
+        """
+        found = {}
+        ids = list(job_ids)
+        with self.lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for job_id, status, result, error in self.conn.execute(
+                        f"SELECT id, status, result, error FROM jobs WHERE id IN ({placeholders})", chunk):
+                    found[job_id] = (status, json.loads(result) if result else None, error)
+        return found
+
+    def delete(self, job_ids):
+        ids = list(job_ids)
+        self._transaction(lambda conn: conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in ids]))
+
+    # --- воркер ---
+
+    def lease(self, namespace, worker, lease_seconds):
+        """
+        Бере в оренду найстаріше вільне завдання (нове або з простроченою орендою).
+        Повертає (id, тексти) або None, якщо завдань немає.
+        """
+        def take(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, updated = ?, "
+                "error = COALESCE(error, 'оренда прострочена') "
+                "WHERE namespace = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, namespace, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE namespace = ? AND "
+                "(status = 'pending' OR (status = 'leased' AND lease_expires < ?)) ORDER BY id LIMIT 1",
+                (namespace, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated = ? WHERE id = ?", (worker, now + lease_seconds, now, row[0])
+            )
+            return row[0], json.loads(row[1])
+        return self._transaction(take)
+
+    def extend(self, job_id, worker, lease_seconds):
+        """
+        Продовжує оренду. False — завдання вже віддано іншому воркеру або завершено.
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (now + lease_seconds, now, job_id, worker)
+        ).rowcount == 1)
+
+    def complete(self, job_id, worker, results):
+        """
+        Записує результати. Приймаються й від воркера, чия оренда вже минула: класифікація детермінована,
+        тож перший завершений результат так само правильний.
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'done', worker = ?, result = ?, error = NULL, updated = ? "
+            "WHERE id = ? AND status NOT IN ('done', 'failed')",
+            (worker, json.dumps(results, ensure_ascii=False), now, job_id)
+        ).rowcount == 1)
+
+    def fail(self, job_id, worker, error):
+        """
+        Повертає завдання в чергу після помилки або позначає failed, якщо спроби вичерпано.
+        """
+        now = time.time()
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "worker = NULL, lease_expires = NULL, error = ?, updated = ? WHERE id = ? AND worker = ? "
+            "AND status = 'leased'", (self.max_attempts, str(error), now, job_id, worker)
+        ))
+
+    def release(self, job_id, worker):
+        """
+        Повертає завдання в чергу без зарахування спроби (воркер зупиняють штатно).
+        """
+        now = time.time()
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'pending', worker = NULL, lease_expires = NULL, attempts = attempts - 1, "
+            "updated = ? WHERE id = ? AND worker = ? AND status = 'leased'", (now, job_id, worker)
+        ))
+
+    # --- обслуговування ---
+
+    def counts(self):
+        """
+        Кількість завдань за статусами; прострочені оренди рахуються окремо як 'expired'.
+        """
+        now = time.time()
+        counts = {}
+        with self.lock:
+            for status, expired, n in self.conn.execute(
+                    "SELECT status, status = 'leased' AND lease_expires < ?, COUNT(*) FROM jobs GROUP BY 1, 2",
+                    (now,)):
+                key = "expired" if expired else status
+                counts[key] = counts.get(key, 0) + n
+        return counts
+
+    def requeue_failed(self):
+        """
+        Повертає завдання зі статусом failed у чергу з обнуленими спробами. Повертає їхню кількість.
+        """
+        now = time.time()
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, worker = NULL, lease_expires = NULL, updated = ? "
+            "WHERE status = 'failed'", (now,)
+        ).rowcount)
+
+    def purge(self, older_than):
+        """
+        Видаляє виконані завдання, оновлені понад older_than секунд тому: їхні результати вже в спільному кеші,
+        а координатор, що впав, не забере їх з черги. Невиконані (failed) лишаються для requeue.
+        Повертає кількість видалених.
+        """
+        cutoff = time.time() - older_than
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM jobs WHERE status = 'done' AND updated < ?", (cutoff,)
+        ).rowcount)
+
+    def close(self):
+        self.conn.close()
@@ -1,14 +1,87 @@
+import time
+_STARTED = time.perf_counter()
+import argparse
 import asyncio
 from telegram_module import TelegramAuth
-from preprocessing import load_and_prepare_messages
-from classifier import TextClassifier
-from report_generator import *
-from utils import save_messages, sanitize_filename
+from budget import Budget
+from columnar_store import ColumnarStore, columns_path
+from pipeline import run_pipeline, run_budgeted
+from session_pool import SessionPool
+from metrics import metrics
+from report_pool import ReportPool, DEFAULT_WORKERS as REPORT_WORKERS
+from scoring import DEFAULT_SCREENING_THRESHOLD
+from startup import StartupProfiler, ModelLoader
+from watch import WatchService, MAX_BATCH, MAX_LATENCY, REPORT_INTERVAL
 import os
 import json
 import getpass 
+_IMPORTED = time.perf_counter()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Telegram-класифікатор токсичного контенту")
+    parser.add_argument("--watch", action="store_true",
+                        help="Після синхронізації лишитися запущеним і класифікувати нові пости в реальному часі")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Розмір мікробатчу в режимі --watch")
+    parser.add_argument("--max-latency", type=float, default=MAX_LATENCY,
+                        help="Найдовше очікування поста в буфері, с (режим --watch)")
+    parser.add_argument("--report-interval", type=float, default=REPORT_INTERVAL,
+                        help="Як часто оновлювати звіти, с (режим --watch)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Показати час імпортів і завантаження моделі")
+    parser.add_argument("--refresh-chats", action="store_true",
+                        help="Оновити список діалогів з Telegram, навіть якщо кеш ще актуальний")
+    parser.add_argument("--pool", action="store_true",
+                        help="Розподілити завантаження між усіма авторизованими сесіями з папки sessions/")
+    parser.add_argument("--media", action="store_true",
+                        help="Завантажувати фото постів у data/<телефон>/media (паралельно, з дедуплікацією)")
+    parser.add_argument("--takeout", action="store_true",
+                        help="Завантажувати через takeout-сесію Telegram (м'якші ліміти для масового експорту)")
+    parser.add_argument("--screening", action="store_true",
+                        help="Спершу одна широка гіпотеза, усі мітки — лише для повідомлень вище порогу скринінгу")
+    parser.add_argument("--screening-threshold", type=float, default=DEFAULT_SCREENING_THRESHOLD,
+                        help="Поріг скринінгу (підберіть за допомогою screening_eval.py)")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"],
+                        help="Бекенд інференсу (onnx і onnx-int8 потребують python model_export.py export)")
+    parser.add_argument("--workers", type=int, default=0, help="Процесів для інференсу на CPU (0 — в основному)")
+    parser.add_argument("--cascade", default=None,
+                        help="Модель каскаду першого ступеня (model/cascade.npz, див. python cascade.py train)")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="Повторно використовувати оцінки майже однакових текстів (репостів, схожість від 0.8)")
+    parser.add_argument("--queue", default=None,
+                        help="Не завантажувати модель: класифікацію виконують воркери distributed.py через цю чергу")
+    parser.add_argument("--report-workers", type=int, default=REPORT_WORKERS,
+                        help="Процесів для формування звітів у фоні (0 — формувати звіти в основному процесі)")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="Обмежити аналіз часом, с: пости класифікуються за пріоритетом, решта лишається в черзі")
+    parser.add_argument("--max-inference", type=int, default=None,
+                        help="Обмежити кількість постів, переданих на класифікацію за запуск")
+    parser.add_argument("--metrics-dir", default=os.path.join("reports", "metrics"),
+                        help="Куди записати підсумок запуску (run_summary.json) і метрики Prometheus (metrics.prom)")
+    parser.add_argument("--trace", action="store_true",
+                        help="Також записати спани етапів у trace.json (Chrome trace / Perfetto)")
+    return parser.parse_args()
+
+
+def export_metrics(directory):
+    metrics.print_summary()
+    try:
+        paths = metrics.export(directory)
+        print(f"📈 Метрики збережено: {', '.join(paths)}")
+    except Exception as e:
+        print(f"⚠️ Помилка збереження метрик: {e}")
+
+async def main(args):
+    metrics.trace = args.trace
+    metrics.reset(origin=_STARTED)
+    profiler = StartupProfiler(enabled=args.profile_startup, started=_STARTED)
+    profiler.record("імпорти main.py (telethon, pipeline)", _IMPORTED - _STARTED, start=_STARTED)
+    # Модель вантажиться у фоні, поки користувач авторизується та вибирає канали
+    loader = None
+    if not args.queue:
+        loader = ModelLoader(profiler, backend=args.backend, workers=args.workers, cascade_path=args.cascade,
+                             near_duplicates=args.near_duplicates, screening=args.screening,
+                             screening_threshold=args.screening_threshold)
 
-async def main():
     print("👋 Вітаємо в Telegram-класифікаторі токсичного контенту!")
     phone = input("📱 Введіть ваш номер телефону: ").strip()
 
@@ -28,7 +101,6 @@ async def main():
         return
 
     print("✅ Авторизація успішна!")
-    chats = await tg.get_chats(limit=100)
 
     # Перевіряємо, чи існує збережений вибір каналів
     last_sel_path = os.path.join("data", phone, "last_selection.json")
@@ -47,11 +119,13 @@ async def main():
             saved_selection = []
     selected_chats = []
     if use_saved:
+        # Збережені канали беруться з кешу діалогів; мережа потрібна, лише якщо якогось каналу там немає
+        if any(tg.cached_chat(sel['id']) is None for sel in saved_selection):
+            await tg.get_chats(refresh=True)
         for sel in saved_selection:
-            for chat in chats:
-                if chat['id'] == sel['id']:
-                    selected_chats.append({ 'id': chat['id'], 'title': chat['title'], 'limit': sel.get('limit', 100) })
-                    break
+            chat = tg.cached_chat(sel['id'])
+            if chat is not None:
+                selected_chats.append({ 'id': chat['id'], 'title': chat['title'], 'limit': sel.get('limit', 100) })
         missing = len(saved_selection) - len(selected_chats)
         if missing:
             print(f"⚠️ Деякі збережені канали недоступні ({missing} не знайдено). Використовуємо тільки знайдені.")
@@ -59,6 +133,7 @@ async def main():
             print("❌ Збережені канали недоступні. Будь ласка, оберіть канали вручну.")
             use_saved = False
     if not use_saved:
+        chats = await tg.get_chats(refresh=args.refresh_chats)
         print("\n📋 Доступні чати/канали:")
         for idx, chat in enumerate(chats):
             print(f"{idx + 1}. {chat['title']} ({chat['type']})")
@@ -91,43 +166,65 @@ async def main():
     except Exception as e:
         print(f"⚠️ Помилка збереження налаштувань: {e}")
     
-    classifier = TextClassifier()
+    if args.queue:
+        from distributed import RemoteClassifier
+        classifier = RemoteClassifier(args.queue, backend=args.backend)
+        print(f"📨 Класифікація через чергу {args.queue}: запустіть воркери (python distributed.py worker)")
+    else:
+        classifier = loader.result()
+    profiler.report()
 
-    for sel in selected_chats:
-        chat_id = sel['id']
-        chat_title = sel['title']
-        limit = sel['limit']
-        print(f"\n📥 Завантаження повідомлень з каналу: {chat_title}...")
-        messages = await tg.get_messages(chat_id, limit=limit, download_media=False)
-        if len(messages) < limit:
-            print(f"⚠️ Завантажено лише {len(messages)} повідомлень з каналу \"{chat_title}\" (запитувалось {limit}).")
-        save_messages(phone, chat_title, messages)
-        filename = f"data/{phone}/messages_{sanitize_filename(chat_title)}.json"
-        prepared = load_and_prepare_messages(filename)
-        texts = [msg['text'] for msg in prepared]
-        if not texts:
-            print(f"❌ Немає повідомлень для класифікації з каналу «{chat_title}»!")
-            continue
-        print("🧠 Класифікація повідомлень...")
-        results = classifier.classify(texts)
-        for result, msg in zip(results, prepared):
-            result['id'] = msg['id']
-        output_file = filename.replace("messages_", "classified_")
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        print("📊 Генерація звіту...")
-        results_data = load_classification_results(output_file)
-        name = safe_dir_name(output_file)
-        output_path = create_output_folder("reports", name)
-        label_counter, multi_label_counts, scores_per_label, lengths_per_label = summarize_classification(results_data)
-        print_summary(label_counter, multi_label_counts, scores_per_label, lengths_per_label, output_path)
-        show_top_examples(results_data, output_path)
-        show_top_toxic(results_data, output_path)
-        save_per_category(results_data, output_path)
-        save_bar_chart(label_counter, output_path)
+    reports = ReportPool(workers=args.report_workers)
+    pool = None
+    if args.pool:
+        # Пости всіх акаунтів пулу пишуться у сховище поточного акаунта
+        pool = await SessionPool.connect(primary=tg)
+        print(f"👥 Акаунтів у пулі: {len(pool.accounts)}")
+
+    budget = None
+    if args.deadline is not None or args.max_inference is not None:
+        # Ліміт часу відраховується від початку аналізу (після вибору каналів і завантаження моделі)
+        budget = Budget(deadline=args.deadline, max_inference=args.max_inference)
+
+    if args.takeout and pool is not None:
+        print("⚠️ Takeout-сесія не використовується з --pool: акаунти пулу завантажують звичайними клієнтами")
+
+    # Один письменник колонкового сховища на процес: його спільно використовують синхронізація й спостереження
+    columns = ColumnarStore(columns_path(phone))
+
+    async def synchronize():
+        if budget is not None:
+            await run_budgeted(tg, classifier, selected_chats, phone, budget=budget, use_takeout=args.takeout,
+                               pool=pool, reports=reports, download_media=args.media, columns=columns)
+        else:
+            await run_pipeline(tg, classifier, selected_chats, phone, use_takeout=args.takeout, pool=pool,
+                               reports=reports, download_media=args.media, columns=columns)
+
+    try:
+        if args.watch:
+            service = WatchService(tg, classifier, selected_chats, phone, max_batch=args.max_batch,
+                                   max_latency=args.max_latency, report_interval=args.report_interval,
+                                   reports=reports, columns=columns)
+            # Підписка до догрузки: пости, що вийдуть під час синхронізації, не загубляться
+            service.start()
+            await synchronize()
+            await service.run()
+        else:
+            await synchronize()
+    finally:
+        # Усі звіти мають бути записані до виходу (і до експорту метрик з їхнім часом)
+        reports.join()
+        if pool is not None:
+            pool.print_summary()
+            await pool.disconnect()
+        # Метрики зберігаються й тоді, коли запуск перервано (Ctrl+C у режимі спостереження)
+        export_metrics(args.metrics_dir)
 
     await tg.disconnect()
     print("\n🏁 Аналіз завершено для всіх вибраних каналів.")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        print("\n👋 Роботу зупинено.")
@@ -0,0 +1,95 @@
+# media_downloader.py
+import asyncio
+import os
+from telethon import errors
+
+
+class MediaDownloader:
+    """
+    Пул паралельного завантаження медіа, винесений з циклу ітерації повідомлень.
+    - файли називаються за Telegram id фото, тож репост того самого фото зберігається один раз;
+    - файли, що вже є на диску, не завантажуються повторно (продовження перерваного запуску);
+    - завантаження йде у тимчасовий .part-файл і перейменовується лише після успіху;
+    - кожен файл має власний тайм-аут, FloodWait враховується через FloodControl.
+    """
+
+    def __init__(self, client, media_dir, concurrency=4, timeout=60, flood=None, max_retries=3):
+        self.client = client
+        self.media_dir = media_dir
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.flood = flood
+        self.max_retries = max_retries
+        self.tasks = []
+        self.in_flight = {}  # file_key -> asyncio.Task (дедуплікація одночасних завантажень)
+        self.stats = {"downloaded": 0, "skipped": 0, "deduplicated": 0, "failed": 0}
+        os.makedirs(media_dir, exist_ok=True)
+
+    @staticmethod
+    def file_key(message):
+        return f"photo_{message.photo.id}"
+
+    def submit(self, message, post):
+        """
+        Ставить фото повідомлення в чергу. Шлях буде записано в post['media_files'] на місце,
+        що відповідає порядку повідомлень.
+        """
+        slot = len(post['media_files'])
+        post['media_files'].append(None)
+        self.tasks.append(asyncio.create_task(self._fill(message, post['media_files'], slot)))
+
+    async def _fill(self, message, media_files, slot):
+        key = self.file_key(message)
+        path = os.path.join(self.media_dir, f"{key}.jpg")
+        if os.path.exists(path):
+            self.stats["skipped"] += 1
+            media_files[slot] = path
+            return
+
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.stats["deduplicated"] += 1
+        else:
+            task = self.in_flight[key] = asyncio.create_task(self._download(message, path))
+        try:
+            media_files[slot] = await task
+        except Exception as e:
+            media_files[slot] = f"ERROR: {str(e)}"
+
+    async def _download(self, message, path):
+        part_path = path + ".part"
+        attempt = 0
+        async with self.semaphore:
+            while True:
+                try:
+                    if self.flood:
+                        await self.flood.wait('media')
+                    saved = await asyncio.wait_for(
+                        self.client.download_media(message, file=part_path), timeout=self.timeout
+                    )
+                    os.replace(saved or part_path, path)
+                    self.stats["downloaded"] += 1
+                    return path
+                except errors.FloodWaitError as e:
+                    if self.flood:
+                        await self.flood.penalize('media', e.seconds)
+                    else:
+                        await asyncio.sleep(e.seconds)
+                except asyncio.TimeoutError:
+                    attempt += 1
+                    if attempt >= self.max_retries:
+                        self.stats["failed"] += 1
+                        raise TimeoutError(f"тайм-аут завантаження ({self.timeout} с)")
+                except Exception:
+                    self.stats["failed"] += 1
+                    raise
+
+    async def join(self):
+        """
+        Чекає завершення всіх завантажень; після цього media_files усіх постів заповнені.
+        """
+        if self.tasks:
+            await asyncio.gather(*self.tasks)
+        self.tasks.clear()
+        self.in_flight.clear()
+        return self.stats
@@ -0,0 +1,304 @@
+# message_store.py
+import argparse
+import json
+import os
+import sqlite3
+import time
+from utils import JsonArrayWriter, to_timestamp
+
+STORE_FILENAME = "messages.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    chat_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    type TEXT,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    grouped_id INTEGER,
+    date INTEGER NOT NULL,
+    sender_id INTEGER,
+    reply_to INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (chat_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(chat_id, date);
+CREATE INDEX IF NOT EXISTS idx_messages_grouped ON messages(chat_id, grouped_id);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages(sender_id);
+CREATE INDEX IF NOT EXISTS idx_messages_reply ON messages(chat_id, reply_to);
+CREATE TABLE IF NOT EXISTS results (
+    chat_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (chat_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending (
+    chat_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    priority REAL NOT NULL,
+    PRIMARY KEY (chat_id, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_pending_priority ON pending(priority);
+"""
+
+
+def store_path(phone, base_data_dir="data"):
+    return os.path.join(base_data_dir, phone, STORE_FILENAME)
+
+
+class MessageStore:
+    """
+    Сховище постів і результатів класифікації акаунта в SQLite, ключ — (chat_id, id повідомлення).
+    Історія прив'язана до id каналу, а не до назви, тож перейменування каналу її не розриває.
+    Індекси за датою, grouped_id, відправником і відповіддю дозволяють читати лише потрібний діапазон
+    (наприклад, «останні 7 днів каналу X») замість десеріалізації всього файлу.
+    Повний пост зберігається як JSON (data), а індексовані поля дублюються в окремих колонках.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    # --- запис ---
+
+    def upsert_chat(self, chat_id, title, chat_type=None):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO chats (chat_id, title, type, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET title = excluded.title, "
+                "type = COALESCE(excluded.type, chats.type), updated = excluded.updated",
+                (chat_id, title, chat_type, time.time())
+            )
+
+    def put_messages(self, chat_id, posts):
+        """
+        Записує пости однією транзакцією. Альбом зберігається як один пост: якщо той самий grouped_id
+        раніше потрапив під іншим id (межа сторінки розрізала альбом), старий запис замінюється.
+        """
+        rows = [(chat_id, post['id'], post.get('grouped_id'), to_timestamp(post.get('date')),
+                 post.get('sender_id'), post.get('reply_to'), json.dumps(post, ensure_ascii=False))
+                for post in posts]
+        if not rows:
+            return 0
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM messages WHERE chat_id = ? AND grouped_id = ? AND id <> ?",
+                [(row[0], row[2], row[1]) for row in rows if row[2] is not None]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages (chat_id, id, grouped_id, date, sender_id, reply_to, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def put_results(self, chat_id, results):
+        rows = [(chat_id, result['id'], json.dumps(result, ensure_ascii=False)) for result in results]
+        if not rows:
+            return 0
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO results (chat_id, id, data) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def put_pending(self, chat_id, priorities):
+        """
+        Ставить пости в чергу на класифікацію ({id поста: пріоритет}); уже класифіковані пропускаються.
+        """
+        rows = [(chat_id, post_id, priority, chat_id, post_id) for post_id, priority in priorities.items()]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO pending (chat_id, id, priority) SELECT ?, ?, ? "
+                "WHERE NOT EXISTS (SELECT 1 FROM results WHERE chat_id = ? AND id = ?)", rows
+            )
+        return len(rows)
+
+    def reprioritize_pending(self, chat_ids, priority_fn):
+        """
+        Перераховує пріоритети постів у черзі вказаних каналів (priority_fn(пост) -> число) — наприклад,
+        щоб свіжість постів, відкладених попередніми запусками, відповідала поточному часу.
+        """
+        chat_ids = list(chat_ids)
+        cursor = self.conn.execute(
+            f"SELECT p.chat_id, m.data FROM pending p JOIN messages m ON m.chat_id = p.chat_id AND m.id = p.id "
+            f"WHERE p.chat_id IN ({','.join('?' * len(chat_ids))})", chat_ids
+        )
+        rows = []
+        for chat_id, data in cursor:
+            post = json.loads(data)
+            rows.append((priority_fn(post), chat_id, post['id']))
+        with self.conn:
+            self.conn.executemany("UPDATE pending SET priority = ? WHERE chat_id = ? AND id = ?", rows)
+        return len(rows)
+
+    def drop_pending(self, chat_id, ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM pending WHERE chat_id = ? AND id = ?", [(chat_id, i) for i in ids])
+
+    # --- читання ---
+
+    @staticmethod
+    def _range(chat_id, since=None, until=None, sender_id=None, prefix="m."):
+        clauses, params = [f"{prefix}chat_id = ?"], [chat_id]
+        if since is not None:
+            clauses.append(f"{prefix}date >= ?")
+            params.append(to_timestamp(since))
+        if until is not None:
+            clauses.append(f"{prefix}date < ?")
+            params.append(to_timestamp(until))
+        if sender_id is not None:
+            clauses.append(f"{prefix}sender_id = ?")
+            params.append(sender_id)
+        return " AND ".join(clauses), params
+
+    def iter_messages(self, chat_id, since=None, until=None, sender_id=None, newest_first=True):
+        """
+        Пости каналу за діапазоном дат [since, until) (ISO-рядок або Unix-час) та, за бажанням, відправником.
+        Рядки читаються курсором, без завантаження всієї історії в пам'ять.
+        """
+        where, params = self._range(chat_id, since, until, sender_id)
+        order = "DESC" if newest_first else "ASC"
+        cursor = self.conn.execute(f"SELECT m.data FROM messages m WHERE {where} ORDER BY m.date {order}, m.id {order}",
+                                   params)
+        for (data,) in cursor:
+            yield json.loads(data)
+
+    def iter_results(self, chat_id, since=None, until=None, sender_id=None):
+        """
+        Результати класифікації каналу; фільтр за датою та відправником береться з таблиці постів.
+        """
+        if since is None and until is None and sender_id is None:
+            cursor = self.conn.execute("SELECT data FROM results WHERE chat_id = ? ORDER BY id DESC", (chat_id,))
+        else:
+            where, params = self._range(chat_id, since, until, sender_id)
+            cursor = self.conn.execute(
+                f"SELECT r.data FROM messages m JOIN results r ON r.chat_id = m.chat_id AND r.id = m.id "
+                f"WHERE {where} ORDER BY m.date DESC, m.id DESC", params
+            )
+        for (data,) in cursor:
+            yield json.loads(data)
+
+    def replies_to(self, chat_id, message_id):
+        cursor = self.conn.execute("SELECT data FROM messages WHERE chat_id = ? AND reply_to = ? ORDER BY id",
+                                   (chat_id, message_id))
+        return [json.loads(data) for (data,) in cursor]
+
+    def count(self, chat_id, table="messages"):
+        if table not in ("messages", "results"):
+            raise ValueError(f"Невідома таблиця: {table}")
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+
+    def pending_count(self, chat_ids=None):
+        """
+        Кількість постів у черзі на класифікацію (усіх або лише вказаних каналів).
+        """
+        query = "SELECT COUNT(*) FROM pending p JOIN messages m ON m.chat_id = p.chat_id AND m.id = p.id"
+        params = list(chat_ids or [])
+        if chat_ids is not None:
+            query += f" WHERE p.chat_id IN ({','.join('?' * len(params))})"
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def top_pending(self, chat_ids, limit=-1):
+        """
+        Найпріоритетніші пости з черги вказаних каналів: [(chat_id, пост), ...] за спаданням пріоритету.
+        """
+        chat_ids = list(chat_ids)
+        cursor = self.conn.execute(
+            f"SELECT p.chat_id, m.data FROM pending p JOIN messages m ON m.chat_id = p.chat_id AND m.id = p.id "
+            f"WHERE p.chat_id IN ({','.join('?' * len(chat_ids))}) ORDER BY p.priority DESC, p.id DESC LIMIT ?",
+            chat_ids + [limit]
+        )
+        return [(chat_id, json.loads(data)) for chat_id, data in cursor]
+
+    def max_id(self, chat_id):
+        return self.conn.execute("SELECT MAX(id) FROM messages WHERE chat_id = ?", (chat_id,)).fetchone()[0] or 0
+
+    def chats(self):
+        cursor = self.conn.execute("SELECT chat_id, title, type FROM chats ORDER BY title")
+        return [{'id': chat_id, 'title': title, 'type': chat_type} for chat_id, title, chat_type in cursor]
+
+    # --- сумісність з JSON ---
+
+    def export_json(self, chat_id, path, table="messages"):
+        """
+        Потоково вивантажує історію каналу у JSON-масив (формат messages_*.json / classified_*.json).
+        """
+        items = self.iter_messages(chat_id) if table == "messages" else self.iter_results(chat_id)
+        tmp_path = path + ".tmp"
+        with JsonArrayWriter(tmp_path) as writer:
+            writer.write_many(items)
+        os.replace(tmp_path, path)
+        return writer.count
+
+    def import_json(self, chat_id, messages_file=None, classified_file=None, batch_size=1000):
+        """
+        Переносить історію з попередніх JSON-файлів каналу. Повертає (постів, результатів).
+        """
+        from report_generator import iter_classification_results
+
+        counts = []
+        for path, put in ((messages_file, self.put_messages), (classified_file, self.put_results)):
+            total, batch = 0, []
+            if path and os.path.exists(path):
+                for item in iter_classification_results(path):
+                    batch.append(item)
+                    if len(batch) >= batch_size:
+                        total += put(chat_id, batch)
+                        batch = []
+                total += put(chat_id, batch)
+            counts.append(total)
+        return tuple(counts)
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    from report_generator import create_output_folder, generate_reports
+
+    parser = argparse.ArgumentParser(description="Сховище повідомлень акаунта")
+    parser.add_argument("phone")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("chats", help="Канали у сховищі")
+    report_cmd = sub.add_parser("report", help="Звіт за каналом і діапазоном дат")
+    report_cmd.add_argument("chat_id", type=int)
+    report_cmd.add_argument("--days", type=int, default=None, help="Лише останні N днів")
+    report_cmd.add_argument("--sender", type=int, default=None)
+    export_cmd = sub.add_parser("export", help="Вивантажити канал у JSON")
+    export_cmd.add_argument("chat_id", type=int)
+    export_cmd.add_argument("--output", default=None)
+    export_cmd.add_argument("--table", choices=["messages", "results"], default="messages")
+    args = parser.parse_args()
+
+    path = store_path(args.phone)
+    if not os.path.exists(path):
+        print(f"❌ Сховище не знайдено: {path}")
+        return
+    store = MessageStore(path)
+    if args.command == "chats":
+        for chat in store.chats():
+            print(f"- {chat['id']}: {chat['title']} ({store.count(chat['id'])} постів, "
+                  f"{store.count(chat['id'], 'results')} класифіковано)")
+    elif args.command == "report":
+        since = time.time() - args.days * 86400 if args.days else None
+        suffix = f"_{args.days}d" if args.days else ""
+        output_path = create_output_folder("reports", f"{args.chat_id}{suffix}")
+        count = generate_reports(store.iter_results(args.chat_id, since=since, sender_id=args.sender), output_path)
+        print(f"\n✅ Звіт ({count} повідомлень) збережено у папці: {output_path}")
+    else:
+        output = args.output or f"{args.table}_{args.chat_id}.json"
+        count = store.export_json(args.chat_id, output, table=args.table)
+        print(f"✅ Вивантажено {count} записів у {output}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
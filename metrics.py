@@ -0,0 +1,291 @@
+# metrics.py
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+PROMETHEUS_PREFIX = "tg_analyzer_"
+SUMMARY_FILE = "run_summary.json"
+PROMETHEUS_FILE = "metrics.prom"
+TRACE_FILE = "trace.json"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """
+    Метрики одного запуску: лічильники, значення (gauge), таймери та, за бажанням, спани для Chrome trace.
+    Усі методи потокобезпечні — класифікація виконується в окремому потоці, завантаження — в циклі подій.
+    Мітки (labels) передаються як іменовані аргументи: metrics.inc("messages_dropped_total", reason="too_short").
+    """
+
+    def __init__(self, trace=False):
+        self.lock = threading.Lock()
+        self.trace = trace
+        self.reset()
+
+    def reset(self, origin=None):
+        """
+        Очищує всі метрики. origin — момент початку запуску (time.perf_counter()), від якого відліковується траса.
+        """
+        with self.lock:
+            now = time.perf_counter()
+            self.origin = origin if origin is not None else now
+            self.started = time.time() - (now - self.origin)
+            self.counters = defaultdict(float)
+            self.gauges = {}
+            self.timers = {}  # ключ -> [кількість, сума секунд, максимум]
+            self.events = []
+            self.tracks = {}
+
+    # --- запис ---
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[_key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        with self.lock:
+            timer = self.timers.setdefault(_key(name, labels), [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+
+    def add_span(self, name, start, seconds, track=None, args=None, **labels):
+        """
+        Записує вже виміряний проміжок (start — значення time.perf_counter() на початку):
+        таймер name з мітками labels і, якщо ввімкнено трасування, подію для Chrome trace.
+        track — назва доріжки в трасі (за замовчуванням — поточний потік); окремі доріжки потрібні
+        для проміжків, що перекриваються в одному потоці (наприклад, кілька каналів у циклі подій).
+        """
+        self.observe(name, seconds, **labels)
+        if not self.trace:
+            return
+        track = track or threading.current_thread().name
+        with self.lock:
+            tid = self.tracks.setdefault(track, len(self.tracks) + 1)
+            self.events.append({
+                "name": name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                "ts": round((start - self.origin) * 1e6, 1), "dur": round(seconds * 1e6, 1),
+                "args": dict(labels, **(args or {})),
+            })
+
+    @contextlib.contextmanager
+    def span(self, name, track=None, args=None, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.perf_counter() - start, track=track, args=args, **labels)
+
+    # --- читання ---
+
+    def _select(self, table, name):
+        with self.lock:
+            return [(dict(labels), value) for (n, labels), value in table.items() if n == name]
+
+    def total(self, name):
+        return sum(value for _, value in self._select(self.counters, name))
+
+    def by_label(self, name, label):
+        result = defaultdict(float)
+        for labels, value in self._select(self.counters, name):
+            result[labels.get(label)] += value
+        return dict(result)
+
+    def gauges_by_label(self, name, label):
+        return {labels.get(label): value for labels, value in self._select(self.gauges, name)}
+
+    def timer_total(self, name, label=None):
+        """
+        Сума секунд таймера (або словник значення мітки -> сума, якщо передано label).
+        """
+        rows = self._select(self.timers, name)
+        if label is None:
+            return sum(timer[1] for _, timer in rows)
+        result = defaultdict(float)
+        for labels, timer in rows:
+            result[labels.get(label)] += timer[1]
+        return dict(result)
+
+    def summary(self):
+        """
+        Підсумок запуску: завантаження за каналами, FloodWait, пропуски за причинами, кеш, скринінг, інференс, звіти.
+        Розділ inference включає і прохід скринінгу (мітка stage="screening"), і повний набір міток.
+        """
+        fetch_messages = self.by_label("fetch_messages_total", "chat")
+        fetch_seconds = self.timer_total("fetch_busy", "chat")
+        fetch = {
+            chat: {"messages": int(count), "seconds": round(fetch_seconds.get(chat, 0.0), 3),
+                   "messages_per_s": round(count / fetch_seconds[chat], 1) if fetch_seconds.get(chat) else None}
+            for chat, count in fetch_messages.items()
+        }
+
+        texts = self.total("classifier_texts_total")
+        hits = self.total("classifier_cache_hits_total")
+        inference_seconds = self.timer_total("inference")
+        tokens = self.total("inference_tokens_total")
+        padded = self.total("inference_padded_tokens_total")
+        texts_scored = self.total("inference_texts_total")
+        watch_timers = [timer for _, timer in self._select(self.timers, "watch_latency")]
+
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.perf_counter() - self.origin, 3),
+            "fetch": fetch,
+            "flood_wait": {
+                cls: {"waits": int(self.by_label("flood_waits_total", "request_class").get(cls, 0)),
+                      "seconds": round(seconds, 2)}
+                for cls, seconds in self.by_label("flood_wait_seconds_total", "request_class").items()
+            },
+            "preprocessing": {
+                "seen": int(self.total("messages_seen_total")),
+                "kept": int(self.total("messages_kept_total")),
+                "dropped": {reason: int(n) for reason, n in self.by_label("messages_dropped_total", "reason").items()},
+                "seconds": round(self.timer_total("prepare"), 3),
+            },
+            "classifier": {
+                "texts": int(texts),
+                "cache_hits": int(hits),
+                "cache_hit_rate": round(hits / texts, 4) if texts else None,
+                "near_duplicates": int(self.total("classifier_near_duplicates_total")),
+                "cascade": int(self.total("classifier_cascade_total")),
+                "seconds": round(self.timer_total("classify"), 3),
+            },
+            "screening": {
+                "texts": int(self.by_label("inference_texts_total", "stage").get("screening", 0)),
+                "screened_out": int(self.total("classifier_screened_out_total")),
+                "seconds": round(self.timer_total("inference", "stage").get("screening", 0.0), 3),
+            },
+            "inference": {
+                "batches": int(self.total("inference_batches_total")),
+                "texts": int(texts_scored),
+                "seconds": round(inference_seconds, 3),
+                "texts_per_s": round(texts_scored / inference_seconds, 1) if inference_seconds else None,
+                "tokens": int(tokens),
+                "tokens_per_s": round(tokens / inference_seconds, 1) if inference_seconds and tokens else None,
+                "padding_ratio": round(padded / (tokens + padded), 4) if tokens + padded else None,
+            },
+            "reports": {name: round(seconds, 3) for name, seconds in self.timer_total("report", "report").items()},
+            "watch": {
+                "posts": sum(timer[0] for timer in watch_timers),
+                "latency_max_seconds": round(max((timer[2] for timer in watch_timers), default=0.0), 3),
+                "latency_seconds": {name: round(value, 3) for name, value in
+                                    self.gauges_by_label("watch_latency_percentile_seconds", "percentile").items()},
+            },
+        }
+
+    # --- експорт ---
+
+    def to_prometheus(self):
+        """
+        Текстовий формат Prometheus (для node_exporter textfile collector або pushgateway).
+        Таймери експортуються як summary: <name>_seconds_count / _sum та gauge <name>_seconds_max.
+        """
+        def fmt(labels):
+            if not labels:
+                return ""
+            escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+            return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+        lines = []
+        with self.lock:
+            groups = defaultdict(list)
+            for (name, labels), value in self.counters.items():
+                groups[(name, "counter")].append((labels, value))
+            for (name, labels), value in self.gauges.items():
+                groups[(name, "gauge")].append((labels, value))
+            timers = sorted(self.timers.items())
+
+        for (name, kind), rows in sorted(groups.items()):
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}{name} {kind}")
+            lines.extend(f"{PROMETHEUS_PREFIX}{name}{fmt(labels)} {value:g}" for labels, value in sorted(rows))
+
+        by_name = defaultdict(list)
+        for (name, labels), timer in timers:
+            by_name[name].append((labels, timer))
+        for name, rows in by_name.items():
+            metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for labels, (count, total, _) in rows:
+                lines.append(f"{metric}_count{fmt(labels)} {count}")
+                lines.append(f"{metric}_sum{fmt(labels)} {total:.6f}")
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines.extend(f"{metric}_max{fmt(labels)} {timer[2]:.6f}" for labels, timer in rows)
+        return "\n".join(lines) + "\n"
+
+    def to_trace(self):
+        """
+        Chrome trace (chrome://tracing, https://ui.perfetto.dev): повні події "X" та назви доріжок.
+        """
+        with self.lock:
+            events = list(self.events)
+            tracks = dict(self.tracks)
+        pid = os.getpid()
+        names = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": track}}
+                 for track, tid in tracks.items()]
+        return {"traceEvents": names + events, "displayTimeUnit": "ms"}
+
+    def export(self, directory):
+        """
+        Записує run_summary.json, metrics.prom і (якщо ввімкнено трасування) trace.json. Повертає шляхи.
+        """
+        os.makedirs(directory, exist_ok=True)
+        outputs = {
+            SUMMARY_FILE: lambda f: json.dump(self.summary(), f, ensure_ascii=False, indent=2),
+            PROMETHEUS_FILE: lambda f: f.write(self.to_prometheus()),
+        }
+        if self.trace:
+            outputs[TRACE_FILE] = lambda f: json.dump(self.to_trace(), f)
+        paths = []
+        for filename, write in outputs.items():
+            path = os.path.join(directory, filename)
+            # Через тимчасовий файл, щоб збирач метрик не прочитав напівзаписаний файл
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                write(f)
+            os.replace(path + ".tmp", path)
+            paths.append(path)
+        return paths
+
+    def print_summary(self):
+        s = self.summary()
+        print("\n📈 Метрики запуску:")
+        for chat, f in s["fetch"].items():
+            rate = f"{f['messages_per_s']} повід./с" if f["messages_per_s"] else "—"
+            print(f"- Завантаження {chat}: {f['messages']} повідомлень за {f['seconds']} с ({rate})")
+        for cls, f in s["flood_wait"].items():
+            print(f"- FloodWait ({cls}): {f['waits']} разів, {f['seconds']} с")
+        pre = s["preprocessing"]
+        if pre["seen"]:
+            dropped = ", ".join(f"{reason}: {n}" for reason, n in pre["dropped"].items()) or "немає"
+            print(f"- Підготовка: відібрано {pre['kept']} з {pre['seen']} (пропущено — {dropped})")
+        cls = s["classifier"]
+        if cls["texts"]:
+            print(f"- Класифікація: {cls['texts']} текстів, влучань у кеш {cls['cache_hit_rate']:.1%}, "
+                  f"майже-дублікатів {cls['near_duplicates']}, каскад {cls['cascade']}")
+        scr = s["screening"]
+        if scr["texts"]:
+            print(f"- Скринінг: {scr['texts']} текстів за {scr['seconds']} с, "
+                  f"відсіяно як безпечні {scr['screened_out']}")
+        inf = s["inference"]
+        if inf["batches"]:
+            tokens = f", {inf['tokens_per_s']} токенів/с, паддинг {inf['padding_ratio']:.1%}" if inf["tokens"] else ""
+            print(f"- Інференс: {inf['batches']} батчів, {inf['texts_per_s']} текстів/с{tokens}")
+        watch = s["watch"]
+        if watch["posts"]:
+            parts = ", ".join(f"{name} {value * 1000:.0f} мс" for name, value in watch["latency_seconds"].items())
+            print(f"- Спостереження: {watch['posts']} постів, затримка {parts}")
+        if s["reports"]:
+            print(f"- Звіти: {sum(s['reports'].values()):.2f} с ({len(s['reports'])} шт.)")
+
+
+# Спільний екземпляр процесу: модулі записують метрики сюди, main.py експортує наприкінці запуску
+metrics = Metrics()
@@ -0,0 +1,198 @@
+# model_export.py
+import argparse
+import os
+import time
+import numpy as np
+from scoring import LABELS, DEFAULT_MODEL, DEFAULT_THRESHOLD, HYPOTHESIS_TEMPLATE, apply_threshold
+
+MODEL_DIR = "model"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+
+
+def local_model_dir(model_name):
+    """
+    Каталог у /model/ для збереженої копії моделі (токенізатор, конфіг, ONNX-графи).
+    """
+    return os.path.join(MODEL_DIR, model_name.replace("/", "__"))
+
+
+def torch_model_dir(model_name):
+    return os.path.join(local_model_dir(model_name), "torch")
+
+
+def resolve_model_source(model_name):
+    """
+    Локальна копія моделі у /model/ (safetensors), якщо вона є, інакше — назва моделі на Hugging Face Hub.
+    """
+    path = torch_model_dir(model_name)
+    if os.path.exists(os.path.join(path, "config.json")) and \
+            any(name.endswith(".safetensors") for name in os.listdir(path)):
+        return path
+    return model_name
+
+
+def save_local(model_name=DEFAULT_MODEL):
+    """
+    Зберігає модель і токенізатор у /model/ у форматі safetensors: далі вони читаються з диска
+    через mmap, без мережі та без повного копіювання ваг у пам'ять.
+    """
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    out_dir = torch_model_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    AutoModelForSequenceClassification.from_pretrained(model_name).save_pretrained(out_dir, safe_serialization=True)
+    print(f"✅ Модель збережено у {out_dir}")
+    return out_dir
+
+
+def onnx_model_path(model_name, backend):
+    return os.path.join(local_model_dir(model_name), "onnx", ONNX_FILES[backend])
+
+
+def export_onnx(model_name=DEFAULT_MODEL, quantize=True, opset=17):
+    """
+    Експортує модель у ONNX (і за потреби динамічно квантує ваги в int8) у каталог /model/.
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    out_dir = os.path.join(local_model_dir(model_name), "onnx")
+    os.makedirs(out_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    # Токенізатор і конфіг зберігаються поруч, щоб ONNX-бекенд працював без мережі
+    tokenizer.save_pretrained(out_dir)
+    model.config.save_pretrained(out_dir)
+
+    sample = tokenizer("приклад тексту", HYPOTHESIS_TEMPLATE.format(LABELS[0]), return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    fp32_path = onnx_model_path(model_name, "onnx")
+    print(f"📦 Експорт ONNX-графа у {fp32_path}...")
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        int8_path = onnx_model_path(model_name, "onnx-int8")
+        print(f"📦 Динамічна int8-квантизація у {int8_path}...")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    print("✅ Експорт завершено")
+    return out_dir
+
+
+def build_runner(model_name, backend, device="cpu", num_threads=0):
+    """
+    Повертає (tokenizer, runner, config) для вибраного бекенду.
+    """
+    from transformers import AutoTokenizer, AutoConfig
+    from nli_engine import TorchRunner, OnnxRunner
+
+    if backend == "torch":
+        from transformers import AutoModelForSequenceClassification
+
+        source = resolve_model_source(model_name)
+        tokenizer = AutoTokenizer.from_pretrained(source)
+        # safetensors відкриваються через mmap; low_cpu_mem_usage не створює проміжної копії ваг
+        model = AutoModelForSequenceClassification.from_pretrained(source, low_cpu_mem_usage=True,
+                                                                   use_safetensors=True if source != model_name else None)
+        return tokenizer, TorchRunner(model, device), model.config
+
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Невідомий бекенд: {backend}. Доступні: {', '.join(BACKENDS)}")
+    path = onnx_model_path(model_name, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ONNX-модель не знайдено: {path}. Спершу виконайте: python model_export.py export")
+    onnx_dir = os.path.dirname(path)
+    tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+    config = AutoConfig.from_pretrained(onnx_dir)
+    return tokenizer, OnnxRunner(path, num_threads=num_threads), config
+
+
+def check_parity(model_name=DEFAULT_MODEL, backend="onnx-int8", corpus=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Порівнює бекенд з torch на фіксованому наборі текстів: збіг міток, різниця оцінок і швидкість.
+    """
+    from nli_engine import NLIEngine, PARITY_CORPUS
+
+    texts = corpus or PARITY_CORPUS
+    timings, scores = {}, {}
+    for name in ("torch", backend):
+        tokenizer, runner, config = build_runner(model_name, name)
+        engine = NLIEngine(tokenizer, runner, config, LABELS, HYPOTHESIS_TEMPLATE)
+        engine.score(texts[:2])  # прогрів
+        start = time.perf_counter()
+        scores[name] = engine.score(texts)
+        timings[name] = time.perf_counter() - start
+
+    reference, candidate = scores["torch"], scores[backend]
+    same_labels = [apply_threshold(r, threshold)[0] == apply_threshold(c, threshold)[0]
+                   for r, c in zip(reference, candidate)]
+    per_label = ((reference >= threshold) == (candidate >= threshold)).mean(axis=0)
+    diff = np.abs(reference - candidate)
+    return {
+        "backend": backend,
+        "texts": len(texts),
+        "label_set_agreement": float(np.mean(same_labels)),
+        "per_label_agreement": {label: float(v) for label, v in zip(LABELS, per_label)},
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "speedup": timings["torch"] / timings[backend] if timings[backend] else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Експорт моделі в ONNX та перевірка відповідності бекендів")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    save_cmd = sub.add_parser("save", help="Зберегти модель у /model/ (safetensors) для запуску без мережі")
+    save_cmd.add_argument("--model", default=DEFAULT_MODEL)
+
+    export_cmd = sub.add_parser("export", help="Експортувати модель у ONNX (+ int8)")
+    export_cmd.add_argument("--model", default=DEFAULT_MODEL)
+    export_cmd.add_argument("--no-int8", action="store_true", help="Не створювати квантовану модель")
+
+    parity_cmd = sub.add_parser("parity", help="Порівняти бекенд з torch на фіксованому наборі")
+    parity_cmd.add_argument("--model", default=DEFAULT_MODEL)
+    parity_cmd.add_argument("--backend", choices=["onnx", "onnx-int8"], default="onnx-int8")
+    parity_cmd.add_argument("--corpus", help="Файл з текстами (по одному на рядок)")
+    args = parser.parse_args()
+
+    if args.command == "save":
+        save_local(args.model)
+        return
+
+    if args.command == "export":
+        export_onnx(args.model, quantize=not args.no_int8)
+        return
+
+    corpus = None
+    if args.corpus:
+        with open(args.corpus, 'r', encoding='utf-8') as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    report = check_parity(args.model, args.backend, corpus)
+    print(f"📊 Бекенд {report['backend']} проти torch на {report['texts']} текстах:")
+    print(f"- Збіг набору міток: {report['label_set_agreement']:.1%}")
+    for label, value in report["per_label_agreement"].items():
+        print(f"  - {label}: {value:.1%}")
+    print(f"- Різниця оцінок: max {report['max_abs_diff']:.4f}, mean {report['mean_abs_diff']:.4f}")
+    print(f"- Прискорення: ×{report['speedup']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
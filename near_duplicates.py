@@ -0,0 +1,193 @@
+# near_duplicates.py
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+from collections import defaultdict
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    key BLOB PRIMARY KEY,
+    sig BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bands (
+    bucket INTEGER NOT NULL,
+    key BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS matches (
+    key BLOB PRIMARY KEY,
+    match_key BLOB NOT NULL,
+    similarity REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_matches_match_key ON matches(match_key);
+"""
+
+
+class NearDuplicateIndex:
+    """
+    Індекс майже-дублікатів на MinHash (символьні шинґли) з LSH-бендингом, що зберігається в SQLite.
+    Для тексту шукаються кандидати з тим самим хешем хоча б одного бенду, а схожість оцінюється
+    за часткою однакових значень MinHash (оцінка коефіцієнта Жаккара).
+    Ключі — ключі записів кешу класифікації, тож за знайденим ключем беруться готові оцінки.
+    """
+
+    def __init__(self, path, num_perm=64, bands=16, shingle_size=5, threshold=0.8, min_length=20, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm має ділитися на кількість бендів")
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+        self.min_length = min_length  # короткі тексти надто неоднозначні для шинґлів
+
+        rng = np.random.default_rng(seed)
+        # Хешування multiply-shift: ((a * x + b) mod 2^64) >> 32, a — непарне
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        self._pending_sigs = {}
+        self._pending_bands = defaultdict(list)
+        self._pending_matches = []
+
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._migrate_bands()
+        self.conn.commit()
+
+    def _migrate_bands(self):
+        """
+        Унікальний індекс (bucket, key): повторне додавання вже проіндексованого тексту (наприклад, вирішеного
+        каскадом — такі не кешуються й додаються щоразу) не множить рядки. Файли, створені без цього індексу,
+        могли накопичити повтори — вони прибираються один раз.
+        """
+        exists = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_bands_unique'"
+        ).fetchone()
+        if exists:
+            return
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM bands WHERE rowid NOT IN (SELECT MIN(rowid) FROM bands GROUP BY bucket, key)"
+            )
+            self.conn.execute("DROP INDEX IF EXISTS idx_bands_bucket")
+            self.conn.execute("CREATE UNIQUE INDEX idx_bands_unique ON bands(bucket, key)")
+
+    # --- MinHash ---
+
+    def signature(self, text):
+        """
+        MinHash-підпис тексту (uint32 × num_perm) або None, якщо текст закороткий.
+        """
+        text = " ".join(text.lower().split())
+        if len(text) < self.min_length:
+            return None
+        k = self.shingle_size
+        shingles = {zlib.crc32(text[i:i + k].encode('utf-8')) for i in range(len(text) - k + 1)}
+        x = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        with np.errstate(over='ignore'):
+            hashed = (np.outer(x, self._a) + self._b) >> np.uint64(32)
+        return hashed.min(axis=0).astype(np.uint32)
+
+    def _buckets(self, sig):
+        buckets = []
+        for band in range(self.bands):
+            chunk = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            digest = hashlib.blake2b(bytes([band]) + chunk, digest_size=8).digest()
+            buckets.append(int.from_bytes(digest, "big", signed=True))
+        return buckets
+
+    def similarity(self, sig_a, sig_b):
+        return float(np.mean(sig_a == sig_b))
+
+    # --- пошук і додавання ---
+
+    def _candidates(self, buckets):
+        keys = set()
+        for bucket in buckets:
+            keys.update(self._pending_bands.get(bucket, ()))
+        placeholders = ",".join("?" * len(buckets))
+        rows = self.conn.execute(f"SELECT DISTINCT key FROM bands WHERE bucket IN ({placeholders})", buckets)
+        keys.update(row[0] for row in rows)
+        return keys
+
+    def _load_signatures(self, keys):
+        sigs = {k: self._pending_sigs[k] for k in keys if k in self._pending_sigs}
+        missing = [k for k in keys if k not in sigs]
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for key, blob in self.conn.execute(
+                    f"SELECT key, sig FROM signatures WHERE key IN ({placeholders})", chunk):
+                sigs[key] = np.frombuffer(blob, dtype=np.uint32)
+        return sigs
+
+    def query(self, text, sig=None, exclude=None):
+        """
+        Повертає (ключ, схожість) найближчого збереженого тексту зі схожістю ≥ threshold або None.
+        """
+        sig = self.signature(text) if sig is None else sig
+        if sig is None:
+            return None
+        candidates = self._candidates(self._buckets(sig))
+        candidates.discard(exclude)
+        best = None
+        for key, other in self._load_signatures(list(candidates)).items():
+            sim = self.similarity(sig, other)
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (key, sim)
+        return best
+
+    def add(self, key, text, sig=None):
+        """
+        Додає текст до індексу (записується на диск під час flush). Повертає False для закоротких текстів.
+        """
+        sig = self.signature(text) if sig is None else sig
+        if sig is None:
+            return False
+        if key in self._pending_sigs:
+            return True
+        self._pending_sigs[key] = sig
+        for bucket in self._buckets(sig):
+            self._pending_bands[bucket].append(key)
+        return True
+
+    def record_match(self, key, match_key, similarity):
+        self._pending_matches.append((key, match_key, similarity, time.time()))
+
+    def flush(self):
+        if not (self._pending_sigs or self._pending_matches):
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO signatures (key, sig) VALUES (?, ?)",
+                [(key, sig.tobytes()) for key, sig in self._pending_sigs.items()]
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO bands (bucket, key) VALUES (?, ?)",
+                [(bucket, key) for bucket, keys in self._pending_bands.items() for key in keys]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO matches (key, match_key, similarity, created) VALUES (?, ?, ?, ?)",
+                self._pending_matches
+            )
+        self._pending_sigs.clear()
+        self._pending_bands.clear()
+        self._pending_matches.clear()
+
+    def cluster_size(self, match_key):
+        self.flush()
+        return self.conn.execute("SELECT COUNT(*) FROM matches WHERE match_key = ?", (match_key,)).fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,235 @@
+# nli_engine.py
+import numpy as np
+from metrics import metrics
+
+
+def truncate_head_tail(ids, limit, head_ratio=0.5):
+    """
+    Обрізає послідовність токенів до limit, зберігаючи початок і кінець тексту.
+    """
+    if len(ids) <= limit:
+        return ids
+    head = int(limit * head_ratio)
+    tail = limit - head
+    return ids[:head] + (ids[-tail:] if tail else [])
+
+
+class TorchRunner:
+    """
+    Виконує прямий прохід PyTorch-моделі без обчислення градієнтів.
+    """
+
+    def __init__(self, model, device="cpu"):
+        import torch
+
+        self.torch = torch
+        self.model = model.to(device).eval()
+        self.device = device
+
+    def __call__(self, inputs):
+        torch = self.torch
+        with torch.inference_mode():
+            tensors = {name: torch.from_numpy(arr).to(self.device) for name, arr in inputs.items()}
+            return self.model(**tensors).logits.float().cpu().numpy()
+
+
+class OnnxRunner:
+    """
+    Виконує прямий прохід експортованого ONNX-графа через onnxruntime (CPU).
+    """
+
+    def __init__(self, model_path, num_threads=0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, inputs):
+        feed = {name: arr for name, arr in inputs.items() if name in self.input_names}
+        return self.session.run(None, feed)[0]
+
+
+class NLIEngine:
+    """
+    Zero-shot класифікація через NLI без HF-пайплайна:
+    - кожен текст (premise) токенізується один раз і повторно використовується для всіх гіпотез;
+    - тексти сортуються за довжиною, тож у батчі опиняються пари близької довжини;
+    - розмір батчу визначається загальною кількістю токенів (з урахуванням паддингу), а не кількістю текстів;
+    - довгі тексти обрізаються за політикою «початок + кінець» до max_tokens.
+    Оцінки для кожної мітки незалежні (як multi_label=True у пайплайні).
+    """
+
+    def __init__(self, tokenizer, runner, config, labels, hypothesis_template,
+                 max_tokens=512, head_ratio=0.5, token_budget=8192):
+        self.tokenizer = tokenizer
+        self.runner = runner
+        self.config = config
+        self.labels = list(labels)
+        self.hypothesis_template = hypothesis_template
+        self.head_ratio = head_ratio
+        self.token_budget = token_budget
+        self.input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids")
+                            if name in tokenizer.model_input_names]
+
+        # Ті самі індекси, що й у ZeroShotClassificationPipeline
+        self.entailment_id = -1
+        for label, idx in config.label2id.items():
+            if label.lower().startswith("entail"):
+                self.entailment_id = idx
+                break
+        self.contradiction_id = -1 if self.entailment_id == 0 else 0
+
+        # Гіпотези токенізуються один раз на весь час роботи
+        self.hypotheses = [
+            tokenizer(hypothesis_template.format(label), add_special_tokens=False)["input_ids"]
+            for label in self.labels
+        ]
+        model_limit = getattr(tokenizer, "model_max_length", max_tokens) or max_tokens
+        self.max_tokens = min(max_tokens, model_limit)
+        # Довжина пари = premise + службові токени + найдовша гіпотеза
+        self.pair_overhead = tokenizer.num_special_tokens_to_add(pair=True) + max(len(h) for h in self.hypotheses)
+        self.max_premise_tokens = self.max_tokens - self.pair_overhead
+
+        self.stats = {"batches": 0, "pairs": 0, "tokens": 0, "padded_tokens": 0}
+
+    def with_labels(self, labels):
+        """
+        Рушій з тими самими токенізатором і моделлю, але іншим набором міток (наприклад, одна гіпотеза скринінгу).
+        Модель не завантажується вдруге.
+        """
+        return NLIEngine(self.tokenizer, self.runner, self.config, labels, self.hypothesis_template,
+                         max_tokens=self.max_tokens, head_ratio=self.head_ratio, token_budget=self.token_budget)
+
+    def _encode_premises(self, texts):
+        ids = self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        return [truncate_head_tail(p, self.max_premise_tokens, self.head_ratio) for p in ids]
+
+    def _make_batches(self, premises):
+        """
+        Групує індекси текстів у батчі за бюджетом токенів (довжина найдовшої пари × кількість пар).
+        """
+        order = sorted(range(len(premises)), key=lambda i: len(premises[i]))
+        pairs_per_text = len(self.hypotheses)
+        batch = []
+        for idx in order:
+            # Порядок зростаючий, тож поточний текст — найдовший у батчі
+            longest = len(premises[idx]) + self.pair_overhead
+            if batch and (len(batch) + 1) * pairs_per_text * longest > self.token_budget:
+                yield batch
+                batch = []
+            batch.append(idx)
+        if batch:
+            yield batch
+
+    def _build_inputs(self, premise_batch):
+        rows, types = [], []
+        for premise in premise_batch:
+            for hypothesis in self.hypotheses:
+                rows.append(self.tokenizer.build_inputs_with_special_tokens(premise, hypothesis))
+                types.append(self.tokenizer.create_token_type_ids_from_sequences(premise, hypothesis))
+
+        width = max(len(r) for r in rows)
+        pad_id = self.tokenizer.pad_token_id or 0
+        input_ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        token_type_ids = np.zeros((len(rows), width), dtype=np.int64)
+        for i, (row, row_types) in enumerate(zip(rows, types)):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+            token_type_ids[i, :len(row_types)] = row_types
+
+        real_tokens = int(attention_mask.sum())
+        self.stats["batches"] += 1
+        self.stats["pairs"] += len(rows)
+        self.stats["tokens"] += real_tokens
+        self.stats["padded_tokens"] += input_ids.size - real_tokens
+        metrics.inc("inference_batches_total")
+        metrics.inc("inference_tokens_total", real_tokens)
+        metrics.inc("inference_padded_tokens_total", input_ids.size - real_tokens)
+
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask, "token_type_ids": token_type_ids}
+        return {name: inputs[name] for name in self.input_names}
+
+    def score(self, texts):
+        """
+        Повертає масив float32 розміром (кількість текстів, кількість міток) у порядку вхідних текстів.
+        """
+        texts = list(texts)
+        scores = np.zeros((len(texts), len(self.labels)), dtype=np.float32)
+        if not texts:
+            return scores
+
+        premises = self._encode_premises(texts)
+        for batch in self._make_batches(premises):
+            logits = self.runner(self._build_inputs([premises[i] for i in batch]))
+            logits = logits.reshape(len(batch), len(self.labels), -1)
+            # softmax між «суперечністю» та «слідуванням» для кожної мітки окремо
+            pair = logits[..., [self.contradiction_id, self.entailment_id]].astype(np.float64)
+            pair = np.exp(pair - pair.max(axis=-1, keepdims=True))
+            scores[batch] = (pair[..., 1] / pair.sum(axis=-1)).astype(np.float32)
+        return scores
+
+    def padding_ratio(self):
+        total = self.stats["tokens"] + self.stats["padded_tokens"]
+        return self.stats["padded_tokens"] / total if total else 0.0
+
+
+def compare_with_pipeline(zero_shot_pipeline, engine, texts):
+    """
+    Порівнює оцінки NLIEngine з HF-пайплайном на тих самих текстах.
+    Повертає максимальну абсолютну різницю оцінок.
+    """
+    reference = zero_shot_pipeline(list(texts), candidate_labels=engine.labels, multi_label=True)
+    if not isinstance(reference, list):
+        reference = [reference]
+    expected = np.array([
+        [dict(zip(r["labels"], r["scores"]))[label] for label in engine.labels] for r in reference
+    ], dtype=np.float32)
+    return float(np.abs(expected - engine.score(texts)).max())
+
+
+# Фіксований багатомовний набір для перевірки відповідності рушіїв
+PARITY_CORPUS = [
+    "доброго ранку, сьогодні в місті сонячно і тепло",
+    "they are subhuman and should be driven out of our country",
+    "наша армія звільнить усі землі від нацистів, слава великій державі",
+    "продам дитячі фото, пишіть в особисті",
+    "я більше не можу, хочу просто зникнути назавжди",
+    "нова серія подкасту вже доступна, посилання в біо",
+    "все, кто против власти, — предатели и враги народа",
+    "дякуємо волонтерам за допомогу з евакуацією тварин",
+    "i will find where you live and make you regret every word",
+    "розклад руху поїздів змінено через ремонт колії " * 40,
+]
+
+
+def main():
+    import argparse
+    from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+    from scoring import LABELS, DEFAULT_MODEL, HYPOTHESIS_TEMPLATE
+
+    parser = argparse.ArgumentParser(description="Перевірка відповідності NLIEngine і HF-пайплайна")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--tolerance", type=float, default=1e-3)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForSequenceClassification.from_pretrained(args.model)
+    engine = NLIEngine(tokenizer, TorchRunner(model), model.config, LABELS, HYPOTHESIS_TEMPLATE)
+    zero_shot = pipeline("zero-shot-classification", model=model, tokenizer=tokenizer,
+                         hypothesis_template=HYPOTHESIS_TEMPLATE)
+
+    # Тексти, довші за max_tokens, обрізаються по-різному, тому порівнюємо лише ті, що вміщаються
+    fitting = [t for t in PARITY_CORPUS if len(tokenizer(t)["input_ids"]) <= engine.max_premise_tokens]
+    diff = compare_with_pipeline(zero_shot, engine, fitting)
+    status = "✅" if diff <= args.tolerance else "❌"
+    print(f"{status} Максимальна різниця оцінок: {diff:.6f} (допуск {args.tolerance})")
+    print(f"📦 Батчів: {engine.stats['batches']}, частка паддингу: {engine.padding_ratio():.1%}")
+
+
+if __name__ == "__main__":
+    main()
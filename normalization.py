@@ -0,0 +1,154 @@
+# normalization.py
+import re
+from collections import Counter
+
+# Шаблони компілюються один раз під час імпорту.
+# HTML-теги та посилання трапляються рідко, тож відповідні проходи запускаються лише за наявності «<» чи «http»/«www.»;
+# основний прохід прибирає цілі послідовності некорисних символів (емодзі тощо) за одну заміну.
+_HTML_PATTERN = re.compile(r'<.*?>')
+_URL_PATTERN = re.compile(r'http\S+|www\.\S+')
+_JUNK_PATTERN = re.compile(r'[^\w\s.,!?"\'@#%&:;()\[\]{}-]+', flags=re.UNICODE)
+_MEDIA_PLACEHOLDERS = frozenset(["[media]", "[photo]", "[video]"])
+
+# Причини відсіювання повідомлень
+TOO_SHORT = "too_short"
+DIGITS_ONLY = "digits_only"
+NO_LETTERS = "no_letters"
+REPEATED_CHAR = "repeated_char"
+MEDIA_PLACEHOLDER = "media_placeholder"
+EMPTY = "empty"
+
+REASON_TITLES = {
+    TOO_SHORT: "занадто короткі",
+    DIGITS_ONLY: "складаються лише з цифр",
+    NO_LETTERS: "не містять букв",
+    REPEATED_CHAR: "складаються з одного повторюваного символу",
+    MEDIA_PLACEHOLDER: "лише позначка медіа",
+    EMPTY: "порожні після очищення",
+}
+
+
+def clean_text(text):
+    """
+    Очищає текст: прибирає HTML, посилання, спецсимволи, зайві пробіли та переводить у нижній регістр.
+    """
+    if '<' in text:
+        text = _HTML_PATTERN.sub('', text)
+    if 'http' in text or 'www.' in text:
+        text = _URL_PATTERN.sub(' ', text)
+    # split/join замість re.sub(r'\s+') — одночасно прибирає зайві пробіли та обрізає краї
+    return ' '.join(_JUNK_PATTERN.sub('', text).split()).lower()
+
+
+def _is_repeated_char(text):
+    # strip зупиняється на першому іншому символі — на звичайному тексті це O(1), на відміну від set(text)
+    return not text.strip(text[0])
+
+
+def invalid_reason(text):
+    """
+    Повертає причину, з якої текст не підходить для аналізу, або None.
+    Текст має бути вже обрізаний (strip).
+    """
+    if len(text) < 3:
+        return TOO_SHORT
+    if text.isdigit():
+        return DIGITS_ONLY
+    if not any(char.isalpha() for char in text):
+        return NO_LETTERS
+    if _is_repeated_char(text):
+        return REPEATED_CHAR
+    return None
+
+
+def classifiable_reason(text):
+    """
+    Перевірка тексту безпосередньо перед класифікацією (вже очищений текст або довільний рядок).
+    """
+    if not text:
+        return EMPTY
+    if len(text) < 3:
+        return TOO_SHORT
+    if len(text) <= 7 and text.lower() in _MEDIA_PLACEHOLDERS:
+        return MEDIA_PLACEHOLDER
+    if text.isdigit():
+        return DIGITS_ONLY
+    if _is_repeated_char(text):
+        return REPEATED_CHAR
+    return None
+
+
+def text_for_analysis(msg):
+    """
+    Текст для аналізу з позначкою медіа, якщо вона є.
+    """
+    text = msg.get('text', '').strip()
+    media_type = msg.get('media_type')
+    media_tag = f"[MEDIA: {media_type}]" if media_type else ""
+
+    if text and media_tag:
+        return clean_text(text + " " + media_tag)
+    elif media_tag:
+        return media_tag.lower()
+    elif text:
+        return clean_text(text)
+    else:
+        return ""
+
+
+class DropStats:
+    """
+    Лічильники відсіяних повідомлень за причинами (замість print для кожного повідомлення).
+    """
+
+    def __init__(self):
+        self.reasons = Counter()
+        self.seen = 0
+        self.kept = 0
+
+    def merge(self, other):
+        self.reasons.update(other.reasons)
+        self.seen += other.seen
+        self.kept += other.kept
+
+    def summary(self):
+        dropped = sum(self.reasons.values())
+        if not dropped:
+            return f"✅ Відібрано {self.kept} з {self.seen} повідомлень"
+        parts = [f"{REASON_TITLES.get(reason, reason)}: {count}" for reason, count in self.reasons.most_common()]
+        return f"⚠️ Пропущено {dropped} з {self.seen} повідомлень ({'; '.join(parts)})"
+
+
+def iter_prepared(messages, stats=None):
+    """
+    Пакетний прохід по списку або ітератору повідомлень: перевірка, очищення й підготовка до класифікації.
+    Повертає генератор {'id', 'text'}; повідомлення, що пройшли, вже не потребують повторної перевірки.
+    """
+    stats = stats if stats is not None else DropStats()
+    for msg in messages:
+        stats.seen += 1
+        reason = invalid_reason(msg['text'].strip())
+        if reason is None:
+            prepared_text = text_for_analysis(msg)
+            reason = classifiable_reason(prepared_text)
+        if reason is not None:
+            stats.reasons[reason] += 1
+            continue
+        stats.kept += 1
+        yield {'id': msg['id'], 'text': prepared_text}
+
+
+def normalize_texts(texts, stats=None):
+    """
+    Пакетна перевірка довільних рядків перед класифікацією. Повертає (індекс, очищений рядок) для придатних.
+    """
+    stats = stats if stats is not None else DropStats()
+    for idx, text in enumerate(texts):
+        stats.seen += 1
+        text = text.strip() if text else ""
+        reason = classifiable_reason(text)
+        if reason is not None:
+            stats.reasons[reason] += 1
+            continue
+        stats.kept += 1
+        yield idx, text
@@ -0,0 +1,154 @@
+# parallel_inference.py
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from metrics import metrics
+from scoring import LABELS
+
+# Рушій, створений у процесі-воркері (по одному екземпляру моделі на процес)
+_worker_engine = None
+# Рушії з іншими наборами міток (наприклад, скринінг), що використовують ту саму модель воркера
+_worker_derived = {}
+
+
+def _init_worker(model_name, backend, hypothesis_template, max_tokens, token_budget, threads):
+    """
+    Ініціалізація воркера: фіксуємо кількість потоків до завантаження моделі, потім будуємо рушій.
+    """
+    global _worker_engine
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from nli_engine import NLIEngine
+    from model_export import build_runner
+
+    if backend == "torch":
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    tokenizer, runner, config = build_runner(model_name, backend, "cpu", num_threads=threads)
+    _worker_engine = NLIEngine(tokenizer, runner, config, LABELS, hypothesis_template,
+                               max_tokens=max_tokens, token_budget=token_budget)
+
+
+def _score_chunk(texts, labels=None):
+    """
+    Оцінки частини та приріст статистики рушія воркера (батчі, токени, паддинг) для метрик головного процесу.
+    labels — інший набір міток замість LABELS (рушій для нього створюється у воркері один раз).
+    """
+    engine = _worker_engine
+    if labels is not None:
+        engine = _worker_derived.get(labels)
+        if engine is None:
+            engine = _worker_derived[labels] = _worker_engine.with_labels(labels)
+    before = dict(engine.stats)
+    scores = engine.score(texts)
+    return scores, {name: value - before[name] for name, value in engine.stats.items()}
+
+
+class LabelsView:
+    """
+    Інтерфейс score(texts) для іншого набору міток поверх тих самих воркерів ParallelScorer.
+    """
+
+    def __init__(self, scorer, labels):
+        self.scorer = scorer
+        self.labels = tuple(labels)
+
+    def score(self, texts):
+        return self.scorer.score(texts, labels=self.labels)
+
+
+class ParallelScorer:
+    """
+    Розподіляє оцінювання текстів між N процесами-воркерами з фіксованою кількістю потоків.
+    Має той самий інтерфейс score(texts), що й NLIEngine; результати повертаються у порядку входу.
+    Частини, що завершились помилкою (або впали разом з воркером), повторюються до max_retries разів.
+    Кожен воркер має власний екземпляр моделі; ваги safetensors та ONNX-графи читаються через mmap,
+    тож сторінки файлу моделі спільні для всіх процесів у кеші ОС.
+    """
+
+    def __init__(self, model_name, backend, hypothesis_template, max_tokens=512, token_budget=8192,
+                 workers=2, threads_per_worker=None, chunk_texts=64, max_retries=2):
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.chunk_texts = chunk_texts
+        self.max_retries = max_retries
+        self._init_args = (model_name, backend, hypothesis_template, max_tokens, token_budget,
+                           self.threads_per_worker)
+        self._executor = None
+        self._start()
+
+    @property
+    def preferred_chunk(self):
+        # Достатньо роботи, щоб завантажити всі воркери кількома частинами
+        return self.chunk_texts * self.workers * 4
+
+    def _start(self):
+        # spawn: кожен воркер отримує чистий інтерпретатор без успадкованих потоків torch
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=self._init_args,
+        )
+
+    def _restart(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._start()
+
+    def with_labels(self, labels):
+        return LabelsView(self, labels)
+
+    def score(self, texts, labels=None):
+        texts = list(texts)
+        scores = np.zeros((len(texts), len(labels or LABELS)), dtype=np.float32)
+        if not texts:
+            return scores
+
+        # Сортуємо за довжиною, щоб кожна частина була однорідною і мала мінімум паддингу
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        chunks = [order[i:i + self.chunk_texts] for i in range(0, len(order), self.chunk_texts)]
+        attempts = [0] * len(chunks)
+        results = {}
+        pending = list(range(len(chunks)))
+
+        while pending:
+            futures = {}
+            for c in pending:
+                try:
+                    futures[c] = self._executor.submit(_score_chunk, [texts[i] for i in chunks[c]], labels)
+                except BrokenProcessPool as e:
+                    futures[c] = e
+
+            failed = []
+            broken = False
+            for c, future in futures.items():
+                try:
+                    if isinstance(future, Exception):
+                        raise future
+                    results[c], stats = future.result()
+                    metrics.inc("inference_batches_total", stats["batches"])
+                    metrics.inc("inference_tokens_total", stats["tokens"])
+                    metrics.inc("inference_padded_tokens_total", stats["padded_tokens"])
+                except Exception as e:
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    attempts[c] += 1
+                    if attempts[c] > self.max_retries:
+                        raise RuntimeError(f"Частина {c} не оброблена після {self.max_retries} повторів: {e}") from e
+                    print(f"⚠️ Помилка воркера ({e}), повтор {attempts[c]}/{self.max_retries}")
+                    failed.append(c)
+            if broken:
+                self._restart()
+            pending = failed
+
+        for c, chunk in enumerate(chunks):
+            scores[chunk] = results[c]
+        return scores
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,339 @@
+# pipeline.py
+import asyncio
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from budget import Budget, priority
+from columnar_store import ColumnarStore, columns_path
+from fetch_scheduler import FetchScheduler, DEFAULT_CONCURRENCY
+from message_store import MessageStore, store_path
+from normalization import DropStats
+from preprocessing import prepare_messages
+from report_generator import safe_dir_name, create_output_folder
+from metrics import metrics
+from report_pool import ReportPool
+from utils import messages_path, load_sync_state, save_sync_state
+
+# Кількість постів в одному мікробатчі та максимальна кількість мікробатчів у черзі
+MICRO_BATCH = 64
+QUEUE_SIZE = 8
+
+
+class ChatState:
+    """
+    Стан обробки одного каналу. Нові пости та їхні результати пишуться у сховище акаунта (MessageStore)
+    мікробатчами, а після завершення каналу історія вивантажується в JSON-файли для сумісності.
+    """
+
+    def __init__(self, phone, sel, store, columns=None):
+        self.phone = phone
+        self.sel = sel
+        self.store = store
+        self.columns = columns  # спільне колонкове сховище акаунта (ColumnarStore)
+        self.fetched = 0
+        self.classified = 0
+        self.drops = DropStats()  # причини пропуску постів за весь канал
+        self.max_id = sel.get('min_id', 0)
+        self.messages_file = messages_path(phone, sel['title'])
+        self.classified_file = messages_path(phone, sel['title'], prefix="classified")
+
+    def export_history(self):
+        """
+        Вивантажує всю історію каналу у messages_*.json і classified_*.json (для rethreshold та інших
+        інструментів, що працюють з файлами) та повертає загальну кількість класифікованих.
+        """
+        chat_id = self.sel['id']
+        self.store.export_json(chat_id, self.messages_file, table="messages")
+        return self.store.export_json(chat_id, self.classified_file, table="results")
+
+
+async def fetch_stage(tg, selected_chats, queue, micro_batch=MICRO_BATCH,
+                      concurrency=DEFAULT_CONCURRENCY, use_takeout=False, pool=None, download_media=False):
+    """
+    Завантажує канали (кілька одночасно) та передає пости мікробатчами.
+    Якщо черга заповнена — завантаження чекає (backpressure).
+    pool (SessionPool) — розподілити канали між кількома акаунтами (concurrency — на кожен акаунт).
+    download_media — завантажувати фото постів у data/<телефон>/media.
+    """
+    async def on_batch(sel, batch):
+        await queue.put(("batch", sel, batch))
+
+    async def on_done(sel, completed):
+        await queue.put(("done", sel, completed))
+
+    if pool is not None:
+        scheduler = pool.scheduler(per_account=concurrency, micro_batch=micro_batch, download_media=download_media)
+    else:
+        scheduler = FetchScheduler(tg, concurrency=concurrency, use_takeout=use_takeout, micro_batch=micro_batch,
+                                   download_media=download_media)
+    try:
+        print(f"\n📥 Завантаження повідомлень з {len(selected_chats)} каналів (одночасно до {concurrency})...")
+        await scheduler.run(selected_chats, on_batch, on_done)
+    finally:
+        # Сигнал завершення для етапу класифікації (також у разі помилки завантаження)
+        await queue.put(None)
+
+
+def _classify_posts(classifier, store, columns, chat_id, posts, drops):
+    """
+    Класифікує пости каналу, записує результати в сховища й прибирає пости з черги відкладених.
+    """
+    results = classifier.classify_messages(prepare_messages(posts, stats=drops), show_progress=False)
+    store.put_results(chat_id, results)
+    if columns is not None:
+        columns.append(chat_id, results, {post['id']: post for post in posts})
+    store.drop_pending(chat_id, [post['id'] for post in posts])
+    return len(results)
+
+
+def _drain_pending(classifier, state):
+    """
+    Докласифіковує пости каналу, відкладені попереднім запуском з обмеженим бюджетом (run_budgeted).
+    """
+    chat_id = state.sel['id']
+    posts = [post for _, post in state.store.top_pending([chat_id])]
+    if not posts:
+        return
+    print(f"↩️ «{state.sel['title']}»: класифікація {len(posts)} постів, відкладених попереднім запуском")
+    for i in range(0, len(posts), MICRO_BATCH):
+        state.classified += _classify_posts(classifier, state.store, state.columns, chat_id,
+                                            posts[i:i + MICRO_BATCH], state.drops)
+
+
+def _finish_chat(classifier, state, sync_state, reports, completed=True):
+    """
+    Докласифіковує відкладені пости, вивантажує історію каналу в JSON, оновлює позначку синхронізації
+    та передає звіти за всю історію в пул звітів (виконується поза циклом подій).
+    """
+    sel = state.sel
+    _drain_pending(classifier, state)
+    total_classified = state.export_history()
+    # Позначку оновлюємо лише після повного завантаження, інакше між старою та новою позначкою лишилась би прогалина
+    if completed and state.max_id:
+        sync_state[sel['id']] = {'max_id': state.max_id, 'title': sel['title']}
+        save_sync_state(state.phone, sync_state)
+
+    if sel.get('min_id'):
+        print(f"🆕 «{sel['title']}»: {state.fetched} нових постів з моменту останньої синхронізації")
+    elif state.fetched < sel['limit']:
+        print(f"⚠️ Завантажено лише {state.fetched} повідомлень з каналу \"{sel['title']}\" (запитувалось {sel['limit']}).")
+    if state.drops.reasons:
+        print(f"«{sel['title']}»: {state.drops.summary()}")
+    if not total_classified:
+        print(f"❌ Немає повідомлень для класифікації з каналу «{sel['title']}»!")
+        return
+    print(f"📊 Генерація звіту для «{sel['title']}»...")
+    output_path = create_output_folder("reports", safe_dir_name(state.classified_file))
+    reports.submit(sel['title'], state.store.path, sel['id'], output_path,
+                   columns_dir=state.columns.path if state.columns is not None else None)
+
+
+def _process_batch(classifier, state, batch):
+    state.store.put_messages(state.sel['id'], batch)
+    state.fetched += len(batch)
+    state.max_id = max(state.max_id, max(post['id'] for post in batch))
+    state.classified += _classify_posts(classifier, state.store, state.columns, state.sel['id'], batch, state.drops)
+
+
+async def classify_stage(queue, classifier, phone, executor, sync_state, store, columns=None, reports=None):
+    """
+    Бере мікробатчі з черги та класифікує їх у виконавці, не блокуючи завантаження наступних постів.
+    Звіти завершених каналів формує пул reports, тож класифікація наступних постів на них не чекає.
+    """
+    loop = asyncio.get_running_loop()
+    states = {}
+    while True:
+        item = await queue.get()
+        if item is None:
+            break
+        # payload: для "batch" — список постів, для "done" — ознака повного завантаження каналу
+        kind, sel, payload = item
+        state = states.get(sel['id'])
+        if state is None:
+            state = states[sel['id']] = ChatState(phone, sel, store, columns)
+
+        if kind == "batch":
+            await loop.run_in_executor(executor, _process_batch, classifier, state, payload)
+            print(f"🧠 «{sel['title']}»: класифіковано {state.classified} з {state.fetched} постів")
+        else:
+            if state.fetched == 0 and sel.get('min_id') and not store.pending_count([sel['id']]):
+                # Нових і відкладених постів немає — історія й звіти актуальні
+                print(f"✅ «{sel['title']}»: нових постів немає")
+                states.pop(sel['id'])
+                continue
+            await loop.run_in_executor(executor, _finish_chat, classifier, states.pop(sel['id']), sync_state,
+                                       reports, payload)
+
+
+def _import_legacy_history(store, phone, sel):
+    """
+    Якщо канал ще не має записів у сховищі, переносить історію з попередніх messages_*/classified_*.json.
+    """
+    messages_file = messages_path(phone, sel['title'])
+    if store.count(sel['id']) or not os.path.exists(messages_file):
+        return
+    posts, results = store.import_json(sel['id'], messages_file, messages_path(phone, sel['title'], prefix="classified"))
+    print(f"📦 «{sel['title']}»: перенесено у сховище {posts} постів і {results} результатів з JSON")
+
+
+async def run_pipeline(tg, classifier, selected_chats, phone, micro_batch=MICRO_BATCH, queue_size=QUEUE_SIZE,
+                       concurrency=DEFAULT_CONCURRENCY, use_takeout=False, incremental=True, pool=None, reports=None,
+                       download_media=False, columns=None):
+    """
+    Потокова обробка: завантаження → підготовка → класифікація → звіти.
+    Поки одні канали класифікуються, інші вже завантажуються; обмежена черга стримує пам'ять.
+    При incremental=True завантажуються та класифікуються лише пости, новіші за збережену позначку каналу,
+    а звіти формуються за всю історію.
+    З pool (SessionPool) канали завантажують кілька акаунтів, а пости й результати все одно пишуться
+    в одне сховище акаунта phone.
+    reports (ReportPool) — спільний пул звітів; якщо не передано, створюється власний і наприкінці
+    обробки пайплайн чекає, доки всі звіти буде записано.
+    columns — колонкове сховище акаунта, спільне з іншими письменниками процесу (режим спостереження);
+    якщо не передано, відкривається власне.
+    """
+    sync_state = load_sync_state(phone) if incremental else {}
+    selected_chats = [dict(sel, min_id=sync_state.get(sel['id'], {}).get('max_id', 0)) for sel in selected_chats]
+
+    store = MessageStore(store_path(phone))
+    for sel in selected_chats:
+        store.upsert_chat(sel['id'], sel['title'])
+        _import_legacy_history(store, phone, sel)
+    # Колонкова копія результатів усіх каналів акаунта для швидкої аналітики
+    columns = columns if columns is not None else ColumnarStore(columns_path(phone))
+    queue = asyncio.Queue(maxsize=queue_size)
+    own_reports = reports is None
+    if own_reports:
+        reports = ReportPool()
+    try:
+        # Один потік: модель і кеш класифікатора не розраховані на паралельні виклики
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            await asyncio.gather(
+                fetch_stage(tg, selected_chats, queue, micro_batch, concurrency, use_takeout, pool, download_media),
+                classify_stage(queue, classifier, phone, executor, sync_state, store, columns, reports),
+            )
+    finally:
+        if own_reports:
+            reports.join()
+    store.close()
+
+
+def _classify_by_priority(classifier, store, columns, chat_ids, budget, drops):
+    """
+    Класифікує відкладені пости вибраних каналів від найпріоритетніших, доки черга не спорожніє
+    або не вичерпано бюджет. Розмір шматка підбирається за виміряною швидкістю, щоб не перевищити ліміт часу.
+    Повертає {chat_id: класифіковано}.
+    """
+    classified = Counter()
+    rate = None
+    while True:
+        n = budget.allowance(rate)
+        if not n:
+            break
+        chunk = store.top_pending(chat_ids, n)
+        if not chunk:
+            break
+        start = time.perf_counter()
+        by_chat = {}
+        for chat_id, post in chunk:
+            by_chat.setdefault(chat_id, []).append(post)
+        for chat_id, posts in by_chat.items():
+            classified[chat_id] += _classify_posts(classifier, store, columns, chat_id, posts, drops[chat_id])
+        budget.charge(len(chunk))
+        rate = len(chunk) / max(time.perf_counter() - start, 1e-6)
+        print(f"🧠 Класифіковано {budget.used} постів за пріоритетом ({rate:.0f} пост/с)")
+    return classified
+
+
+async def run_budgeted(tg, classifier, selected_chats, phone, budget=None, concurrency=DEFAULT_CONCURRENCY,
+                       use_takeout=False, incremental=True, pool=None, reports=None, download_media=False,
+                       columns=None):
+    """
+    Аналіз з обмеженим бюджетом (budget — Budget: ліміт часу та/або кількості постів на класифікацію).
+    Спершу завантажуються нові пости (не довше за частку ліміту часу) і стають у чергу відкладених
+    з пріоритетом (budget.priority: свіжість, реакції, охоплення); потім черга класифікується від
+    найпріоритетніших постів, доки вистачає бюджету (частина ліміту часу лишається на вивантаження й звіти).
+    Звіти позначаються як часткові, якщо в черзі лишились пости, — наступний запуск (у тому числі звичайний)
+    продовжить з них; пріоритети відкладених постів на його початку перераховуються.
+    columns — як у run_pipeline.
+    """
+    budget = budget or Budget()
+    sync_state = load_sync_state(phone) if incremental else {}
+    selected_chats = [dict(sel, min_id=sync_state.get(sel['id'], {}).get('max_id', 0)) for sel in selected_chats]
+    chat_ids = [sel['id'] for sel in selected_chats]
+
+    store = MessageStore(store_path(phone))
+    for sel in selected_chats:
+        store.upsert_chat(sel['id'], sel['title'])
+        _import_legacy_history(store, phone, sel)
+    columns = columns if columns is not None else ColumnarStore(columns_path(phone))
+    max_ids = {}
+    fetched = set()  # канали, завантажені повністю
+    now = time.time()
+    # Пости, відкладені попередніми запусками, отримують свіжість на поточний момент, щоб не випереджати нові
+    requeued = store.reprioritize_pending(chat_ids, lambda post: priority(post, now))
+    if requeued:
+        print(f"↩️ У черзі з попередніх запусків: {requeued} постів (пріоритети оновлено)")
+
+    async def on_batch(sel, batch):
+        store.put_messages(sel['id'], batch)
+        store.put_pending(sel['id'], {post['id']: priority(post, now) for post in batch})
+        max_ids[sel['id']] = max(max_ids.get(sel['id'], 0), max(post['id'] for post in batch))
+
+    async def on_done(sel, completed):
+        # Позначка оновлюється лише після повного завантаження каналу: непрокласифіковані пости вже в черзі
+        if completed:
+            fetched.add(sel['id'])
+        if completed and max_ids.get(sel['id']):
+            sync_state[sel['id']] = {'max_id': max_ids[sel['id']], 'title': sel['title']}
+            save_sync_state(phone, sync_state)
+
+    if pool is not None:
+        scheduler = pool.scheduler(per_account=concurrency, micro_batch=MICRO_BATCH, download_media=download_media)
+    else:
+        scheduler = FetchScheduler(tg, concurrency=concurrency, use_takeout=use_takeout, micro_batch=MICRO_BATCH,
+                                   download_media=download_media)
+    print(f"\n⏱️ Аналіз з обмеженим бюджетом: {budget.describe()}")
+    print(f"📥 Завантаження повідомлень з {len(selected_chats)} каналів (одночасно до {concurrency})...")
+    try:
+        await asyncio.wait_for(scheduler.run(selected_chats, on_batch, on_done), budget.fetch_timeout())
+    except asyncio.TimeoutError:
+        print("⏱️ Час на завантаження вичерпано — аналізуємо те, що встигли завантажити")
+
+    own_reports = reports is None
+    if own_reports:
+        reports = ReportPool()
+    drops = {chat_id: DropStats() for chat_id in chat_ids}
+    try:
+        loop = asyncio.get_running_loop()
+        # Один потік: модель і кеш класифікатора не розраховані на паралельні виклики
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            print(f"🧠 У черзі на класифікацію: {store.pending_count(chat_ids)} постів")
+            classified = await loop.run_in_executor(executor, _classify_by_priority, classifier, store, columns,
+                                                    chat_ids, budget, drops)
+        for sel in selected_chats:
+            chat_id = sel['id']
+            pending = store.pending_count([chat_id])
+            coverage = {'posts': store.count(chat_id), 'pending': pending, 'reason': budget.reason,
+                        'fetched': chat_id in fetched}
+            metrics.set("budget_pending_posts", pending, chat=sel['title'])
+            print(f"📌 «{sel['title']}»: класифіковано {classified[chat_id]} постів, у черзі лишилось {pending}")
+            if drops[chat_id].reasons:
+                print(f"«{sel['title']}»: {drops[chat_id].summary()}")
+            state = ChatState(phone, sel, store, columns)
+            if not state.export_history():
+                print(f"❌ Немає повідомлень для класифікації з каналу «{sel['title']}»!")
+                continue
+            output_path = create_output_folder("reports", safe_dir_name(state.classified_file))
+            reports.submit(sel['title'], store.path, chat_id, output_path, columns_dir=columns.path,
+                           coverage=coverage)
+        pending = store.pending_count(chat_ids)
+        if pending:
+            print(f"⏸️ Бюджет вичерпано ({budget.reason}): {pending} постів лишились у черзі — "
+                  f"наступний запуск продовжить з них")
+        else:
+            print("✅ Усі завантажені пости класифіковано в межах бюджету")
+    finally:
+        if own_reports:
+            reports.join()
+    store.close()
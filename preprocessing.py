@@ -1,56 +1,33 @@
 import json
-import re
+from metrics import metrics
+from normalization import DropStats, clean_text, invalid_reason, iter_prepared, text_for_analysis
+
+# clean_text залишено тут для сумісності: реалізація — одноразовий прохід у normalization.py
+__all__ = ["clean_text", "generate_text_for_analysis", "filter_invalid_messages",
+           "load_and_prepare_messages", "load_and_prepare_from_store", "prepare_messages", "record_drops"]
 
-def clean_text(text):
-    """
-    Очищає текст: прибирає HTML, спецсимволи, переводить в нижній регістр та видаляє зайві пробіли.
-    """
-    text = re.sub(r'<.*?>', '', text)  # Прибираємо HTML
-    text = re.sub(r'http\S+|www\.\S+', ' ', text)
-    text = re.sub(r'[^\w\s.,!?\"\'@#%&:;()\[\]{}-]', '', text, flags=re.UNICODE)  # Залишаємо тільки корисні символи
-    text = re.sub(r'\s+', ' ', text).strip().lower()  # Прибираємо зайві пробіли та переводимо до нижнього регістру
-    return text
 
 def generate_text_for_analysis(msg):
     """
     Генерує текст для аналізу, додаючи позначки медіа, якщо є.
     """
-    text = msg.get('text', '').strip()
-    media_type = msg.get('media_type')
-    media_tag = f"[MEDIA: {media_type}]" if media_type else ""
+    return text_for_analysis(msg)
 
-    if text and media_tag:
-        return clean_text(text + " " + media_tag)
-    elif media_tag:
-        return media_tag.lower()
-    elif text:
-        return clean_text(text)
-    else:
-        return ""
 
-import re
-
-def filter_invalid_messages(messages):
+def filter_invalid_messages(messages, stats=None):
     """
     Фільтрує та відсіює некорисні повідомлення: занадто короткі, що складаються лише з цифр або спеціальних символів, без букв або з одного повторюваного символу.
+    Замість повідомлення про кожен пропуск причини рахуються в stats (DropStats).
     """
+    stats = stats if stats is not None else DropStats()
     valid_messages = []
     for msg in messages:
-        text = msg['text'].strip()
-
-        # Перевірка та фільтрація повідомлення
-        if len(text) < 3:
-            print(f"⚠️ Пропущено повідомлення: '{text}' (занадто коротке)")
-            continue
-        if text.isdigit():
-            print(f"⚠️ Пропущено повідомлення: '{text}' (складається лише з цифр)")
-            continue
-        if not any(char.isalpha() for char in text):
-            print(f"⚠️ Пропущено повідомлення: '{text}' (не містить букв)")
-            continue
-        if len(set(text)) == 1 and len(text) >= 3:
-            print(f"⚠️ Пропущено повідомлення: '{text}' (складається з одного повторюваного символу)")
+        stats.seen += 1
+        reason = invalid_reason(msg['text'].strip())
+        if reason is not None:
+            stats.reasons[reason] += 1
             continue
+        stats.kept += 1
         valid_messages.append(msg)
 
     return valid_messages
@@ -63,18 +40,38 @@ def load_and_prepare_messages(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         raw_messages = json.load(f)
 
-    processed = []
-    # Фільтрація повідомлень, щоб виключити ті, що непотрібні
-    valid_messages = filter_invalid_messages(raw_messages)
-    
-    for msg in valid_messages:
-        # Якщо після фільтрації текст не порожній, додаємо його в оброблені повідомлення
-        prepared_text = generate_text_for_analysis(msg)
-        if prepared_text:
-            processed.append({
-                'id': msg['id'],
-                'text': prepared_text
-            })
+    return prepare_messages(raw_messages)
+
 
+def load_and_prepare_from_store(store, chat_id, since=None, until=None, sender_id=None):
+    """
+    Готує до класифікації пости каналу з MessageStore за діапазоном дат (наприклад, останні 7 днів),
+    читаючи лише потрібні рядки, а не весь файл історії.
+    """
+    return prepare_messages(store.iter_messages(chat_id, since=since, until=until, sender_id=sender_id))
+
+
+def prepare_messages(raw_messages, stats=None, verbose=True):
+    """
+    Фільтрує та готує до класифікації повідомлення, що вже є в пам'яті (список або ітератор).
+    Підсумок пропущених повідомлень друкується один раз, а не для кожного повідомлення.
+    """
+    call_stats = DropStats()
+    with metrics.span("prepare"):
+        processed = list(iter_prepared(raw_messages, call_stats))
+    record_drops(call_stats)
+    if stats is not None:
+        stats.merge(call_stats)
+    elif verbose and call_stats.reasons:
+        print(call_stats.summary())
     return processed
 
+
+def record_drops(stats):
+    """
+    Переносить лічильники DropStats у метрики запуску.
+    """
+    metrics.inc("messages_seen_total", stats.seen)
+    metrics.inc("messages_kept_total", stats.kept)
+    for reason, count in stats.reasons.items():
+        metrics.inc("messages_dropped_total", count, reason=reason)
@@ -0,0 +1,312 @@
+# reanalyze.py
+import argparse
+import glob
+import hashlib
+import itertools
+import json
+import os
+import time
+from columnar_store import ColumnarStore, columns_path
+from message_store import MessageStore, store_path
+from metrics import metrics
+from normalization import DropStats
+from preprocessing import prepare_messages
+from report_generator import (create_output_folder, generate_reports, iter_classification_results,
+                              safe_dir_name, save_daily_trends)
+from scoring import (DEFAULT_MODEL, DEFAULT_THRESHOLD, DEFAULT_SCREENING_THRESHOLD, HYPOTHESIS_TEMPLATE,
+                     current_cache_namespace)
+from utils import JsonArrayWriter, load_sync_state, messages_path
+
+CHECKPOINT_FILE = "reanalysis_checkpoint.json"
+# Скільки постів читається й передається класифікатору за раз (і як часто зберігається прогрес)
+CHUNK_POSTS = 2048
+
+
+class Checkpoint:
+    """
+    Прогрес повторного аналізу акаунта (data/<phone>/reanalysis_checkpoint.json): для кожного каналу —
+    скільки постів уже оброблено, скільки результатів записано та, для JSON-джерела, розмір тимчасового файлу.
+    Файл переписується атомарно після кожного записаного шматка. Прогрес, збережений з іншою моделлю,
+    шаблоном чи порогом, не використовується — аналіз починається спочатку.
+    """
+
+    def __init__(self, path, signature, restart=False):
+        self.path = path
+        self.signature = signature
+        self.chats = {}
+        if restart or not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Не вдалося прочитати {path}: {e} — починаємо спочатку")
+            return
+        if data.get('signature') != signature:
+            print("ℹ️ Збережений прогрес належить іншій моделі, бекенду, каскаду чи порогу — починаємо спочатку")
+            return
+        self.chats = data.get('chats', {})
+
+    def get(self, key):
+        return dict({'done': 0, 'results': 0, 'offset': 0, 'completed': False}, **self.chats.get(key, {}))
+
+    def update(self, key, state):
+        self.chats[key] = state
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'signature': self.signature, 'updated': time.time(), 'chats': self.chats},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """
+        Видаляє контрольну точку після повного проходу: наступний запуск почне аналіз спочатку.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class StoreSource:
+    """
+    Історія каналу з MessageStore: пости читаються окремим з'єднанням у незмінному порядку (від старих до нових),
+    результати замінюють попередні в таблиці results і дописуються в колонкове сховище.
+    """
+
+    def __init__(self, phone, chat, reader, writer, columns):
+        self.phone = phone
+        self.chat_id = chat['id']
+        self.title = chat['title']
+        self.key = f"store:{self.chat_id}"
+        self.reader = reader
+        self.writer = writer
+        self.columns = columns
+        self.classified_file = messages_path(phone, self.title, prefix="classified")
+
+    def total(self):
+        return self.reader.count(self.chat_id)
+
+    def posts(self):
+        return self.reader.iter_messages(self.chat_id, newest_first=False)
+
+    def open(self, state):
+        pass
+
+    def write(self, posts, results, state):
+        self.writer.put_results(self.chat_id, results)
+        self.columns.append(self.chat_id, results, {post['id']: post for post in posts})
+
+    def finish(self, reports):
+        self.writer.export_json(self.chat_id, self.classified_file, table="results")
+        if reports:
+            output_path = create_output_folder("reports", safe_dir_name(self.classified_file))
+            generate_reports(self.writer.iter_results(self.chat_id), output_path)
+            save_daily_trends(self.columns, output_path, chat_id=self.chat_id)
+
+
+class JsonSource:
+    """
+    Дамп messages_*.json без сховища. Результати дописуються рядками у classified_*.json.partial
+    (після кожного шматка — fsync), а після завершення каналу потоково перетворюються на classified_*.json.
+    Після збою тимчасовий файл обрізається до розміру, збереженого в контрольній точці.
+    """
+
+    def __init__(self, messages_file):
+        self.messages_file = messages_file
+        directory, name = os.path.split(messages_file)
+        self.title = name[len("messages_"):-len(".json")]
+        self.key = f"json:{name}"
+        self.classified_file = os.path.join(directory, "classified_" + name[len("messages_"):])
+        self.partial_file = self.classified_file + ".partial"
+        self.output = None
+
+    def total(self):
+        return None
+
+    def posts(self):
+        return iter_classification_results(self.messages_file)
+
+    def open(self, state):
+        self.output = open(self.partial_file, 'a+b')
+        self.output.truncate(state['offset'])
+        self.output.seek(state['offset'])
+
+    def write(self, posts, results, state):
+        self.output.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results).encode("utf-8"))
+        self.output.flush()
+        os.fsync(self.output.fileno())
+        state['offset'] = self.output.tell()
+
+    def finish(self, reports):
+        self.output.close()
+        tmp_path = self.classified_file + ".tmp"
+        with open(self.partial_file, 'r', encoding='utf-8') as partial, JsonArrayWriter(tmp_path) as writer:
+            writer.write_many(json.loads(line) for line in partial)
+        os.replace(tmp_path, self.classified_file)
+        os.remove(self.partial_file)
+        if reports:
+            output_path = create_output_folder("reports", safe_dir_name(self.classified_file))
+            generate_reports(iter_classification_results(self.classified_file), output_path)
+
+    def close(self):
+        if self.output is not None and not self.output.closed:
+            self.output.close()
+
+
+def chunks(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def reanalyze_chat(classifier, source, checkpoint, chunk_posts=CHUNK_POSTS, reports=True):
+    """
+    Класифікує історію одного каналу шматками по chunk_posts постів, зберігаючи прогрес після кожного.
+    Уже оброблені пости (з контрольної точки) пропускаються без класифікації.
+    """
+    state = checkpoint.get(source.key)
+    if state['completed']:
+        print(f"⏭️ «{source.title}»: уже оброблено ({state['results']} результатів)")
+        return state
+    total = source.total()
+    if state['done']:
+        print(f"↩️ «{source.title}»: продовжуємо з {state['done']} постів")
+
+    source.open(state)
+    drops = DropStats()
+    start = time.perf_counter()
+    processed = 0
+    for chunk in chunks(itertools.islice(source.posts(), state['done'], None), chunk_posts):
+        results = classifier.classify_messages(prepare_messages(chunk, stats=drops), show_progress=False)
+        source.write(chunk, results, state)
+        state['done'] += len(chunk)
+        state['results'] += len(results)
+        checkpoint.update(source.key, state)
+        processed += len(chunk)
+        rate = processed / (time.perf_counter() - start)
+        progress = f"{state['done']}/{total}" if total else str(state['done'])
+        print(f"🧠 «{source.title}»: {progress} постів ({rate:.0f} пост/с)")
+
+    if drops.reasons:
+        print(f"«{source.title}»: {drops.summary()}")
+    print(f"📊 Генерація звіту для «{source.title}»...")
+    source.finish(reports)
+    state['completed'] = True
+    checkpoint.update(source.key, state)
+    return state
+
+
+def discover_accounts(base_data_dir="data", phones=None):
+    if phones:
+        return phones
+    if not os.path.isdir(base_data_dir):
+        return []
+    return sorted(name for name in os.listdir(base_data_dir) if os.path.isdir(os.path.join(base_data_dir, name)))
+
+
+def reanalyze_account(classifier, phone, args, signature):
+    path = store_path(phone)
+    source_kind = args.source
+    if source_kind == "auto":
+        source_kind = "store" if os.path.exists(path) else "json"
+    checkpoint = Checkpoint(os.path.join("data", phone, CHECKPOINT_FILE), signature, restart=args.restart)
+    print(f"\n📂 Акаунт {phone} ({'сховище' if source_kind == 'store' else 'JSON-файли'})")
+
+    if source_kind == "json":
+        files = sorted(glob.glob(os.path.join("data", phone, "messages_*.json")))
+        if args.chat:
+            # Для JSON id каналу відомий лише з позначок синхронізації
+            titles = {v['title'] for k, v in load_sync_state(phone).items() if int(k) in args.chat}
+            files = [f for f in files if os.path.basename(f) in {os.path.basename(messages_path(phone, t))
+                                                                  for t in titles}]
+        for messages_file in files:
+            source = JsonSource(messages_file)
+            try:
+                reanalyze_chat(classifier, source, checkpoint, args.chunk, reports=not args.no_reports)
+            finally:
+                source.close()
+        checkpoint.clear()
+        return
+
+    if not os.path.exists(path):
+        print(f"❌ Сховище не знайдено: {path}")
+        return
+    reader, writer = MessageStore(path), MessageStore(path)
+    columns = ColumnarStore(columns_path(phone))
+    try:
+        for chat in reader.chats():
+            if args.chat and chat['id'] not in args.chat:
+                continue
+            source = StoreSource(phone, chat, reader, writer, columns)
+            reanalyze_chat(classifier, source, checkpoint, args.chunk, reports=not args.no_reports)
+        checkpoint.clear()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Повторна класифікація вже зібраних повідомлень без входу в Telegram (з продовженням після збою)")
+    parser.add_argument("--phone", action="append", help="Акаунт (можна кілька); за замовчуванням — усі в data/")
+    parser.add_argument("--source", choices=["auto", "store", "json"], default="auto",
+                        help="Джерело: сховище messages.sqlite або файли messages_*.json (auto — сховище, якщо є)")
+    parser.add_argument("--chat", type=int, action="append", help="Лише вказані канали (id)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_POSTS, help="Постів на шматок (і контрольну точку)")
+    parser.add_argument("--restart", action="store_true", help="Ігнорувати збережений прогрес")
+    parser.add_argument("--no-reports", action="store_true", help="Не формувати звіти")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--hypothesis", default=HYPOTHESIS_TEMPLATE, help="Шаблон гіпотези")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--workers", type=int, default=0, help="Процесів для інференсу на CPU")
+    parser.add_argument("--cascade", default=None, help="Шлях до моделі каскаду (model/cascade.npz)")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help="Повторно використовувати оцінки майже однакових текстів (репостів)")
+    parser.add_argument("--screening", action="store_true", help="Двоступеневий режим зі скринінгом")
+    parser.add_argument("--screening-threshold", type=float, default=DEFAULT_SCREENING_THRESHOLD)
+    parser.add_argument("--queue", default=None, help="Класифікувати воркерами distributed.py через цю чергу")
+    parser.add_argument("--metrics-dir", default=os.path.join("reports", "metrics"))
+    args = parser.parse_args()
+
+    phones = discover_accounts(phones=args.phone)
+    if not phones:
+        print("❌ У data/ немає збережених акаунтів")
+        return
+
+    if args.queue:
+        from distributed import RemoteClassifier
+        # Модель, каскад і скринінг задаються параметрами воркерів
+        classifier = RemoteClassifier(args.queue, model_name=args.model, hypothesis_template=args.hypothesis,
+                                      backend=args.backend, threshold=args.threshold)
+    else:
+        from classifier import TextClassifier
+        classifier = TextClassifier(model_name=args.model, hypothesis_template=args.hypothesis,
+                                    threshold=args.threshold, backend=args.backend, workers=args.workers,
+                                    cascade_path=args.cascade, near_duplicates=args.near_duplicates,
+                                    screening=args.screening, screening_threshold=args.screening_threshold)
+    signature = f"{current_cache_namespace(args.model, args.hypothesis)}|{args.threshold}|{args.backend}"
+    if args.cascade:
+        # Перенавчений каскад за тим самим шляхом дає інші результати — у підписі вміст файлу, а не шлях
+        with open(args.cascade, 'rb') as f:
+            signature += f"|cascade@{hashlib.sha1(f.read()).hexdigest()[:12]}"
+    if args.near_duplicates:
+        signature += "|near-duplicates"
+    if args.screening:
+        # Результати зі скринінгом відрізняються від повного режиму — прогрес не змішується
+        signature += f"|screening@{args.screening_threshold}"
+    try:
+        for phone in phones:
+            reanalyze_account(classifier, phone, args, signature)
+        print("\n🏁 Повторний аналіз завершено.")
+    except KeyboardInterrupt:
+        print("\n⏸️ Перервано. Запустіть ту саму команду ще раз, щоб продовжити з останньої контрольної точки.")
+    finally:
+        metrics.print_summary()
+        metrics.export(args.metrics_dir)
+
+
+if __name__ == "__main__":
+    main()
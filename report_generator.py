@@ -1,13 +1,99 @@
 # report_generator.py 
+import heapq
+import itertools
 import json
 import os
+import re
+import threading
+import time
 from collections import Counter, defaultdict
-import matplotlib.pyplot as plt
-
-
-def load_classification_results(filepath):
+from metrics import metrics
+from scoring import LABELS, DEFAULT_THRESHOLD, rethreshold_entry
+from utils import JsonArrayWriter
+
+# Скільки символів тексту зберігається для прикладів у звітах
+SNIPPET_CHARS = 300
+_WHITESPACE = re.compile(r'\s*')
+
+
+_figures = threading.local()
+
+
+def _figure(name, figsize=(10, 6)):
+    """
+    Очищена фігура для графіка name, повторно використовувана в межах потоку: створення фігури коштує
+    сотні мілісекунд на кожен звіт. Фігури будуються без pyplot на полотні Agg — лише для збереження у файли,
+    тож потоки й процеси звітів не ділять глобального стану. matplotlib імпортується лише тут.
+    """
+    cache = getattr(_figures, "cache", None)
+    if cache is None:
+        cache = _figures.cache = {}
+    fig = cache.get(name)
+    if fig is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = cache[name] = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    fig.clear()
+    return fig
+
+
+def load_classification_results(filepath, threshold=None):
+    """
+    Завантажує результати класифікації. Якщо задано поріг — мітки перераховуються зі збережених raw_scores.
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    if threshold is not None:
+        for entry in results:
+            rethreshold_entry(entry, threshold)
+    return results
+
+
+def iter_classification_results(filepath, threshold=None, chunk_size=1 << 16):
+    """
+    Потоково читає JSON-масив результатів класифікації, не завантажуючи весь файл у пам'ять.
+    Якщо задано поріг — мітки перераховуються зі збережених raw_scores.
+    """
+    decoder = json.JSONDecoder()
     with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+        buf, pos, eof, started = "", 0, False, False
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"Неочікуваний кінець файлу: {filepath}")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            char = buf[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError(f"Очікувався JSON-масив: {filepath}")
+                started = True
+                pos += 1
+                continue
+            if char == ',':
+                pos += 1
+                continue
+            if char == ']':
+                return
+            try:
+                entry, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Запис обірвався на межі блоку — дочитуємо
+                if eof:
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            pos = end
+            if threshold is not None:
+                rethreshold_entry(entry, threshold)
+            yield entry
 
 
 def safe_dir_name(filepath):
@@ -22,41 +108,34 @@ def create_output_folder(base_folder, name):
     return path
 
 
-def summarize_classification(results):
-    label_counter = Counter()
-    multi_label_counts = defaultdict(int)
-    scores_per_label = defaultdict(list)
-    lengths_per_label = defaultdict(list)
-
-    for entry in results:
-        text = entry['text']
-        text_len = len(text)
-        labels = entry['labels']
-        scores = entry['scores']
-
-        if len(labels) == 1 and labels[0].startswith("Safe"):
-            label_counter['Safe'] += 1
-            scores_per_label['Safe'].append(1.0)
-            lengths_per_label['Safe'].append(text_len)
-        else:
-            multi_label_counts[len(labels)] += 1
-            for label, score in zip(labels, scores):
-                label_counter[label] += 1
-                scores_per_label[label].append(score)
-                lengths_per_label[label].append(text_len)
-
-    return label_counter, multi_label_counts, scores_per_label, lengths_per_label
-
-
-def print_summary(label_counter, multi_label_counts, scores_per_label, lengths_per_label, output_path):
+def coverage_line(coverage):
+    """
+    Рядок про повноту аналізу з обмеженим бюджетом: coverage — {'posts': постів у сховищі,
+    'pending': лишилось у черзі, 'reason': чому зупинились, 'fetched': чи канал завантажено повністю}.
+    """
+    posts, pending = coverage['posts'], coverage['pending']
+    if not pending and not coverage.get('fetched', True):
+        return (f"⚠️ Часткові результати (завантаження не завершено): оброблено {posts} завантажених постів, "
+                f"решту завантажить наступний запуск")
+    if not pending:
+        return f"✅ Оброблено всі {posts} постів каналу"
+    done = posts - pending
+    reason = f" ({coverage['reason']})" if coverage.get('reason') else ""
+    return (f"⚠️ Часткові результати{reason}: оброблено {done} з {posts} постів ({done / posts * 100:.1f}%), "
+            f"{pending} найменш пріоритетних лишились у черзі до наступного запуску")
+
+
+def print_summary(label_counter, multi_label_counts, score_sums, length_sums, output_path, coverage=None):
     total = sum(label_counter.values())
     lines = []
+    if coverage is not None:
+        lines.append(coverage_line(coverage) + "\n")
     lines.append(f"📊 Загальна кількість класифікованих повідомлень: {total}\n")
     lines.append("📌 Кількість повідомлень за категоріями:")
     for label, count in label_counter.most_common():
         percent = count / total * 100
-        avg_score = sum(scores_per_label[label]) / len(scores_per_label[label]) if scores_per_label[label] else 0
-        avg_len = sum(lengths_per_label[label]) / len(lengths_per_label[label]) if lengths_per_label[label] else 0
+        avg_score = score_sums[label] / count if count else 0
+        avg_len = length_sums[label] / count if count else 0
         lines.append(f"- {label}: {count} ({percent:.1f}%) | Avg score: {avg_score:.2f} | Avg length: {avg_len:.0f} chars")
 
     # Кількість повідомлень з кількома мітками
@@ -75,71 +154,244 @@ def print_summary(label_counter, multi_label_counts, scores_per_label, lengths_p
     print("\n".join(lines))
 
 
-def show_top_examples(results, output_path, top_n=5, threshold_low=0.4, threshold_high=0.7):
-    lines = []
-    lines.append("🔍 Найбільш \"сумнівні\" повідомлення (мітки з низькою впевненістю):")
-    count = 0
-    for entry in results:
-        for label, score in zip(entry['labels'], entry['scores']):
-            if not label.startswith("Safe") and threshold_low <= score <= threshold_high:
-                lines.append(f"\n📝 Text: {entry['text'][:300]}...")
-                lines.append(f"🔸 Label: {label}, Score: {score:.2f}")
-                count += 1
-                if count >= top_n:
-                    break
-        if count >= top_n:
-            break
-
-    with open(os.path.join(output_path, "top_uncertain_examples.txt"), 'w', encoding='utf-8') as f:
-        f.write("\n".join(lines))
+class ReportEngine:
+    """
+    Формує всі звіти каналу за один прохід по записах:
+    - лічильники, суми оцінок і довжин замість списків значень;
+    - обмежені купи (heapq) для топу токсичних і найбільш сумнівних повідомлень;
+    - файли category_*.json пишуться поелементно під час проходу.
+    Пам'ять не залежить від кількості записів: зберігаються лише агрегати, top_n фрагментів і групи репостів.
+    aggregates — готові (label_counter, multi_label_counts, score_sums, length_sums), обчислені над колонками
+    (columnar_store.summarize_columns); тоді add() їх не рахує, а підсумок і графік будуються з них.
+    categories=False — не писати category_*.json (окремі звіти, див. show_top_toxic тощо).
+    """
+
+    def __init__(self, output_path, top_n=5, threshold_low=0.4, threshold_high=0.7,
+                 threshold=DEFAULT_THRESHOLD, repost_top_n=10, coverage=None, aggregates=None, categories=True):
+        self.output_path = output_path
+        self.categories = categories
+        self.coverage = coverage  # повнота аналізу з обмеженим бюджетом (див. coverage_line)
+        self.top_n = top_n
+        self.threshold_low = threshold_low
+        self.threshold_high = threshold_high
+        self.threshold = threshold  # «сумнівність» — відстань оцінки до порогу
+        self.repost_top_n = repost_top_n
+
+        self.count_labels = aggregates is None
+        if aggregates is None:
+            aggregates = (Counter(), defaultdict(int), defaultdict(float), defaultdict(int))
+        self.label_counter, self.multi_label_counts, self.score_sums, self.length_sums = aggregates
+        self.toxic_heap = []  # (токсичність, -№, текст, мітки, оцінки) — мінімум на вершині
+        self.uncertain_heap = []  # (-відстань до порогу, -№, текст, мітка, оцінка)
+        self.reposts = {}  # repost_of -> [копій, мін. схожість, макс. схожість, текст, мітки]
+        self.category_writers = {}
+        self._seq = itertools.count()
+        self.total = 0
+
+    def _push(self, heap, item):
+        if len(heap) < self.top_n:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def _category_writer(self, label):
+        writer = self.category_writers.get(label)
+        if writer is None:
+            filename = f"category_{label.replace(' ', '_').replace('/', '_')}.json"
+            writer = self.category_writers[label] = JsonArrayWriter(os.path.join(self.output_path, filename))
+        return writer
+
+    def add(self, entry):
+        text_len = len(entry['text'])
+        labels = entry['labels']
+        scores = entry['scores']
+        # Від'ємний номер: за однакової оцінки в купі залишається раніший запис
+        seq = -next(self._seq)
+        self.total += 1
 
+        if self.categories:
+            for label in labels:
+                self._category_writer(label).write(entry)
 
-def show_top_toxic(results, output_path, top_n=5):
-    scored = []
-    for entry in results:
-        if "Safe" in entry['labels'] and len(entry['labels']) == 1:
-            continue
-        toxicity_score = sum([s for l, s in zip(entry['labels'], entry['scores']) if not l.startswith("Safe")])
-        scored.append((toxicity_score, entry))
-
-    top = sorted(scored, key=lambda x: x[0], reverse=True)[:top_n]
-
-    lines = ["🔥 Топ найтоксичніших повідомлень:"]
-    if len(top) == 0:
-        lines.append("❌ Токсичних повідомлень не знайдено")
-    else:
-        for score, entry in top:
-            lines.append(f"\n📝 Text: {entry['text'][:300]}...")
+        if len(labels) == 1 and labels[0].startswith("Safe"):
+            if self.count_labels:
+                self.label_counter['Safe'] += 1
+                self.score_sums['Safe'] += 1.0
+                self.length_sums['Safe'] += text_len
+        else:
+            if self.count_labels:
+                self.multi_label_counts[len(labels)] += 1
+            toxicity = 0.0
+            for label, score in zip(labels, scores):
+                if self.count_labels:
+                    self.label_counter[label] += 1
+                    self.score_sums[label] += score
+                    self.length_sums[label] += text_len
+                if not label.startswith("Safe"):
+                    toxicity += score
+                    if self.threshold_low <= score <= self.threshold_high:
+                        self._push(self.uncertain_heap, (-abs(score - self.threshold), seq,
+                                                         entry['text'][:SNIPPET_CHARS], label, score))
+            self._push(self.toxic_heap, (toxicity, seq, entry['text'][:SNIPPET_CHARS], labels, scores))
+
+        repost_of = entry.get('repost_of')
+        if repost_of:
+            similarity = entry['similarity']
+            cluster = self.reposts.get(repost_of)
+            if cluster is None:
+                self.reposts[repost_of] = [1, similarity, similarity, entry['text'][:SNIPPET_CHARS], labels]
+            else:
+                cluster[0] += 1
+                cluster[1] = min(cluster[1], similarity)
+                cluster[2] = max(cluster[2], similarity)
+
+    def consume(self, entries):
+        for entry in entries:
+            self.add(entry)
+        return self
+
+    def _write(self, filename, lines):
+        with open(os.path.join(self.output_path, filename), 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+
+    def write_top_uncertain(self):
+        lines = []
+        lines.append("🔍 Найбільш \"сумнівні\" повідомлення (мітки з низькою впевненістю):")
+        for _, _, text, label, score in sorted(self.uncertain_heap, reverse=True):
+            lines.append(f"\n📝 Text: {text}...")
+            lines.append(f"🔸 Label: {label}, Score: {score:.2f}")
+        self._write("top_uncertain_examples.txt", lines)
+
+    def write_top_toxic(self):
+        lines = ["🔥 Топ найтоксичніших повідомлень:"]
+        if not self.toxic_heap:
+            lines.append("❌ Токсичних повідомлень не знайдено")
+        for score, _, text, labels, scores in sorted(self.toxic_heap, key=lambda x: (-x[0], -x[1])):
+            lines.append(f"\n📝 Text: {text}...")
             lines.append(f"🔸 Total toxicity score: {score:.2f}")
-            for label, s in zip(entry['labels'], entry['scores']):
+            for label, s in zip(labels, scores):
                 lines.append(f"   - {label}: {s:.2f}")
+        self._write("top_toxic_messages.txt", lines)
+
+    def write_repost_clusters(self):
+        """
+        Групи майже однакових повідомлень (репостів), оцінки яких узято з раніше класифікованого тексту.
+        """
+        lines = ["🔁 Найбільші групи репостів (майже однакові повідомлення):"]
+        if not self.reposts:
+            lines.append("   Репостів не знайдено")
+        largest = heapq.nlargest(self.repost_top_n, self.reposts.values(), key=lambda c: c[0])
+        for copies, min_sim, max_sim, text, labels in largest:
+            lines.append(f"\n📝 Text: {text}...")
+            lines.append(f"🔸 Копій: {copies} | Мітки: {', '.join(labels)} | Схожість: {min_sim:.2f}–{max_sim:.2f}")
+        self._write("repost_clusters.txt", lines)
+
+    def _close_categories(self):
+        for writer in self.category_writers.values():
+            writer.close()
+        self.category_writers.clear()
+
+    def finish(self, timings=None):
+        """
+        Закриває файли категорій і записує підсумкові звіти та графік. Повертає кількість записів.
+        timings — список, у який дописується (звіт, початок perf_counter, секунди) для кожного файлу.
+        """
+        steps = [
+            ("categories", self._close_categories),
+            ("summary", lambda: print_summary(self.label_counter, self.multi_label_counts, self.score_sums,
+                                              self.length_sums, self.output_path, self.coverage)),
+            ("top_uncertain", self.write_top_uncertain),
+            ("top_toxic", self.write_top_toxic),
+            ("repost_clusters", self.write_repost_clusters),
+            ("chart", lambda: save_bar_chart(self.label_counter, self.output_path)),
+        ]
+        for name, step in steps:
+            start = time.perf_counter()
+            step()
+            if timings is not None:
+                timings.append((name, start, time.perf_counter() - start))
+        return self.total
+
+
+# --- Окремі звіти (як до ReportEngine): кожна функція — власний прохід по results ---
 
-    with open(os.path.join(output_path, "top_toxic_messages.txt"), 'w', encoding='utf-8') as f:
-        f.write("\n".join(lines))
+def summarize_classification(results):
+    """
+    Агрегати для print_summary: (label_counter, multi_label_counts, score_sums, length_sums).
+    Оцінки й довжини повертаються сумами за міткою, а не списками значень.
+    """
+    engine = ReportEngine(None, categories=False).consume(results)
+    return engine.label_counter, engine.multi_label_counts, engine.score_sums, engine.length_sums
 
-def save_per_category(results, output_path):
-    per_category = defaultdict(list)
-    for entry in results:
-        for label in entry['labels']:
-            per_category[label].append(entry)
 
-    for label, entries in per_category.items():
-        filename = f"category_{label.replace(' ', '_').replace('/', '_')}.json"
-        with open(os.path.join(output_path, filename), 'w', encoding='utf-8') as f:
-            json.dump(entries, f, ensure_ascii=False, indent=2)
+def show_top_examples(results, output_path, top_n=5, threshold_low=0.4, threshold_high=0.7):
+    engine = ReportEngine(output_path, top_n, threshold_low, threshold_high, categories=False)
+    engine.consume(results).write_top_uncertain()
+
+
+def show_top_toxic(results, output_path, top_n=5):
+    ReportEngine(output_path, top_n, categories=False).consume(results).write_top_toxic()
+
+
+def save_per_category(results, output_path):
+    ReportEngine(output_path).consume(results)._close_categories()
 
 
 def save_bar_chart(label_counter, output_path):
     labels = list(label_counter.keys())
     counts = [label_counter[l] for l in labels]
 
-    plt.figure(figsize=(10, 6))
-    plt.barh(labels, counts)
-    plt.xlabel("Кількість повідомлень")
-    plt.title("Розподіл класифікації по категоріях")
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_path, "chart.png"))
-    plt.close()
+    fig = _figure("chart")
+    ax = fig.add_subplot()
+    ax.barh(labels, counts)
+    ax.set_xlabel("Кількість повідомлень")
+    ax.set_title("Розподіл класифікації по категоріях")
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_path, "chart.png"))
+
+
+def save_daily_trends(store, output_path, chat_id=None, threshold=DEFAULT_THRESHOLD, last_days=30):
+    """
+    Тренди за днями з колонкового сховища (векторизовано, без читання текстів): таблиця та графік.
+    """
+    with metrics.span("report", report=os.path.basename(output_path), part="daily_trends"):
+        _save_daily_trends(store, output_path, chat_id, threshold, last_days)
+
+
+def _save_daily_trends(store, output_path, chat_id, threshold, last_days):
+    from columnar_store import daily_trends
+
+    days, totals, per_label = daily_trends(store, threshold, store.latest_rows(chat_id))
+    days, totals, per_label = days[-last_days:], totals[-last_days:], per_label[-last_days:]
+    lines = [f"📈 Повідомлення за днями (останні {len(days)}): всього | {' | '.join(LABELS)}"]
+    for day, total, counts in zip(days, totals, per_label):
+        lines.append(f"- {day}: {total} | {' | '.join(str(c) for c in counts)}")
+    with open(os.path.join(output_path, "daily_trends.txt"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines))
+    if not len(days):
+        return
+
+    fig = _figure("daily_trends")
+    ax = fig.add_subplot()
+    for j, label in enumerate(LABELS):
+        ax.plot(days, per_label[:, j], marker='o', label=label)
+    ax.set_ylabel("Кількість повідомлень")
+    ax.set_title("Токсичні повідомлення за днями")
+    ax.legend()
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    fig.savefig(os.path.join(output_path, "daily_trends.png"))
+
+
+def generate_reports(results, output_path):
+    """
+    Формує повний набір звітів для результатів класифікації одного каналу.
+    results — список або ітератор (наприклад, iter_classification_results): записи проходять один раз.
+    """
+    with metrics.span("report", report=os.path.basename(output_path), part="reports"):
+        engine = ReportEngine(output_path)
+        engine.consume(results)
+        return engine.finish()
 
 
 def main():
@@ -148,16 +400,10 @@ def main():
         print("❌ Файл не знайдено!")
         return
 
-    results = load_classification_results(path)
     name = safe_dir_name(path)
     output_path = create_output_folder("reports", name)
 
-    label_counter, multi_label_counts, scores_per_label, lengths_per_label = summarize_classification(results)
-    print_summary(label_counter, multi_label_counts, scores_per_label, lengths_per_label, output_path)
-    show_top_examples(results, output_path)
-    show_top_toxic(results, output_path)
-    save_per_category(results, output_path)
-    save_bar_chart(label_counter, output_path)
+    generate_reports(iter_classification_results(path), output_path)
 
     print(f"\n✅ Звіт збережено у папці: {output_path}")
 
@@ -0,0 +1,128 @@
+# report_pool.py
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from metrics import metrics
+
+# Процесів для звітів: графіки й файли категорій переважно однопотокові, двох вистачає, щоб не відставати
+DEFAULT_WORKERS = 2
+
+
+def _init_worker():
+    """
+    Ініціалізація процесу звітів: неінтерактивний бекенд і попередній імпорт matplotlib,
+    щоб перший звіт не платив за імпорт.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.figure  # noqa: F401
+    from matplotlib.backends import backend_agg  # noqa: F401
+
+
+def render_chat_reports(store_file, chat_id, output_path, columns_dir=None, since=None, coverage=None):
+    """
+    Формує звіти каналу з MessageStore (і тренди з колонкового сховища, якщо задано columns_dir).
+    coverage — повнота аналізу з обмеженим бюджетом, виводиться на початку підсумку.
+    Виконується у процесі пулу: сховища відкриваються заново, колонкове — лише для читання.
+    Якщо колонкове сховище містить усі результати каналу, підсумок за мітками рахується векторизовано
+    над колонками (summarize_columns), а прохід по записах лише пише категорії й топи.
+    Повертає (кількість записів, [(звіт, початок за time.time(), секунди), ...]).
+    """
+    from columnar_store import ColumnarStore, summarize_columns
+    from message_store import MessageStore
+    from report_generator import ReportEngine, _save_daily_trends
+    from scoring import DEFAULT_THRESHOLD
+
+    timings = []
+    store = MessageStore(store_file)
+    columns = ColumnarStore(columns_dir, read_only=True) if columns_dir is not None else None
+    try:
+        aggregates = None
+        if columns is not None and since is None:
+            start = time.perf_counter()
+            rows = columns.latest_rows(chat_id)
+            # Історія, перенесена з JSON до появи колонкового сховища, є лише в MessageStore — тоді рахуємо по записах
+            if len(rows) == store.count(chat_id, table="results"):
+                aggregates = summarize_columns(columns, DEFAULT_THRESHOLD, rows)
+                timings.append(("summary_columns", start, time.perf_counter() - start))
+        start = time.perf_counter()
+        engine = ReportEngine(output_path, coverage=coverage, aggregates=aggregates)
+        engine.consume(store.iter_results(chat_id, since=since))
+        timings.append(("read", start, time.perf_counter() - start))
+        total = engine.finish(timings)
+    finally:
+        store.close()
+    if columns is not None:
+        start = time.perf_counter()
+        _save_daily_trends(columns, output_path, chat_id, DEFAULT_THRESHOLD, last_days=30)
+        timings.append(("daily_trends", start, time.perf_counter() - start))
+    # perf_counter різних процесів непорівнянний — переводимо початки у час епохи
+    offset = time.time() - time.perf_counter()
+    return total, [(name, start + offset, seconds) for name, start, seconds in timings]
+
+
+class ReportPool:
+    """
+    Формує звіти каналів у фонових процесах, поки завантаження й класифікація продовжуються.
+    Кожен процес будує графіки на неінтерактивному полотні Agg і повторно використовує свої фігури.
+    join() чекає на всі звіти (викликати перед виходом). Час кожного звіту записується в metrics
+    (таймер report з мітками report і part). workers=0 — звіти формуються одразу в потоці, що викликає submit.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self.executor = None
+        self.futures = []
+        self.lock = threading.Lock()
+        if workers > 0:
+            # spawn: процеси не успадковують потоки циклу подій і моделі
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_init_worker)
+
+    def submit(self, title, store_file, chat_id, output_path, columns_dir=None, since=None, coverage=None):
+        submitted = time.perf_counter()
+        args = (store_file, chat_id, output_path, columns_dir, since, coverage)
+        if self.executor is None:
+            self._record(title, output_path, submitted, render_chat_reports(*args))
+            return
+        future = self.executor.submit(render_chat_reports, *args)
+        future.add_done_callback(lambda f: self._done(f, title, output_path, submitted))
+        with self.lock:
+            self.futures.append(future)
+
+    def _done(self, future, title, output_path, submitted):
+        try:
+            self._record(title, output_path, submitted, future.result())
+        except Exception as e:
+            print(f"⚠️ Помилка формування звітів для «{title}»: {e}")
+
+    def _record(self, title, output_path, submitted, outcome):
+        total, timings = outcome
+        report = os.path.basename(output_path)
+        offset = time.perf_counter() - time.time()
+        for part, started, seconds in timings:
+            metrics.add_span("report", started + offset, seconds, track="reports", report=report, part=part)
+        metrics.observe("report_latency", time.perf_counter() - submitted, report=report)
+        busy = sum(seconds for _, _, seconds in timings)
+        print(f"📊 Звіти для «{title}» готові ({total} записів, {busy:.2f} с): {output_path}")
+
+    def pending(self):
+        with self.lock:
+            return sum(not f.done() for f in self.futures)
+
+    def join(self):
+        """
+        Чекає, доки всі надіслані звіти будуть записані, і зупиняє процеси.
+        """
+        if self.executor is None:
+            return
+        with self.lock:
+            futures, self.futures = self.futures, []
+        remaining = sum(not f.done() for f in futures)
+        if remaining:
+            print(f"⏳ Завершуємо формування звітів ({remaining})...")
+        wait(futures)
+        self.executor.shutdown(wait=True)
+        self.executor = None
@@ -0,0 +1,65 @@
+# rethreshold.py
+import argparse
+import glob
+import itertools
+import os
+import time
+from report_generator import iter_classification_results, safe_dir_name, create_output_folder, ReportEngine
+from scoring import rethreshold_entry
+from utils import JsonArrayWriter
+
+
+def rethreshold_file(path, threshold, reports_dir="reports"):
+    """
+    Перераховує мітки у файлі classified_*.json зі збережених raw_scores і заново формує звіти.
+    Файл читається й переписується потоково, звіти формуються в тому ж проході.
+    Записи, відсіяні скринінгом (raw_scores = None), не перераховуються: їхні мітки лишаються без змін.
+    Повертає (кількість оброблених записів, з них відсіяних скринінгом) або None, якщо у файлі немає raw_scores.
+    """
+    entries = iter_classification_results(path)
+    first = next(entries, None)
+    # Старий формат без raw_scores (записи до появи векторів оцінок): файл і звіти не змінюємо
+    if first is not None and 'raw_scores' not in first:
+        return None
+
+    output_path = create_output_folder(reports_dir, safe_dir_name(path))
+    engine = ReportEngine(output_path)
+    tmp_path = path + ".tmp"
+    screened = 0
+    with JsonArrayWriter(tmp_path) as writer:
+        for entry in itertools.chain([first] if first is not None else [], entries):
+            if not rethreshold_entry(entry, threshold):
+                screened += 1
+            engine.add(entry)
+            writer.write(entry)
+    os.replace(tmp_path, path)
+    return engine.finish(), screened
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перерахунок міток за новим порогом без повторної класифікації")
+    parser.add_argument("threshold", type=float, help="Новий поріг (наприклад, 0.4)")
+    parser.add_argument("paths", nargs="*", help="Файли classified_*.json (за замовчуванням — усі в data/)")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join("data", "*", "classified_*.json")))
+    if not paths:
+        print("❌ Файлів з класифікацією не знайдено!")
+        return
+
+    for path in paths:
+        start = time.perf_counter()
+        outcome = rethreshold_file(path, args.threshold)
+        elapsed = time.perf_counter() - start
+        if outcome is None:
+            print(f"⚠️ {path}: немає збережених raw_scores — потрібна повторна класифікація")
+            continue
+        count, screened = outcome
+        if screened:
+            print(f"ℹ️ {path}: {screened} записів відсіяно скринінгом без оцінок за мітками — мітки не змінено")
+        per_thousand = elapsed * 1000 / count * 1000 if count else 0
+        print(f"✅ {path}: {count} повідомлень за {elapsed * 1000:.0f} мс ({per_thousand:.1f} мс / 1000)")
+
+
+if __name__ == "__main__":
+    main()
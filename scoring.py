@@ -0,0 +1,98 @@
+# scoring.py
+import numpy as np
+from cache_store import make_namespace
+
+# Нові мітки (тільки токсичні категорії, без Safe)
+LABELS = [
+    "Hate speech or harassment",
+    "Propaganda or ideological harm",
+    "Exploitation or abuse",
+    "Self-harm or suicide"
+]
+SAFE_LABEL = "Safe"
+
+DEFAULT_MODEL = "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli"
+HYPOTHESIS_TEMPLATE = "This message contains {}."
+DEFAULT_THRESHOLD = 0.5
+
+# Скринінг: одна широка гіпотеза ("This message contains harmful content.") перед повним набором LABELS.
+# Поріг свідомо низький (орієнтований на повноту) — підбирається за screening_eval.py
+SCREENING_LABEL = "harmful content"
+DEFAULT_SCREENING_THRESHOLD = 0.1
+
+# Версія формату значень у кеші: повний вектор float32 у порядку LABELS
+SCORES_FORMAT = "raw-float32-v2"
+
+
+def cache_model_name(model_name=DEFAULT_MODEL, backend="torch"):
+    """
+    Назва моделі для простору імен кешу: квантована модель дає дещо інші оцінки, тому має окремий простір імен.
+    """
+    return f"{model_name}@int8" if backend == "onnx-int8" else model_name
+
+
+def current_cache_namespace(model_name=DEFAULT_MODEL, hypothesis_template=HYPOTHESIS_TEMPLATE):
+    """
+    Простір імен кешу для заданої моделі, поточних LABELS та шаблону гіпотези.
+    """
+    return make_namespace(model_name, LABELS, hypothesis_template, SCORES_FORMAT)
+
+
+def screening_cache_namespace(model_name=DEFAULT_MODEL, hypothesis_template=HYPOTHESIS_TEMPLATE,
+                              screening_label=SCREENING_LABEL):
+    """
+    Окремий простір імен кешу для оцінок скринінгової гіпотези (вектор з одного значення).
+    """
+    return make_namespace(model_name, [screening_label], hypothesis_template, SCORES_FORMAT)
+
+
+def known_cache_namespaces(model_name=DEFAULT_MODEL, hypothesis_template=HYPOTHESIS_TEMPLATE,
+                           screening_label=SCREENING_LABEL):
+    """
+    Усі простори імен, які класифікатор з цією моделлю, поточними LABELS і шаблоном створює в кеші:
+    повні оцінки та скринінг для кожного бекенда (torch і onnx спільні, onnx-int8 — окремо).
+    """
+    namespaces = set()
+    for backend in ("torch", "onnx", "onnx-int8"):
+        name = cache_model_name(model_name, backend)
+        namespaces.add(current_cache_namespace(name, hypothesis_template))
+        namespaces.add(screening_cache_namespace(name, hypothesis_template, screening_label))
+    return namespaces
+
+
+def to_score_vector(labels, scores):
+    """
+    Перетворює пару (labels, scores) з пайплайна у вектор float32 у порядку LABELS.
+    """
+    by_label = dict(zip(labels, scores))
+    return np.array([by_label.get(label, 0.0) for label in LABELS], dtype=np.float32)
+
+
+def compact_scores(raw_scores):
+    """
+    Компактне JSON-представлення вектора оцінок (точність float32).
+    """
+    return [round(float(s), 6) for s in raw_scores]
+
+
+def apply_threshold(raw_scores, threshold=DEFAULT_THRESHOLD):
+    """
+    Обчислює мітки та оцінки з повного вектора за порогом.
+    Якщо жодна токсична категорія не проходить поріг — повідомлення вважається безпечним.
+    """
+    picked = [(label, float(score)) for label, score in zip(LABELS, raw_scores) if score >= threshold]
+    if not picked:
+        return [SAFE_LABEL], [1.0]
+    picked.sort(key=lambda x: x[1], reverse=True)
+    return [label for label, _ in picked], [score for _, score in picked]
+
+
+def rethreshold_entry(entry, threshold):
+    """
+    Перераховує labels/scores запису класифікації з його raw_scores. Повертає False, якщо оцінок немає.
+    """
+    raw_scores = entry.get('raw_scores')
+    if raw_scores is None:
+        return False
+    entry['labels'], entry['scores'] = apply_threshold(raw_scores, threshold)
+    return True
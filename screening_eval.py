@@ -0,0 +1,153 @@
+# screening_eval.py
+import argparse
+import json
+import os
+import numpy as np
+from report_generator import iter_classification_results
+from scoring import (LABELS, DEFAULT_MODEL, DEFAULT_THRESHOLD, HYPOTHESIS_TEMPLATE, SCREENING_LABEL,
+                     cache_model_name, current_cache_namespace)
+
+DEFAULT_THRESHOLDS = [round(t, 2) for t in np.arange(0.01, 0.51, 0.01)]
+
+
+def load_labelled(path):
+    """
+    Розмічений набір: JSON-масив (наприклад, classified_*.json з повного режиму) або JSONL із записами
+    {"text", "labels"}. Повертає (тексти, булева матриця тексти × LABELS). Записи, відсіяні скринінгом
+    (source == "screening"), не є еталоном і пропускаються.
+    """
+    if path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    else:
+        entries = iter_classification_results(path)
+    texts, targets, skipped = [], [], 0
+    for entry in entries:
+        if not entry.get('text') or entry.get('source') == "screening":
+            skipped += 1
+            continue
+        texts.append(entry['text'])
+        targets.append([label in entry.get('labels', []) for label in LABELS])
+    if skipped:
+        print(f"ℹ️ {path}: пропущено {skipped} записів без тексту або відсіяних скринінгом")
+    return texts, np.array(targets, dtype=bool).reshape(-1, len(LABELS))
+
+
+def load_from_cache(cache_path, model_name, hypothesis_template, threshold, backend="torch"):
+    """
+    Еталон з кешу класифікації: повні вектори оцінок поточної моделі (з урахуванням бекенду — int8 має
+    окремий простір імен), позитивні — оцінки не нижче threshold.
+    """
+    from cascade import load_training_set
+
+    namespace = current_cache_namespace(cache_model_name(model_name, backend), hypothesis_template)
+    texts, scores = load_training_set(cache_path, namespace)
+    return texts, scores >= threshold
+
+
+def recall_curve(screen_scores, positives, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Для кожного порогу скринінгу: повнота серед повідомлень, токсичних за повним режимом (загалом і за мітками),
+    частка повідомлень, що передаються на повний набір міток, і відносна вартість інференсу
+    (пар premise/hypothesis порівняно з повним режимом: 1 скринінгова + len(LABELS) для тих, що пройшли).
+    """
+    screen_scores = np.asarray(screen_scores, dtype=np.float32)
+    any_positive = positives.any(axis=1)
+    rows = []
+    for t in thresholds:
+        passed = screen_scores >= t
+        expanded = float(passed.mean()) if len(passed) else 0.0
+        rows.append({
+            "threshold": t,
+            "recall": float(passed[any_positive].mean()) if any_positive.any() else 1.0,
+            "missed": int((any_positive & ~passed).sum()),
+            "by_label": {label: float(passed[positives[:, j]].mean()) if positives[:, j].any() else None
+                         for j, label in enumerate(LABELS)},
+            "expanded": expanded,
+            "relative_cost": (1 + len(LABELS) * expanded) / len(LABELS),
+        })
+    return rows
+
+
+def pick_threshold(rows, target_recall):
+    """
+    Найвищий поріг, за якого повнота не нижча за target_recall (None, якщо такого немає).
+    """
+    suitable = [row for row in rows if row["recall"] >= target_recall]
+    return max(suitable, key=lambda row: row["threshold"]) if suitable else None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Оцінка скринінгу: втрата повноти порівняно з повним режимом залежно від порогу скринінгу")
+    parser.add_argument("--labelled", help="Розмічений набір (classified_*.json повного режиму або JSONL)")
+    parser.add_argument("--cache", default="classification_cache.sqlite",
+                        help="Кеш класифікації як еталон, якщо --labelled не задано")
+    parser.add_argument("--limit", type=int, default=5000, help="Розмір випадкової вибірки (0 — усі записи)")
+    parser.add_argument("--target-recall", type=float, default=0.99)
+    parser.add_argument("--thresholds", type=float, nargs="*", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--hypothesis", default=HYPOTHESIS_TEMPLATE, help="Шаблон гіпотези")
+    parser.add_argument("--screening-label", default=SCREENING_LABEL, help="Мітка скринінгової гіпотези")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Поріг міток повного режиму")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--workers", type=int, default=0, help="Процесів для інференсу на CPU")
+    parser.add_argument("--show-missed", type=int, default=5, help="Скільки пропущених прикладів показати")
+    parser.add_argument("--output", help="Зберегти криву у JSON")
+    args = parser.parse_args()
+
+    if args.labelled:
+        texts, positives = load_labelled(args.labelled)
+    elif os.path.exists(args.cache):
+        texts, positives = load_from_cache(args.cache, args.model, args.hypothesis, args.threshold, args.backend)
+    else:
+        print(f"❌ Немає ні розміченого набору, ні кешу: {args.cache}")
+        return
+    if args.limit and len(texts) > args.limit:
+        sample = np.random.default_rng(0).choice(len(texts), args.limit, replace=False)
+        texts, positives = [texts[i] for i in sample], positives[sample]
+    if not positives.any():
+        print(f"❌ У наборі з {len(texts)} текстів немає жодного токсичного — повноту оцінити неможливо")
+        return
+    print(f"📚 Набір: {len(texts)} текстів, токсичних за повним режимом: {int(positives.any(axis=1).sum())}")
+
+    from classifier import TextClassifier
+
+    # Оцінки скринінгу кешуються, тож повторний запуск з іншими порогами не потребує моделі
+    classifier = TextClassifier(model_name=args.model, hypothesis_template=args.hypothesis, backend=args.backend,
+                                workers=args.workers, near_duplicates=False, screening=True,
+                                screening_label=args.screening_label)
+    by_text = classifier.screening_scores(texts)
+    classifier.screen_cache.flush()
+    screen_scores = np.array([by_text[t] for t in texts], dtype=np.float32)
+
+    rows = recall_curve(screen_scores, positives, args.thresholds)
+    print("\n📉 Поріг | повнота | пропущено | на повний набір | вартість")
+    for row in rows:
+        print(f"   {row['threshold']:.2f} | {row['recall']:.2%} | {row['missed']} | "
+              f"{row['expanded']:.1%} | {row['relative_cost']:.2f}")
+
+    best = pick_threshold(rows, args.target_recall)
+    if best is None:
+        print(f"\n⚠️ Жоден поріг не дає повноти {args.target_recall:.0%} — спробуйте іншу мітку скринінгу")
+    else:
+        print(f"\n✅ Рекомендований поріг: {best['threshold']:.2f} (повнота {best['recall']:.2%}, "
+              f"вартість {best['relative_cost']:.2f} від повного режиму, ~{1 / best['relative_cost']:.1f}x швидше)")
+        for label, recall in best["by_label"].items():
+            if recall is not None:
+                print(f"- {label}: повнота {recall:.2%}")
+        missed = [i for i in np.flatnonzero(positives.any(axis=1)) if screen_scores[i] < best["threshold"]]
+        for i in missed[:args.show_missed]:
+            labels = ", ".join(label for label, hit in zip(LABELS, positives[i]) if hit)
+            print(f"   ✗ [{screen_scores[i]:.3f}] {labels}: {texts[i][:120]}")
+        print(f"▶️ python main.py --screening --screening-threshold {best['threshold']:.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"target_recall": args.target_recall, "screening_label": args.screening_label,
+                       "texts": len(texts), "recommended": best, "curve": rows}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Криву збережено: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# session_pool.py
+import asyncio
+import contextlib
+import glob
+import os
+import time
+from collections import Counter
+from config import SESSION_DIR
+from fetch_scheduler import FetchScheduler, DEFAULT_CONCURRENCY
+from flood_control import FloodHandoff
+from telegram_module import TelegramAuth
+
+
+def discover_sessions(session_dir=SESSION_DIR):
+    """
+    Номери акаунтів, для яких у SESSION_DIR є збережена сесія (<phone>.session).
+    """
+    return sorted(os.path.splitext(os.path.basename(path))[0]
+                  for path in glob.glob(os.path.join(session_dir, "*.session")))
+
+
+class PoolAccount:
+    def __init__(self, tg):
+        self.tg = tg
+        self.phone = tg.phone
+        self.chats = set()  # id каналів, у яких акаунт є учасником
+        self.active = 0  # канали, що завантажуються цим акаунтом зараз
+        self.fetched = 0
+        self.handoffs = 0
+
+    def throttled_for(self):
+        return self.tg.flood.remaining('history')
+
+
+class SessionPool:
+    """
+    Кілька авторизованих акаунтів-збирачів для одного запуску. Канали розподіляються між акаунтами,
+    що є їх учасниками, з урахуванням поточних обмежень FloodWait кожного акаунта.
+    Нові акаунти тут не авторизуються: сесії без входу пропускаються (увійдіть через main.py).
+    """
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.owned = []  # акаунти, підключені пулом (їх він і відключає)
+
+    @classmethod
+    async def connect(cls, primary=None, phones=None, session_dir=SESSION_DIR, client_factory=None):
+        """
+        Підключає акаунти з SESSION_DIR (або phones) на додачу до вже авторизованого primary.
+        client_factory(phone) — альтернативний клієнт (наприклад, FakeTelegramClient для перевірок).
+        """
+        pool = cls([PoolAccount(primary)] if primary is not None else [])
+        known = {primary.phone} if primary is not None else set()
+        for phone in phones or discover_sessions(session_dir):
+            if phone in known:
+                continue
+            try:
+                tg = TelegramAuth(phone, client=client_factory(phone) if client_factory else None)
+                await tg.client.connect()
+                if not await tg.client.is_user_authorized():
+                    print(f"⚠️ Сесія {phone} не авторизована — пропускаємо")
+                    await tg.disconnect()
+                    continue
+            except Exception as e:
+                print(f"⚠️ Не вдалося підключити {phone}: {e}")
+                continue
+            pool.accounts.append(PoolAccount(tg))
+            pool.owned.append(tg)
+            known.add(phone)
+        await pool.refresh_membership()
+        return pool
+
+    async def refresh_membership(self):
+        """
+        Оновлює списки каналів кожного акаунта (заодно Telethon кешує їхні сутності для iter_messages).
+        """
+        for account in self.accounts:
+            try:
+                chats = await account.tg.get_chats(limit=None)
+            except Exception as e:
+                print(f"⚠️ {account.phone}: не вдалося отримати список каналів ({e})")
+                chats = []
+            account.chats = {chat['id'] for chat in chats}
+
+    def members(self, chat_id):
+        return [account for account in self.accounts if chat_id in account.chats]
+
+    def scheduler(self, per_account=DEFAULT_CONCURRENCY, micro_batch=64, download_media=False):
+        return PoolScheduler(self, per_account=per_account, micro_batch=micro_batch, download_media=download_media)
+
+    def summary(self):
+        return {account.phone: {"fetched": account.fetched, "handoffs": account.handoffs,
+                                "flood": account.tg.flood.summary()} for account in self.accounts}
+
+    def print_summary(self):
+        print("\n👥 Акаунти пулу:")
+        for phone, info in self.summary().items():
+            waited = sum(v["waited_s"] for v in info["flood"].values())
+            print(f"- {phone}: {info['fetched']} постів, передано іншим {info['handoffs']} разів, "
+                  f"очікування FloodWait {waited:.0f} с")
+
+    async def disconnect(self):
+        for tg in self.owned:
+            await tg.disconnect()
+
+
+class PoolScheduler(FetchScheduler):
+    """
+    FetchScheduler для пулу акаунтів: кожен канал бере вільний слот того учасника каналу, який найменше
+    обмежений FloodWait (до per_account каналів на акаунт одночасно). Канали з найменшою кількістю
+    акаунтів-учасників стартують першими. Якщо акаунт отримує FloodWait, а інший учасник звільниться раніше,
+    залишок каналу продовжує інший акаунт з того ж місця. Результати йдуть у ті самі on_batch/on_done,
+    тож пости всіх акаунтів потрапляють в одне сховище.
+    """
+
+    def __init__(self, pool, per_account=DEFAULT_CONCURRENCY, micro_batch=64, download_media=False):
+        super().__init__(pool.accounts[0].tg, concurrency=per_account * len(pool.accounts), micro_batch=micro_batch,
+                         download_media=download_media)
+        self.pool = pool
+        self.per_account = per_account
+        self.condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def _session(self):
+        # Клієнт обирається для кожного каналу окремо в _fetch_chat
+        yield None
+
+    async def _acquire(self, members):
+        async with self.condition:
+            while True:
+                free = [account for account in members if account.active < self.per_account]
+                if free:
+                    account = min(free, key=lambda a: (a.throttled_for(), a.active, a.fetched))
+                    account.active += 1
+                    return account
+                await self.condition.wait()
+
+    async def _release(self, account):
+        async with self.condition:
+            account.active -= 1
+            self.condition.notify_all()
+
+    @staticmethod
+    def _should_handoff(account, members, seconds):
+        # Передаємо, якщо інший учасник каналу зможе продовжити раніше, ніж мине обмеження цього
+        return any(other is not account and other.throttled_for() < seconds for other in members)
+
+    async def _fetch_chat(self, client, sel, on_batch):
+        progress = self.progress[sel['id']]
+        members = self.pool.members(sel['id'])
+        if not members:
+            raise RuntimeError("жоден акаунт пулу не є учасником каналу")
+        min_id = sel.get('min_id', 0)
+        limit = None if min_id else sel['limit']
+        offset_id = 0
+        batch = []
+        media = Counter() if self.download_media else None
+        progress.started = time.monotonic()
+        while True:
+            account = await self._acquire(members)
+            progress.status = f"завантаження ({account.phone})"
+            # Медіа завантажує той акаунт, що отримав повідомлення (file reference прив'язаний до сесії)
+            downloader = self._media_downloader(account.tg, account.tg.client)
+            try:
+                remaining = None if limit is None else limit - progress.fetched
+                async for post in account.tg.iter_posts(
+                        sel['id'], limit=remaining, download_media=self.download_media, min_id=min_id,
+                        offset_id=offset_id, media_downloader=downloader, base_data_dir=self.base_data_dir,
+                        handoff=lambda seconds, a=account: self._should_handoff(a, members, seconds)):
+                    batch.append(post)
+                    progress.fetched += 1
+                    account.fetched += 1
+                    if len(batch) >= self.micro_batch:
+                        await self._emit(sel, batch, on_batch, downloader)
+                        batch = []
+                        self.print_progress()
+                break
+            except FloodHandoff as e:
+                offset_id = e.offset_id
+                account.handoffs += 1
+                print(f"🔀 «{sel['title']}»: {account.phone} обмежено на {e.seconds} с — "
+                      f"продовжує інший акаунт")
+            finally:
+                if downloader is not None:
+                    media.update(await downloader.join())
+                await self._release(account)
+        if batch:
+            await on_batch(sel, batch)
+        self._report_media(sel, media)
+        progress.status = "готово"
+        progress.finished = time.monotonic()
+        self.print_progress()
+
+    async def run(self, selected_chats, on_batch, on_done):
+        missing = [sel['title'] for sel in selected_chats if not self.pool.members(sel['id'])]
+        if missing:
+            print(f"⚠️ Жоден акаунт пулу не є учасником: {', '.join(missing)}")
+        ordered = sorted(selected_chats, key=lambda sel: len(self.pool.members(sel['id'])))
+        return await super().run(ordered, on_batch, on_done)
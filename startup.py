@@ -0,0 +1,78 @@
+# startup.py
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import metrics
+
+
+class StartupProfiler:
+    """
+    Час етапів запуску (імпорти, завантаження моделі, прогрів, очікування) для --profile-startup.
+    Етапи можуть записуватись з кількох потоків.
+    """
+
+    def __init__(self, enabled=False, started=None):
+        self.enabled = enabled
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []  # (назва, секунди, потік)
+
+    def record(self, name, seconds, start=None):
+        self.phases.append((name, seconds, threading.current_thread().name))
+        start = start if start is not None else time.perf_counter() - seconds
+        metrics.add_span("startup", start, seconds, phase=name)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start=start)
+
+    def report(self):
+        if not self.enabled:
+            return
+        total = time.perf_counter() - self.started
+        print("\n⏱️ Профіль запуску:")
+        for name, seconds, thread in self.phases:
+            where = "фон" if thread != "MainThread" else "основний"
+            print(f"- {name}: {seconds:.2f} с ({where} потік)")
+        print(f"- Від запуску до готовності: {total:.2f} с")
+
+
+class ModelLoader:
+    """
+    Завантажує класифікатор у фоновому потоці, поки користувач проходить авторизацію та вибирає канали:
+    імпорт torch/transformers, створення TextClassifier і прогрівний батч.
+    Помилки завантаження повертаються з result(), а не зупиняють авторизацію.
+    """
+
+    def __init__(self, profiler=None, **classifier_kwargs):
+        self.profiler = profiler or StartupProfiler()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self.future = self._executor.submit(self._load, classifier_kwargs)
+
+    def _load(self, classifier_kwargs):
+        with self.profiler.phase("імпорт torch"):
+            import torch  # noqa: F401
+        with self.profiler.phase("імпорт transformers"):
+            import transformers  # noqa: F401
+        with self.profiler.phase("імпорт classifier"):
+            from classifier import TextClassifier
+        with self.profiler.phase("завантаження моделі"):
+            classifier = TextClassifier(**classifier_kwargs)
+        with self.profiler.phase("прогрівний батч"):
+            classifier.warm_up()
+        return classifier
+
+    def result(self):
+        """
+        Повертає готовий класифікатор, за потреби дочекавшись завершення завантаження.
+        """
+        if not self.future.done():
+            print("⏳ Завершуємо завантаження моделі...")
+        with self.profiler.phase("очікування моделі"):
+            classifier = self.future.result()
+        self._executor.shutdown(wait=False)
+        return classifier
@@ -1,17 +1,29 @@
 # telegram_module.py (оновлено з підтримкою збереження медіа)
-from telethon import TelegramClient, errors
-from telethon.tl.types import Channel, Chat, Message
+from telethon import TelegramClient, errors, events
+from telethon.tl.types import Channel, Chat
 import os
+import time
 from config import API_HASH, API_ID, SESSION_DIR
+from flood_control import FloodControl, FloodHandoff
+from media_downloader import MediaDownloader
+from utils import load_dialogs, save_dialogs
+from metrics import metrics
 
 
+# Скільки секунд кеш списку діалогів вважається актуальним і як часто перечитувати всі діалоги
+DIALOGS_TTL = 6 * 3600
+FULL_DIALOGS_REFRESH = 7 * 24 * 3600
+
 os.makedirs(SESSION_DIR, exist_ok=True)
 
 class TelegramAuth:
-    def __init__(self, phone_number):
+    def __init__(self, phone_number, client=None):
         self.phone = phone_number
         session_path = os.path.join(SESSION_DIR, f"{self.phone}.session")
-        self.client = TelegramClient(session_path, API_ID, API_HASH)
+        # client можна підмінити (наприклад, FakeTelegramClient для перевірок без мережі)
+        self.client = client or TelegramClient(session_path, API_ID, API_HASH)
+        self.flood = FloodControl()
+        self.dialogs = None  # кеш діалогів (utils.load_dialogs), читається за першого звернення
 
     async def start(self):
         await self.client.connect()
@@ -49,92 +61,249 @@ class TelegramAuth:
     async def disconnect(self):
         await self.client.disconnect()
 
-    async def get_chats(self, limit=100):
-        dialogs = await self.client.get_dialogs(limit=limit)
-        chats = []
+    async def get_chats(self, limit=None, refresh=False, full=False, ttl=DIALOGS_TTL):
+        """
+        Канали та групи акаунта ({'id', 'title', 'type', 'access_hash'}) з кешу data/<phone>/dialogs.json.
+        Поки кеш молодший за ttl секунд, мережа не використовується. Інакше діалоги перечитуються сторінками
+        лише до першого незакріпленого діалогу без нових повідомлень з минулої синхронізації; повний прохід
+        (щоб врахувати вихід з каналів і перейменування без нових постів) — раз на FULL_DIALOGS_REFRESH або з full=True.
+        limit=None — усі діалоги.
+        """
+        cache = self._dialog_cache()
+        now = time.time()
+        if refresh or full or now - cache.get('synced', 0) > ttl:
+            full = full or not cache.get('chats') or now - cache.get('full_synced', 0) > FULL_DIALOGS_REFRESH
+            changed = await self._list_dialogs(stop_at=None if full else cache.get('watermark'))
+            known = {} if full else {chat['id']: chat for chat in cache.get('chats', [])}
+            known.update(changed)
+            chats = sorted(known.values(), key=lambda chat: chat.get('date') or 0, reverse=True)
+            cache.update(chats=chats, synced=now, watermark=max((c.get('date') or 0 for c in chats), default=0))
+            if full:
+                cache['full_synced'] = now
+            save_dialogs(self.phone, cache)
+            print(f"📋 Список діалогів оновлено ({'повністю' if full else f'змінено {len(changed)}'}, "
+                  f"всього {len(chats)})")
+        chats = [{k: chat.get(k) for k in ('id', 'title', 'type', 'access_hash')} for chat in cache['chats']]
+        return chats[:limit] if limit else chats
+
+    def cached_chat(self, chat_id):
+        """
+        Канал з кешу діалогів без звернення до мережі (None, якщо його там немає).
+        """
+        for chat in self._dialog_cache().get('chats', []):
+            if chat['id'] == chat_id:
+                return {k: chat.get(k) for k in ('id', 'title', 'type', 'access_hash')}
+        return None
+
+    def _dialog_cache(self):
+        if self.dialogs is None:
+            self.dialogs = load_dialogs(self.phone)
+        return self.dialogs
+
+    async def _list_dialogs(self, stop_at=None):
+        """
+        Перебирає діалоги від найновіших (Telethon запитує їх сторінками по 100).
+        stop_at — Unix-час найновішого діалогу з минулої синхронізації: перебір зупиняється на першому
+        незакріпленому діалозі, не новішому за нього. Після FloodWait перебір продовжується з дати
+        останнього отриманого діалогу. Повертає {id: запис кешу}.
+        """
+        changed = {}
+        offset_date = None
+        while True:
+            try:
+                await self.flood.wait('dialogs')
+                async for dialog in self.client.iter_dialogs(offset_date=offset_date):
+                    date = getattr(dialog, 'date', None)
+                    timestamp = int(date.timestamp()) if date else None
+                    if stop_at and timestamp is not None and timestamp <= stop_at and not getattr(dialog, 'pinned', False):
+                        return changed
+                    entity = dialog.entity
+                    if isinstance(entity, (Channel, Chat)):
+                        changed[entity.id] = {
+                            'id': entity.id,
+                            'title': entity.title,
+                            'type': 'channel' if isinstance(entity, Channel) else 'chat',
+                            'access_hash': getattr(entity, 'access_hash', None),
+                            'date': timestamp,
+                        }
+                    if date and not getattr(dialog, 'pinned', False):
+                        offset_date = date
+                return changed
+            except errors.FloodWaitError as e:
+                await self.flood.penalize('dialogs', e.seconds)
+
+    async def get_messages(self, chat_id, limit=100, base_data_dir="data", download_media=True, min_id=0, store=None,
+                           store_batch=500):
+        """
+        Завантажує пости каналу списком. Якщо передано store (MessageStore), пости також записуються
+        у сховище транзакційними пакетами по store_batch.
+        """
+        downloader = None
+        if download_media:
+            downloader = MediaDownloader(self.client, os.path.join(base_data_dir, self.phone, "media"), flood=self.flood)
+        messages = [post async for post in self.iter_posts(chat_id, limit, base_data_dir, download_media,
+                                                           min_id=min_id, media_downloader=downloader)]
+        print(f"✅ Завантажено {len(messages)} унікальних постів\n")
+        if downloader:
+            # Фото завантажуються паралельно з ітерацією; media_files заповнені після join()
+            stats = await downloader.join()
+            print(f"🖼️ Медіа: завантажено {stats['downloaded']}, вже були {stats['skipped']}, "
+                  f"дублікати {stats['deduplicated']}, помилки {stats['failed']}")
+        if store is not None:
+            # Після join() шляхи до медіа вже заповнені, тож у сховище потрапляють завершені пости
+            for start in range(0, len(messages), store_batch):
+                store.put_messages(chat_id, messages[start:start + store_batch])
+        return messages
+
+    @staticmethod
+    def new_post(message):
+        """
+        Порожній запис поста для першого повідомлення (альбому); текст і реакції додає extend_post.
+        """
+        media_type = None
+        if message.photo:
+            media_type = 'photo_album' if message.grouped_id else 'photo'
+        return {
+            'id': message.id,
+            'grouped_id': message.grouped_id or message.id,
+            'date': message.date.isoformat(),
+            'sender_id': message.sender_id,
+            'text': "",
+            'media_type': media_type,
+            'media_files': [],
+            'reply_to': message.reply_to_msg_id,
+            'reactions': [],
+            'views': 0,
+            'forwards': 0
+        }
+
+    @staticmethod
+    def extend_post(post, message):
+        """
+        Додає до поста текст і реакції ще одного повідомлення (наприклад, наступного фото альбому).
+        Охоплення (перегляди, пересилання) альбому — найбільше серед його повідомлень.
+        """
+        post['views'] = max(post.get('views', 0), getattr(message, 'views', None) or 0)
+        post['forwards'] = max(post.get('forwards', 0), getattr(message, 'forwards', None) or 0)
+        if message.message:
+            if post['text']:
+                post['text'] += "\n" + message.message.strip()
+            else:
+                post['text'] = message.message.strip()
+
+        if hasattr(message, 'reactions') and message.reactions:
+            reactions = [
+                {
+                    'reaction': r.reaction.emoticon if hasattr(r.reaction, 'emoticon') else str(r.reaction),
+                    'count': r.count
+                } for r in message.reactions.results
+            ]
+            post['reactions'].extend(reactions)
 
-        for dialog in dialogs:
-            entity = dialog.entity
-            if isinstance(entity, (Channel, Chat)):
-                chats.append({
-                    'id': entity.id,
-                    'title': entity.title,
-                    'type': 'channel' if isinstance(entity, Channel) else 'chat'
-                })
+    def subscribe(self, chat_ids, callback):
+        """
+        Підписка на нові повідомлення вибраних каналів: callback(chat_id, message) викликається для кожного.
+        Повертає обробник (для client.remove_event_handler).
+        """
+        async def handler(event):
+            await callback(event.chat_id, event.message)
 
-        return chats
+        self.client.add_event_handler(handler, events.NewMessage(chats=list(chat_ids)))
+        return handler
 
-    async def get_messages(self, chat_id, limit=100, base_data_dir="data", download_media=True):
-        media_dir = os.path.join(base_data_dir, self.phone, "media")
-        os.makedirs(media_dir, exist_ok=True)
+    async def iter_posts(self, chat_id, limit=100, base_data_dir="data", download_media=True, client=None, min_id=0,
+                         media_downloader=None, offset_id=0, handoff=None):
+        """
+        Асинхронний генератор постів каналу (повідомлення альбому об'єднуються в один пост).
+        Пост віддається, щойно всі його повідомлення отримані, тож обробка може йти паралельно із завантаженням.
+        Після FloodWaitError завантаження продовжується з того ж місця, коли мине обмеження.
+        client — альтернативний клієнт (наприклад, takeout-сесія).
+        min_id — завантажувати лише повідомлення, новіші за цей id; limit=None — без обмеження кількості.
+        Фото передаються в media_downloader і завантажуються паралельно; якщо пул не передано,
+        генератор створює власний і чекає його завершення перед останнім постом.
+        offset_id — почати з повідомлень, старіших за цей id (продовження перерваного завантаження).
+        handoff(seconds) — якщо повертає True, замість очікування FloodWait генератор кидає FloodHandoff
+        з місцем, звідки інший акаунт може продовжити (незавершений альбом буде запитано повторно).
+        """
+        client = client or self.client
+        if limit is None:
+            limit = float('inf')
+        own_downloader = download_media and media_downloader is None
+        if own_downloader:
+            media_downloader = MediaDownloader(client, os.path.join(base_data_dir, self.phone, "media"), flood=self.flood)
 
-        grouped_messages = {}
-        offset_id = 0
+        current = None  # пост, що ще збирається (повідомлення альбому йдуть підряд)
+        current_first_id = None
+        emitted = 0
         batch_size = 100
+        # Час завантаження рахується без пауз, коли пост уже віддано і генератор чекає на споживача
+        started = resumed = time.perf_counter()
+        busy = 0.0
+        received = 0
+
+        def record(pending=0):
+            chat = str(chat_id)
+            spent = busy + time.perf_counter() - resumed
+            metrics.inc("fetch_messages_total", received, chat=chat)
+            metrics.inc("fetch_posts_total", emitted + pending, chat=chat)
+            metrics.observe("fetch_busy", spent, chat=chat)
+            metrics.add_span("fetch", started, time.perf_counter() - started, track=f"fetch:{chat}",
+                             args={"messages": received, "busy_s": round(spent, 3), "account": self.phone}, chat=chat)
 
         print("")  # для відступу
-        while len(grouped_messages) < limit:
+        while emitted < limit:
             fetched = 0
-            async for message in self.client.iter_messages(chat_id, limit=batch_size, offset_id=offset_id):
-                offset_id = message.id
-                fetched += 1
-
-                grouped_id = message.grouped_id or message.id
-                media_type = None
-                if message.photo:
-                    media_type = 'photo_album' if message.grouped_id else 'photo'
-
-                # Перевірка на наявність тексту в повідомленні
-                if not message.message and not message.photo:
-                    continue  # Пропускаємо повідомлення без тексту і медіа
-
-                # створення запису
-                # створення або оновлення запису для повідомлення/групи
-                if grouped_id not in grouped_messages:
-                    grouped_messages[grouped_id] = {
-                        'id': message.id,
-                        'grouped_id': grouped_id,
-                        'date': message.date.isoformat(),
-                        'sender_id': message.sender_id,
-                        'text': "",
-                        'media_type': media_type,
-                        'media_files': [],
-                        'reply_to': message.reply_to_msg_id,
-                        'reactions': []
-                    }
-                if message.message:
-                    if grouped_messages[grouped_id]['text']:
-                        grouped_messages[grouped_id]['text'] += "\n" + message.message.strip()
-                    else:
-                        grouped_messages[grouped_id]['text'] = message.message.strip()
-
-                if message.photo and download_media:
-                    try:
-                        filename = f"{grouped_id}_{message.id}.jpg"
-                        file_path = os.path.join(media_dir, filename)
-                        saved_path = await self.client.download_media(message, file=file_path)
-                        grouped_messages[grouped_id]['media_files'].append(saved_path)
-                    except Exception as e:
-                        grouped_messages[grouped_id]['media_files'].append(f"ERROR: {str(e)}")
-
-                if hasattr(message, 'reactions') and message.reactions:
-                    reactions = [
-                        {
-                            'reaction': r.reaction.emoticon if hasattr(r.reaction, 'emoticon') else str(r.reaction),
-                            'count': r.count
-                        } for r in message.reactions.results
-                    ]
-                    grouped_messages[grouped_id]['reactions'].extend(reactions)
-
-                if len(grouped_messages) % 10 == 0:
-                    print(f"🔄 Прогрес: {len(grouped_messages)} / {limit} постів")
-
-                if len(grouped_messages) >= limit:
-                    break
+            try:
+                await self.flood.wait('history')
+                async for message in client.iter_messages(chat_id, limit=batch_size, offset_id=offset_id, min_id=min_id):
+                    offset_id = message.id
+                    fetched += 1
+                    received += 1
+
+                    grouped_id = message.grouped_id or message.id
+
+                    # Перевірка на наявність тексту в повідомленні
+                    if not message.message and not message.photo:
+                        continue  # Пропускаємо повідомлення без тексту і медіа
+
+                    # Почалось нове повідомлення/група — попередній пост завершено
+                    if current is not None and current['grouped_id'] != grouped_id:
+                        busy += time.perf_counter() - resumed
+                        yield current
+                        resumed = time.perf_counter()
+                        emitted += 1
+                        current = None
+                        if emitted % 10 == 0:
+                            total = f" / {limit}" if limit != float('inf') else ""
+                            print(f"🔄 Прогрес: {emitted}{total} постів")
+                        if emitted >= limit:
+                            break
+
+                    # створення запису
+                    if current is None:
+                        current = self.new_post(message)
+                        current_first_id = message.id
+                    self.extend_post(current, message)
+
+                    if message.photo and download_media:
+                        media_downloader.submit(message, current)
+            except errors.FloodWaitError as e:
+                if handoff is not None and handoff(e.seconds):
+                    self.flood.block('history', e.seconds)
+                    if own_downloader:
+                        await media_downloader.join()
+                    record()
+                    resume_from = current_first_id + 1 if current is not None else offset_id
+                    raise FloodHandoff(e.seconds, resume_from, emitted)
+                # Сторінку буде запитано знову з останнього offset_id
+                await self.flood.penalize('history', e.seconds)
+                continue
 
             if fetched == 0:
                 break
 
-        print(f"✅ Завантажено {len(grouped_messages)} унікальних постів\n")
-        return list(grouped_messages.values())[:limit]
-
+        if own_downloader:
+            await media_downloader.join()
+        record(current is not None and emitted < limit)
+        if current is not None and emitted < limit:
+            yield current
@@ -0,0 +1,40 @@
+# tests/conftest.py
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import LABELS, apply_threshold, compact_scores  # noqa: E402
+
+
+class StubClassifier:
+    """
+    Класифікатор без моделі: детерміновані оцінки за id повідомлення, запам'ятовує кожен виклик.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def classify_messages(self, prepared, show_progress=True):
+        self.calls.append([msg['id'] for msg in prepared])
+        results = []
+        for msg in prepared:
+            raw_scores = np.random.default_rng(msg['id']).random(len(LABELS)).astype(np.float32)
+            labels, scores = apply_threshold(raw_scores, 0.5)
+            results.append({'id': msg['id'], 'text': msg['text'], 'labels': labels, 'scores': scores,
+                            'raw_scores': compact_scores(raw_scores)})
+        return results
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Сховища, позначки синхронізації й звіти пишуться відносно поточного каталогу
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def classifier():
+    return StubClassifier()
@@ -0,0 +1,25 @@
+# tests/test_cache_store.py
+import sys
+import numpy as np
+import cache_store
+from cache_store import ClassificationCache, make_namespace
+from scoring import LABELS, SCORES_FORMAT, cache_model_name, current_cache_namespace, screening_cache_namespace
+
+
+def test_compact_keeps_every_backend_and_screening(workdir, monkeypatch):
+    path = str(workdir / "cache.sqlite")
+    kept = [current_cache_namespace(), current_cache_namespace(cache_model_name(backend="onnx-int8")),
+            screening_cache_namespace(), screening_cache_namespace(cache_model_name(backend="onnx-int8"))]
+    stale = make_namespace("old-model", LABELS, "This text is {}.", SCORES_FORMAT)
+    for namespace in kept + [stale]:
+        cache = ClassificationCache(path, namespace)
+        cache.put("текст", np.zeros(len(LABELS), dtype=np.float32))
+        cache.close()
+
+    monkeypatch.setattr(sys, "argv", ["cache_store.py", "compact", "--path", path])
+    cache_store.main()
+
+    cache = ClassificationCache(path, current_cache_namespace())
+    namespaces = {row[0] for row in cache.conn.execute("SELECT DISTINCT namespace FROM entries")}
+    cache.close()
+    assert namespaces == set(kept)
@@ -0,0 +1,130 @@
+# tests/test_fetch_scheduler.py
+import asyncio
+import time
+import pytest
+from fake_client import FakeTelegramClient, make_chats
+from fetch_scheduler import FetchScheduler
+from flood_control import FloodControl, FloodHandoff
+from telegram_module import TelegramAuth
+
+
+def _auth(client, margin=0.0):
+    tg = TelegramAuth("fake", client=client)
+    tg.flood = FloodControl(margin=margin)
+    return tg
+
+
+def _fetch_all(tg, selected, **kwargs):
+    batches = {sel['id']: [] for sel in selected}
+    done = {}
+
+    async def on_batch(sel, batch):
+        batches[sel['id']].append(list(batch))
+
+    async def on_done(sel, completed):
+        done[sel['id']] = completed
+
+    asyncio.run(FetchScheduler(tg, **kwargs).run(selected, on_batch, on_done))
+    return batches, done
+
+
+def _expected_posts(messages):
+    # Від новіших до старіших, повідомлення альбому — один пост з id найновішого з них
+    posts = {}
+    for message in sorted(messages, key=lambda m: m.id, reverse=True):
+        posts.setdefault(message.grouped_id or message.id, []).append(message)
+    return posts
+
+
+def test_flood_wait_backs_off_and_is_counted_per_class(workdir):
+    # Кожен другий запит сторінки — FloodWait на 1 с: 250 повідомлень = 3 сторінки, 2 обмеження
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=250, album_every=0),
+                                flood_every=2, flood_seconds=1)
+    tg = _auth(client)
+    chat_id = next(iter(client.chats))
+
+    started = time.monotonic()
+    batches, done = _fetch_all(tg, [{'id': chat_id, 'title': "Канал", 'limit': 1000}], micro_batch=50)
+    elapsed = time.monotonic() - started
+
+    ids = [post['id'] for batch in batches[chat_id] for post in batch]
+    assert ids == list(range(250, 0, -1))
+    assert done == {chat_id: True}
+    assert client.flood_waits == 2
+    assert tg.flood.hits == {'history': 2}
+    assert tg.flood.waited['history'] >= 1.5
+    assert tg.flood.remaining('media') == 0 and tg.flood.remaining('dialogs') == 0
+    assert elapsed >= 1.5
+
+
+def test_flood_wait_of_one_chat_does_not_lose_posts_of_others(workdir):
+    client = FakeTelegramClient(make_chats(chats=3, messages_per_chat=120, album_every=0),
+                                flood_every=4, flood_seconds=0)
+    tg = _auth(client)
+    selected = [{'id': chat_id, 'title': chat['title'], 'limit': 1000} for chat_id, chat in client.chats.items()]
+
+    batches, done = _fetch_all(tg, selected, concurrency=2, micro_batch=32)
+
+    assert all(done.values())
+    for chat_id in client.chats:
+        assert [post['id'] for batch in batches[chat_id] for post in batch] == list(range(120, 0, -1))
+    assert tg.flood.hits['history'] == client.flood_waits > 0
+
+
+def test_resume_from_offset_id(workdir):
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=150, album_every=0))
+    tg = _auth(client)
+    chat_id = next(iter(client.chats))
+
+    async def collect():
+        return [post['id'] async for post in tg.iter_posts(chat_id, limit=None, download_media=False, offset_id=61)]
+
+    assert asyncio.run(collect()) == list(range(60, 0, -1))
+
+
+def test_handoff_offset_resumes_without_gaps_or_duplicates(workdir):
+    # Альбоми по 3 повідомлення; сторінки по 7, тож FloodWait застає альбом незавершеним
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=200, album_every=1),
+                                page_size=7, flood_every=5, flood_seconds=30)
+    tg = _auth(client)
+    chat_id = next(iter(client.chats))
+    expected = _expected_posts(client.chats[chat_id]['messages'])
+
+    async def collect():
+        posts, offset_id, handoffs = {}, 0, 0
+        while True:
+            try:
+                async for post in tg.iter_posts(chat_id, limit=None, download_media=False, offset_id=offset_id,
+                                                handoff=lambda seconds: True):
+                    assert post['id'] not in posts
+                    posts[post['id']] = post
+                return posts, handoffs
+            except FloodHandoff as e:
+                handoffs += 1
+                offset_id = e.offset_id
+                tg.flood = FloodControl(margin=0.0)  # наступний «акаунт» не обмежений
+
+    posts, handoffs = asyncio.run(collect())
+    assert handoffs > 0
+    assert sorted(posts) == sorted(messages[0].id for messages in expected.values())
+    for messages in expected.values():
+        assert posts[messages[0].id]['text'].split("\n") == [m.message for m in messages]
+
+
+@pytest.mark.parametrize("messages_per_chat", [301, 302])
+def test_albums_are_grouped_across_pages(workdir, messages_per_chat):
+    # 301/302 повідомлення: альбом стоїть на межі запитів по 100 і сторінок клієнта по 7
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=messages_per_chat, album_every=1),
+                                page_size=7)
+    tg = _auth(client)
+    chat_id = next(iter(client.chats))
+    expected = _expected_posts(client.chats[chat_id]['messages'])
+
+    batches, _ = _fetch_all(tg, [{'id': chat_id, 'title': "Канал", 'limit': 10000}], micro_batch=16)
+    posts = [post for batch in batches[chat_id] for post in batch]
+
+    assert [post['id'] for post in posts] == [messages[0].id for messages in expected.values()]
+    for post, messages in zip(posts, expected.values()):
+        assert post['text'].split("\n") == [m.message for m in messages]
+        assert post['media_type'] == 'photo_album'
+    assert all(len(batch) <= 16 for batch in batches[chat_id])
@@ -0,0 +1,43 @@
+# tests/test_near_duplicates.py
+import sqlite3
+from near_duplicates import NearDuplicateIndex
+
+TEXT = "Повторний пост каналу, який каскад вирішує без моделі й тому не потрапляє в кеш"
+
+
+def _band_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM bands").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_readding_indexed_key_does_not_grow_bands(tmp_path):
+    path = str(tmp_path / "near_duplicates.sqlite")
+    for _ in range(3):
+        index = NearDuplicateIndex(path)
+        assert index.add(b"key", TEXT)
+        assert index.add(b"key", TEXT)
+        index.close()
+    assert _band_rows(path) == NearDuplicateIndex(path).bands
+
+
+def test_existing_duplicate_bands_are_removed_on_open(tmp_path):
+    path = str(tmp_path / "near_duplicates.sqlite")
+    index = NearDuplicateIndex(path)
+    bands = index.bands
+    index.close()
+    # Файл у форматі до унікального індексу, де той самий ключ проіндексовано тричі
+    conn = sqlite3.connect(path)
+    conn.execute("DROP INDEX idx_bands_unique")
+    conn.execute("CREATE INDEX idx_bands_bucket ON bands(bucket)")
+    buckets = NearDuplicateIndex(str(tmp_path / "other.sqlite"))._buckets(index.signature(TEXT))
+    conn.executemany("INSERT INTO bands (bucket, key) VALUES (?, ?)", [(b, b"key") for b in buckets] * 3)
+    conn.commit()
+    conn.close()
+
+    index = NearDuplicateIndex(path)
+    index.add(b"other", TEXT + " (репост)")
+    index.close()
+    assert _band_rows(path) == 2 * bands
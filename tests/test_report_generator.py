@@ -0,0 +1,40 @@
+# tests/test_report_generator.py
+import filecmp
+from report_generator import (ReportEngine, print_summary, save_per_category, show_top_examples, show_top_toxic,
+                              summarize_classification)
+
+RESULTS = [
+    {"text": "звичайне повідомлення каналу", "labels": ["Safe"], "scores": [1.0]},
+    {"text": "образливе повідомлення", "labels": ["Hate speech or harassment", "Propaganda or ideological harm"],
+     "scores": [0.9, 0.55]},
+    {"text": "сумнівне повідомлення", "labels": ["Propaganda or ideological harm"], "scores": [0.6]},
+]
+FILES = ["classification_summary.txt", "top_uncertain_examples.txt", "top_toxic_messages.txt",
+         "category_Safe.json", "category_Hate_speech_or_harassment.json",
+         "category_Propaganda_or_ideological_harm.json"]
+
+
+def test_legacy_functions_match_single_pass_engine(tmp_path):
+    engine_dir, legacy_dir = tmp_path / "engine", tmp_path / "legacy"
+    engine_dir.mkdir()
+    legacy_dir.mkdir()
+    engine = ReportEngine(str(engine_dir)).consume(RESULTS)
+    engine._close_categories()
+    print_summary(engine.label_counter, engine.multi_label_counts, engine.score_sums, engine.length_sums,
+                  str(engine_dir))
+    engine.write_top_uncertain()
+    engine.write_top_toxic()
+
+    print_summary(*summarize_classification(RESULTS), str(legacy_dir))
+    show_top_examples(RESULTS, str(legacy_dir))
+    show_top_toxic(RESULTS, str(legacy_dir))
+    save_per_category(RESULTS, str(legacy_dir))
+
+    match, mismatch, errors = filecmp.cmpfiles(engine_dir, legacy_dir, FILES, shallow=False)
+    assert (mismatch, errors) == ([], [])
+
+
+def test_top_reports_do_not_write_categories(tmp_path):
+    show_top_toxic(RESULTS, str(tmp_path))
+    show_top_examples(RESULTS, str(tmp_path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["top_toxic_messages.txt", "top_uncertain_examples.txt"]
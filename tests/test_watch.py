@@ -0,0 +1,145 @@
+# tests/test_watch.py
+import asyncio
+import time
+from columnar_store import ColumnarStore, columns_path
+from fake_client import FakePhoto, FakeMessage, FakeTelegramClient, make_chats
+from message_store import MessageStore, store_path
+from pipeline import run_pipeline
+from telegram_module import TelegramAuth
+from utils import load_sync_state
+from watch import WatchService
+
+PHONE = "fake"
+
+
+def _selection(client):
+    return [{'id': chat_id, 'title': chat['title'], 'limit': 100} for chat_id, chat in client.chats.items()]
+
+
+async def _drain(service, posts):
+    """
+    Запускає service.run(), доки не буде оброблено posts постів, і зупиняє сервіс.
+    """
+    task = asyncio.create_task(service.run())
+    await _wait_processed(service, posts)
+    service.stop()
+    await task
+
+
+async def _wait_processed(service, posts, timeout=10):
+    deadline = time.monotonic() + timeout
+    while service.latency.total < posts:
+        assert time.monotonic() < deadline, f"оброблено {service.latency.total} з {posts} постів"
+        await asyncio.sleep(0.01)
+
+
+def _empty_channel():
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=0))
+    tg = TelegramAuth(PHONE, client=client)
+    return client, tg, _selection(client)
+
+
+def _post(message_id, text=None, **kwargs):
+    return FakeMessage(message_id, text if text is not None else f"нове повідомлення {message_id} з каналу", **kwargs)
+
+
+def test_watch_during_sync_keeps_synced_columns(workdir, classifier):
+    client = FakeTelegramClient(make_chats(chats=1, messages_per_chat=5, album_every=0), latency=0.01)
+    tg = TelegramAuth(PHONE, client=client)
+    selected = _selection(client)
+    chat_id = selected[0]['id']
+
+    async def scenario():
+        columns = ColumnarStore(columns_path(PHONE))
+        service = WatchService(tg, classifier, selected, PHONE, max_batch=1, max_latency=0.01, columns=columns)
+        service.start()
+
+        async def emit_during_sync():
+            await asyncio.sleep(0.005)
+            await client.emit(chat_id, FakeMessage(6, "нове повідомлення під час синхронізації"))
+
+        await asyncio.gather(run_pipeline(tg, classifier, selected, PHONE, columns=columns), emit_during_sync())
+        await _drain(service, 1)
+
+    asyncio.run(scenario())
+
+    reopened = ColumnarStore(columns_path(PHONE))
+    rows = reopened.latest_rows(chat_id)
+    assert sorted(reopened.column("id")[rows].tolist()) == [1, 2, 3, 4, 5, 6]
+    assert reopened.text(int(rows[-1])) == "нове повідомлення під час синхронізації"
+
+
+def test_batch_is_flushed_when_max_batch_is_reached(workdir, classifier):
+    client, tg, selected = _empty_channel()
+    chat_id = selected[0]['id']
+    # Дедлайн недосяжний за час тесту: батчі можуть відправлятись лише за розміром
+    service = WatchService(tg, classifier, selected, PHONE, max_batch=3, max_latency=60)
+
+    async def scenario():
+        service.start()
+        for message_id in range(1, 7):
+            await client.emit(chat_id, _post(message_id))
+        await _drain(service, 6)
+
+    asyncio.run(scenario())
+    assert classifier.calls == [[1, 2, 3], [4, 5, 6]]
+
+
+def test_batch_is_flushed_on_max_latency(workdir, classifier):
+    client, tg, selected = _empty_channel()
+    chat_id = selected[0]['id']
+    service = WatchService(tg, classifier, selected, PHONE, max_batch=100, max_latency=0.2)
+
+    async def scenario():
+        service.start()
+        task = asyncio.create_task(service.run())
+        await client.emit(chat_id, _post(1))
+        await client.emit(chat_id, _post(2))
+        await _wait_processed(service, 2)
+        await client.emit(chat_id, _post(3))
+        await _wait_processed(service, 3)
+        service.stop()
+        await task
+
+    asyncio.run(scenario())
+    assert classifier.calls == [[1, 2], [3]]
+    # Перший пост батчу чекав дедлайн, а не наступні події
+    assert max(service.latency.values) >= 0.2
+
+
+def test_album_continues_across_batches(workdir, classifier):
+    client, tg, selected = _empty_channel()
+    chat_id = selected[0]['id']
+    service = WatchService(tg, classifier, selected, PHONE, max_batch=2, max_latency=0.05)
+    parts = ["перша частина підпису альбому", "друга частина підпису альбому", "третя частина підпису альбому"]
+
+    async def scenario():
+        service.start()
+        for offset, text in enumerate(parts):
+            await client.emit(chat_id, _post(10 + offset, text, grouped_id=777, photo=FakePhoto(10 + offset)))
+        await _drain(service, 2)
+
+    asyncio.run(scenario())
+    # Третє фото прийшло в наступному батчі й доповнило той самий пост (id першого повідомлення)
+    assert classifier.calls == [[10], [10]]
+    store = MessageStore(store_path(PHONE))
+    results = list(store.iter_results(chat_id))
+    messages = list(store.iter_messages(chat_id))
+    store.close()
+    assert len(results) == 1 and all(part in results[0]['text'] for part in parts)
+    assert [(post['id'], post['media_type']) for post in messages] == [(10, 'photo_album')]
+
+
+def test_sync_state_follows_processed_posts(workdir, classifier):
+    client, tg, selected = _empty_channel()
+    chat_id = selected[0]['id']
+    service = WatchService(tg, classifier, selected, PHONE, max_batch=2, max_latency=0.05)
+
+    async def scenario():
+        service.start()
+        for message_id in (41, 42, 40):
+            await client.emit(chat_id, _post(message_id))
+        await _drain(service, 3)
+
+    asyncio.run(scenario())
+    assert load_sync_state(PHONE)[chat_id] == {'max_id': 42, 'title': selected[0]['title']}
@@ -2,6 +2,7 @@
 import os
 import json
 import re
+from datetime import datetime
 
 def sanitize_filename(name):
     return re.sub(r'[\\/*?:"<>|]', '_', name.strip().replace(' ', '_'))
@@ -18,10 +19,90 @@ def save_chats(phone, chats):
     with open(path, "w", encoding="utf-8") as f:
         json.dump(chats, f, ensure_ascii=False, indent=2)
 
-def save_messages(phone, chat_title, messages):
+def messages_path(phone, chat_title, prefix="messages"):
     data_dir, _ = ensure_data_dir(phone)
-    safe_title = sanitize_filename(chat_title)
-    filename = f"messages_{safe_title}.json"
-    path = os.path.join(data_dir, filename)
+    return os.path.join(data_dir, f"{prefix}_{sanitize_filename(chat_title)}.json")
+
+def save_messages(phone, chat_title, messages):
+    path = messages_path(phone, chat_title)
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(messages, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        json.dump(messages, f, ensure_ascii=False, indent=2)
+
+def to_timestamp(value):
+    """
+    Дата поста (ISO-рядок або число) у Unix-час у секундах; 0, якщо дати немає.
+    """
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+def load_sync_state(phone):
+    """
+    Повертає {chat_id: {'max_id': ..., 'title': ...}} — найбільший синхронізований id для кожного каналу.
+    """
+    path = os.path.join("data", phone, "sync_state.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+def save_sync_state(phone, state):
+    data_dir, _ = ensure_data_dir(phone)
+    path = os.path.join(data_dir, "sync_state.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in state.items()}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def load_dialogs(phone):
+    """
+    Кеш списку діалогів акаунта: {'synced', 'full_synced', 'watermark', 'chats': [{id, title, type, access_hash, date}]}.
+    """
+    path = os.path.join("data", phone, "dialogs.json")
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Не вдалося прочитати кеш діалогів: {e}")
+        return {}
+
+def save_dialogs(phone, cache):
+    data_dir, _ = ensure_data_dir(phone)
+    path = os.path.join(data_dir, "dialogs.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+class JsonArrayWriter:
+    """
+    Записує JSON-масив поелементно, не тримаючи весь список у пам'яті.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write("[")
+
+    def write(self, item):
+        self.f.write(",\n" if self.count else "\n")
+        json.dump(item, self.f, ensure_ascii=False)
+        self.count += 1
+
+    def write_many(self, items):
+        for item in items:
+            self.write(item)
+
+    def close(self):
+        self.f.write("\n]" if self.count else "]")
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
\ No newline at end of file
@@ -0,0 +1,235 @@
+# watch.py
+import asyncio
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from columnar_store import ColumnarStore, columns_path
+from message_store import MessageStore, store_path
+from metrics import metrics
+from normalization import DropStats
+from preprocessing import prepare_messages
+from report_generator import create_output_folder, generate_reports
+from scoring import SAFE_LABEL
+from utils import load_sync_state, save_sync_state, sanitize_filename
+
+# Максимальний розмір мікробатчу та найдовше очікування першого поста в буфері (секунди)
+MAX_BATCH = 32
+MAX_LATENCY = 2.0
+# Як часто оновлювати «живі» звіти та за який проміжок часу (секунди)
+REPORT_INTERVAL = 300
+REPORT_WINDOW = 24 * 3600
+# Скільки останніх альбомів пам'ятати, щоб доповнювати їх повідомленнями з наступних батчів
+RECENT_ALBUMS = 256
+
+
+class LatencyTracker:
+    """
+    Затримки від отримання події до запису результату в сховище (останні window значень).
+    Кожна затримка пишеться й у metrics (таймер watch_latency), а перцентилі вікна — у gauge
+    watch_latency_percentile_seconds, тож вони потрапляють у run_summary.json і metrics.prom.
+    """
+
+    def __init__(self, window=10000):
+        self.values = collections.deque(maxlen=window)
+        self.total = 0
+
+    def extend(self, values):
+        self.values.extend(values)
+        self.total += len(values)
+        for value in values:
+            metrics.observe("watch_latency", value)
+        for name, value in self.percentiles().items():
+            metrics.set("watch_latency_percentile_seconds", round(value, 6), percentile=name)
+
+    def percentiles(self, points=(50, 95, 99)):
+        if not self.values:
+            return {}
+        data = np.fromiter(self.values, dtype=np.float64, count=len(self.values))
+        return {f"p{p}": float(v) for p, v in zip(points, np.percentile(data, points))}
+
+    def summary(self):
+        stats = self.percentiles()
+        if not stats:
+            return "⏱️ Затримка: ще немає оброблених постів"
+        parts = ", ".join(f"{name} {value * 1000:.0f} мс" for name, value in stats.items())
+        return f"⏱️ Затримка (з {self.total} постів): {parts}"
+
+
+class WatchService:
+    """
+    Постійний режим: клієнт Telegram і модель лишаються завантаженими, нові пости вибраних каналів
+    приходять через events.NewMessage, накопичуються в буфері й класифікуються мікробатчами.
+    Батч відправляється, коли набралось max_batch постів або найстаріший пост чекає max_latency секунд.
+    Результати дописуються в MessageStore і колонкове сховище, позначка синхронізації оновлюється,
+    тож наступний звичайний запуск не завантажує ці пости повторно.
+    """
+
+    def __init__(self, tg, classifier, selected_chats, phone, max_batch=MAX_BATCH, max_latency=MAX_LATENCY,
+                 report_interval=REPORT_INTERVAL, report_window=REPORT_WINDOW, reports=None, columns=None):
+        self.tg = tg
+        self.classifier = classifier
+        self.chats = {sel['id']: sel for sel in selected_chats}
+        self.phone = phone
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.report_interval = report_interval
+        self.report_window = report_window
+        self.reports = reports  # ReportPool: «живі» звіти формуються у фоні, не затримуючи класифікацію
+
+        self.store = MessageStore(store_path(phone))
+        # Спільне з синхронізацією сховище: два письменники в одному каталозі затирали б рядки один одного
+        self.columns = columns if columns is not None else ColumnarStore(columns_path(phone))
+        self.sync_state = {}  # читається в run(), після можливої догрузки пропущених постів
+        self.queue = asyncio.Queue()
+        self.latency = LatencyTracker()
+        self.drops = DropStats()
+        self.flagged = 0
+        self.recent_albums = collections.OrderedDict()  # (chat_id, grouped_id) -> пост альбому
+        self.dirty_chats = set()  # канали з новими результатами з часу останнього звіту
+        self.handler = None
+        # Один потік: модель і сховища не розраховані на паралельні виклики
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _on_message(self, chat_id, message):
+        if not message.message and not message.photo:
+            return
+        await self.queue.put((time.monotonic(), chat_id, message))
+
+    def start(self):
+        """
+        Підписується на нові повідомлення. Події, що прийдуть до run(), чекають у черзі.
+        """
+        for sel in self.chats.values():
+            self.store.upsert_chat(sel['id'], sel['title'])
+        self.handler = self.tg.subscribe(self.chats.keys(), self._on_message)
+
+    def stop(self):
+        self.queue.put_nowait(None)
+
+    async def _next_batch(self):
+        """
+        Чекає першу подію, потім добирає наступні до max_batch або до дедлайну першої. None — сигнал зупинки.
+        """
+        first = await self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first[0] + self.max_latency
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                self.queue.put_nowait(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _build_posts(self, batch):
+        """
+        Групує події за каналом; повідомлення одного альбому, що потрапили в батч, об'єднуються в один пост.
+        """
+        posts = {}  # (chat_id, grouped_id) -> (час отримання першого повідомлення, пост)
+        for arrived, chat_id, message in batch:
+            key = (chat_id, message.grouped_id or message.id)
+            if key not in posts:
+                # Продовження альбому з попереднього батчу доповнює вже збережений пост (той самий id)
+                album = self.recent_albums.get(key) if message.grouped_id else None
+                posts[key] = (arrived, album or self.tg.new_post(message))
+            self.tg.extend_post(posts[key][1], message)
+            if message.grouped_id:
+                self.recent_albums[key] = posts[key][1]
+                self.recent_albums.move_to_end(key)
+                while len(self.recent_albums) > RECENT_ALBUMS:
+                    self.recent_albums.popitem(last=False)
+        return posts
+
+    def _process(self, batch):
+        posts = self._build_posts(batch)
+        by_chat = collections.defaultdict(list)
+        for (chat_id, _), (_, post) in posts.items():
+            by_chat[chat_id].append(post)
+
+        keys, prepared = [], []
+        for chat_id, chat_posts in by_chat.items():
+            self.store.put_messages(chat_id, chat_posts)
+            for item in prepare_messages(chat_posts, stats=self.drops):
+                keys.append(chat_id)
+                prepared.append(item)
+
+        # Один виклик моделі на весь мікробатч, незалежно від кількості каналів
+        results = self.classifier.classify_messages(prepared, show_progress=False) if prepared else []
+        results_by_chat = collections.defaultdict(list)
+        for chat_id, result in zip(keys, results):
+            results_by_chat[chat_id].append(result)
+
+        for chat_id, chat_posts in by_chat.items():
+            chat_results = results_by_chat.get(chat_id, [])
+            self.store.put_results(chat_id, chat_results)
+            self.columns.append(chat_id, chat_results, {post['id']: post for post in chat_posts})
+            max_id = max(post['id'] for post in chat_posts)
+            entry = self.sync_state.get(chat_id, {})
+            self.sync_state[chat_id] = {'max_id': max(entry.get('max_id', 0), max_id),
+                                        'title': self.chats[chat_id]['title']}
+            for result in chat_results:
+                if result['labels'] != [SAFE_LABEL]:
+                    self.flagged += 1
+                    print(f"🚨 «{self.chats[chat_id]['title']}» #{result['id']}: {', '.join(result['labels'])} — "
+                          f"{result['text'][:120]}")
+            self.dirty_chats.add(chat_id)
+        save_sync_state(self.phone, self.sync_state)
+
+        done = time.monotonic()
+        self.latency.extend([done - arrived for arrived, _ in posts.values()])
+        return len(posts)
+
+    def _write_reports(self):
+        """
+        «Живі» звіти за останні report_window секунд для каналів з новими результатами.
+        """
+        since = time.time() - self.report_window
+        for chat_id in sorted(self.dirty_chats):
+            title = self.chats[chat_id]['title']
+            output_path = create_output_folder("reports", f"{sanitize_filename(title)}_live")
+            if self.reports is not None:
+                self.reports.submit(title, self.store.path, chat_id, output_path, since=since)
+            else:
+                generate_reports(self.store.iter_results(chat_id, since=since), output_path)
+        self.dirty_chats.clear()
+
+    async def run(self):
+        """
+        Обробляє події до виклику stop() (або скасування задачі); наприкінці — останні звіти та статистика.
+        """
+        if self.handler is None:
+            self.start()
+        self.sync_state = load_sync_state(self.phone)
+        loop = asyncio.get_running_loop()
+        last_report = time.monotonic()
+        print(f"👀 Стежимо за {len(self.chats)} каналами (батч до {self.max_batch} постів, "
+              f"очікування до {self.max_latency:.1f} с). Ctrl+C — зупинка.")
+        try:
+            while True:
+                batch = await self._next_batch()
+                if batch is None:
+                    break
+                count = await loop.run_in_executor(self.executor, self._process, batch)
+                print(f"🧠 Класифіковано {count} нових постів | {self.latency.summary()}")
+                if time.monotonic() - last_report >= self.report_interval:
+                    await loop.run_in_executor(self.executor, self._write_reports)
+                    last_report = time.monotonic()
+        finally:
+            self.tg.client.remove_event_handler(self.handler)
+            if self.dirty_chats:
+                self.executor.submit(self._write_reports).result()
+            self.executor.shutdown(wait=True)
+            self.store.close()
+            print(f"\n🛑 Режим спостереження зупинено. Позначено токсичних постів: {self.flagged}")
+            if self.drops.reasons:
+                print(self.drops.summary())
+            print(self.latency.summary())